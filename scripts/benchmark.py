@@ -0,0 +1,509 @@
+"""
+Script to benchmark model parsing, helpers and end-to-end calls.
+
+`run` measures each benchmark in a separate process so that peak RSS is not shared
+between benchmarks, and writes the results to a JSON file that can be used as a
+baseline. `compare` compares two result files and exits with an error if any
+benchmark regressed by more than the threshold.
+
+Responses are served from the test fixtures by an in-process transport, or from a
+synthetic network with `--scale`, so no API key is needed. Event loop lag is
+measured while each benchmark runs, and `--offload` runs them with an `Offloader` to
+compare how responsive the loop stays.
+"""
+import argparse
+import asyncio
+import json
+import pathlib
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Mapping
+
+from wmataio.bus.const import BusEndpoint
+from wmataio.bus.util import find_direct_route_start_end_stop_pairs
+from wmataio.client import Client
+from wmataio.const import TZ, WMATAEndpoint
+from wmataio.exceptions import WMATAError
+from wmataio.helpers import parse_datetime, parse_datetimes, parse_epoch, parse_epochs
+from wmataio.models.coordinates import Coordinates
+from wmataio.offload import LoopLagMonitor, Offloader
+from wmataio.planner import JourneyPlanner
+from wmataio.rail.const import RailEndpoint
+from wmataio.server import ENDPOINT_PATHS, get_fixture_name
+from wmataio.synthetic import CENTER, SyntheticNetwork
+
+BASE_PATH = pathlib.Path(__file__).parents[1]
+FIXTURES_PATH = BASE_PATH / "test/fixtures/models"
+METRICS = ("wall_time", "allocated_peak", "max_rss")
+SERVICE_DATE = date(2023, 3, 31)
+PLANNER_QUERIES = 100
+
+
+class PayloadTransport:
+    """Transport that serves payloads keyed by fixture key."""
+
+    def __init__(self, payloads: Mapping[str, dict]) -> None:
+        """Initialize."""
+        self.payloads = payloads
+        self.api_types = {
+            enum_: api_type for enum_, api_type in ENDPOINT_PATHS.values()
+        }
+
+    async def fetch(
+        self,
+        enum_: BusEndpoint | RailEndpoint | WMATAEndpoint,
+        params: dict[str, Any] | None = None,
+        additional_path: str | None = None,
+    ) -> dict:
+        """Fetch the payload for a request."""
+        api_type = self.api_types[enum_]
+        key = f"{api_type}/{get_fixture_name(enum_, params, additional_path)}"
+        if key not in self.payloads:
+            raise WMATAError(f"No payload for {key}")
+        return self.payloads[key]
+
+
+def load_fixtures(path: pathlib.Path) -> dict[str, dict]:
+    """Load every fixture in a fixtures directory."""
+    payloads = {}
+    for fixture_path in path.glob("*/*.json"):
+        with open(fixture_path, "r") as fp:
+            payloads[f"{fixture_path.parent.name}/{fixture_path.stem}"] = json.load(fp)
+    return payloads
+
+
+@dataclass
+class Context:
+    """Entities the benchmarks are run against."""
+
+    route_id: str
+    stop_ids: tuple[str, str]
+    start: Coordinates
+    end: Coordinates
+
+
+FIXTURES_CONTEXT = Context(
+    "10A",
+    ("5002201", "4000025"),
+    Coordinates(38.9579014, -77.0343505),
+    Coordinates(38.9200463, -77.0342637),
+)
+
+
+def get_synthetic_context(network: SyntheticNetwork) -> Context:
+    """Get the benchmark context for a synthetic network."""
+    stops = network["bus/route_path..RouteID_R0"]["Direction0"]["Stops"]
+    return Context(
+        "R0",
+        (stops[0]["StopID"], stops[-1]["StopID"]),
+        Coordinates(CENTER[0] + 0.02, CENTER[1]),
+        Coordinates(CENTER[0] - 0.02, CENTER[1]),
+    )
+
+
+@dataclass
+class Benchmark:
+    """Benchmark of an async call."""
+
+    func: Callable[[Client, Context], Awaitable[Any]]
+    load_data: bool = True
+    fixtures_only: bool = False
+
+
+async def _load_data(client: Client, context: Context) -> None:
+    """Load bus and rail data."""
+    await asyncio.gather(client.bus.load_data(), client.rail.load_data())
+
+
+async def _find_direct_routes(client: Client, context: Context) -> Any:
+    """Find direct routes between the context's stops."""
+    stops = {client.bus.stops[stop_id] for stop_id in context.stop_ids}
+    return await find_direct_route_start_end_stop_pairs(client, stops, stops)
+
+
+async def _get_route_schedule_timestamps(client: Client, context: Context) -> list[str]:
+    """Get every timestamp in the context route's schedule."""
+    data = await client.fetch(
+        BusEndpoint.ROUTE_SCHEDULE,
+        params={"RouteID": context.route_id, "IncludingVariations": "false"},
+    )
+    return [
+        timestamp
+        for direction in ("Direction0", "Direction1")
+        for trip in data[direction] or []
+        for timestamp in (
+            trip["StartTime"],
+            trip["EndTime"],
+            *(stop_time["Time"] for stop_time in trip["StopTimes"]),
+        )
+    ]
+
+
+async def _parse_datetimes(client: Client, context: Context, cold: bool) -> Any:
+    """Parse the timestamps of the context route's schedule."""
+    timestamps = await _get_route_schedule_timestamps(client, context)
+    if cold:
+        parse_datetime.cache_clear()
+    return parse_datetimes(timestamps)
+
+
+async def _parse_epochs(client: Client, context: Context, cold: bool) -> Any:
+    """Parse the timestamps of the context route's schedule into epoch seconds."""
+    timestamps = await _get_route_schedule_timestamps(client, context)
+    if cold:
+        parse_epoch.cache_clear()
+    return parse_epochs(timestamps)
+
+
+async def _get_next_departures(client: Client, context: Context) -> Any:
+    """Get the next departures from every stop of the context route's timetable."""
+    timetable = await client.bus.get_route_timetable(
+        client.bus.routes[context.route_id]
+    )
+    departures = []
+    for direction in timetable.directions.values():
+        start = direction.times[0]
+        for stop_id in direction.stop_ids:
+            for offset in range(0, 86400, 3600):
+                departures.append(
+                    timetable.get_next_departures(
+                        client.bus.stops[stop_id],
+                        datetime.fromtimestamp(start + offset, TZ),
+                    )
+                )
+    return departures
+
+
+async def _get_local_stop_schedules(client: Client, context: Context) -> Any:
+    """Get the schedule of every stop of the context route from its schedule."""
+    stop_schedules = await client.bus.get_local_stop_schedules(
+        [client.bus.routes[context.route_id]]
+    )
+    return list(stop_schedules.values())
+
+
+async def _get_journey_planner(client: Client, context: Context) -> JourneyPlanner:
+    """Get a journey planner over the context route and MetroRail."""
+    return await client.get_journey_planner(
+        [client.bus.routes[context.route_id]], SERVICE_DATE
+    )
+
+
+# Planners by client ID, so that queries are measured without building a planner
+_PLANNERS: dict[int, JourneyPlanner] = {}
+
+
+async def _plan_journeys(client: Client, context: Context) -> Any:
+    """Plan journeys between random pairs of locations at the morning peak."""
+    if (planner := _PLANNERS.get(id(client))) is None:
+        planner = _PLANNERS[id(client)] = await _get_journey_planner(client, context)
+    locations = {**client.bus.stops, **client.rail.stations}
+    location_ids = sorted(planner.location_ids)
+    rng = random.Random(0)
+    departure = datetime.combine(SERVICE_DATE, datetime.min.time(), TZ).replace(hour=8)
+    return [
+        planner.plan(
+            locations[rng.choice(location_ids)],
+            locations[rng.choice(location_ids)],
+            departure,
+        )
+        for _ in range(PLANNER_QUERIES)
+    ]
+
+
+BENCHMARKS: dict[str, Benchmark] = {
+    "load_data": Benchmark(_load_data, load_data=False),
+    "bus.routes": Benchmark(lambda client, _: client.bus.get_all_routes()),
+    "bus.stops": Benchmark(lambda client, _: client.bus.get_stops()),
+    "bus.route_path": Benchmark(
+        lambda client, context: client.bus.get_route_path(
+            client.bus.routes[context.route_id]
+        )
+    ),
+    "bus.route_schedule": Benchmark(
+        lambda client, context: client.bus.get_route_schedule(
+            client.bus.routes[context.route_id]
+        )
+    ),
+    "bus.route_timetable": Benchmark(
+        lambda client, context: client.bus.get_route_timetable(
+            client.bus.routes[context.route_id]
+        )
+    ),
+    "bus.next_departures": Benchmark(_get_next_departures),
+    "bus.local_stop_schedules": Benchmark(_get_local_stop_schedules),
+    "planner.build": Benchmark(_get_journey_planner),
+    "planner.queries": Benchmark(_plan_journeys),
+    "bus.stop_schedule": Benchmark(
+        lambda client, _: client.bus.get_stop_schedule(client.bus.stops["1000533"]),
+        fixtures_only=True,
+    ),
+    "bus.live_positions": Benchmark(
+        lambda client, _: client.bus.get_live_positions(), fixtures_only=True
+    ),
+    "bus.next_buses": Benchmark(
+        lambda client, _: client.bus.get_next_buses_at_stop(
+            client.bus.stops["1002916"]
+        ),
+        fixtures_only=True,
+    ),
+    "bus.incidents": Benchmark(
+        lambda client, _: client.bus.get_bus_incidents(), fixtures_only=True
+    ),
+    "rail.lines": Benchmark(lambda client, _: client.rail.get_all_lines()),
+    "rail.stations": Benchmark(lambda client, _: client.rail.get_stations()),
+    "rail.track_circuits": Benchmark(
+        lambda client, _: client.rail.get_track_circuits()
+    ),
+    "rail.station_to_station": Benchmark(
+        lambda client, _: client.rail.get_station_to_station_data(
+            client.rail.stations["A15"], client.rail.stations["A01"]
+        ),
+        fixtures_only=True,
+    ),
+    "rail.live_positions": Benchmark(
+        lambda client, _: client.rail.get_live_positions(), fixtures_only=True
+    ),
+    "rail.next_trains": Benchmark(
+        lambda client, _: client.rail.get_next_trains_board(max_age=0),
+        fixtures_only=True,
+    ),
+    "rail.rail_incidents": Benchmark(
+        lambda client, _: client.rail.get_rail_incidents(), fixtures_only=True
+    ),
+    "rail.elevator_escalator_incidents": Benchmark(
+        lambda client, _: client.rail.get_elevator_escalator_incidents(),
+        fixtures_only=True,
+    ),
+    "helpers.stop_pairs": Benchmark(
+        lambda client, context: client.bus.get_stop_pairs_closest_to_coordinates(
+            context.start, context.end
+        )
+    ),
+    "helpers.station_pairs": Benchmark(
+        lambda client, context: client.rail.get_station_pairs_closest_to_coordinates(
+            context.start, context.end
+        )
+    ),
+    "helpers.direct_routes": Benchmark(_find_direct_routes),
+    "helpers.timestamps": Benchmark(
+        lambda client, context: _get_route_schedule_timestamps(client, context)
+    ),
+    "helpers.parse_datetimes_cold": Benchmark(
+        lambda client, context: _parse_datetimes(client, context, True)
+    ),
+    "helpers.parse_datetimes": Benchmark(
+        lambda client, context: _parse_datetimes(client, context, False)
+    ),
+    "helpers.parse_epochs_cold": Benchmark(
+        lambda client, context: _parse_epochs(client, context, True)
+    ),
+    "helpers.parse_epochs": Benchmark(
+        lambda client, context: _parse_epochs(client, context, False)
+    ),
+}
+
+
+def get_max_rss() -> int:
+    """Get the peak RSS of this process in bytes."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS reports bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+async def measure(
+    name: str, repeat: int, scale: float | None, offload: bool = False
+) -> dict[str, Any]:
+    """Measure a benchmark in this process."""
+    benchmark = BENCHMARKS[name]
+    if scale:
+        network = SyntheticNetwork(scale)
+        payloads: Mapping[str, dict] = network
+        context = get_synthetic_context(network)
+    else:
+        payloads = load_fixtures(FIXTURES_PATH)
+        context = FIXTURES_CONTEXT
+
+    def get_client() -> Client:
+        """Get a client that is served the payloads."""
+        return Client(
+            "",
+            calls_per_second=None,
+            transport=PayloadTransport(payloads),
+            offloader=Offloader() if offload else None,
+        )
+
+    client = get_client()
+    if benchmark.load_data:
+        await _load_data(client, context)
+    # Warm up caches of the payloads and of the benchmark itself
+    result = await benchmark.func(client, context)
+    setup_rss = get_max_rss()
+
+    wall_times = []
+    monitor = LoopLagMonitor()
+    monitor.start()
+    # Sleep for an interval around each run so that the monitor's pending sleep
+    # ends and records how long the run blocked the loop
+    await asyncio.sleep(monitor.interval)
+    for _ in range(repeat):
+        if not benchmark.load_data:
+            client = get_client()
+        start = time.perf_counter()
+        await benchmark.func(client, context)
+        wall_times.append(time.perf_counter() - start)
+        await asyncio.sleep(monitor.interval)
+    loop_lag = await monitor.stop()
+
+    tracemalloc.start()
+    await benchmark.func(get_client() if not benchmark.load_data else client, context)
+    _, allocated_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    wall_time = statistics.median(wall_times)
+    items = len(result) if hasattr(result, "__len__") else None
+    return {
+        "wall_time": wall_time,
+        "wall_time_min": min(wall_times),
+        "items": items,
+        "items_per_second": items / wall_time if items and wall_time else None,
+        "allocated_peak": allocated_peak,
+        "max_rss": get_max_rss(),
+        "setup_rss": setup_rss,
+        "loop_lag_max": loop_lag.max,
+        "loop_lag_mean": loop_lag.mean,
+    }
+
+
+def run(args: argparse.Namespace) -> None:
+    """Run benchmarks in separate processes and write the results."""
+    results = {}
+    for name, benchmark in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        if args.scale and benchmark.fixtures_only:
+            continue
+        command = [
+            sys.executable,
+            __file__,
+            "_measure",
+            name,
+            "--repeat",
+            str(args.repeat),
+        ]
+        if args.scale:
+            command += ["--scale", str(args.scale)]
+        if args.offload:
+            command.append("--offload")
+        process = subprocess.run(command, capture_output=True, text=True, check=True)
+        results[name] = json.loads(process.stdout)
+        print(
+            f"{name:<36} {results[name]['wall_time'] * 1000:>10.3f} ms "
+            f"{results[name]['allocated_peak'] / 1024:>12.1f} KiB "
+            f"{results[name]['max_rss'] / 1024 ** 2:>8.1f} MiB RSS "
+            f"loop lag {results[name]['loop_lag_mean'] * 1000:>6.1f} ms mean "
+            f"{results[name]['loop_lag_max'] * 1000:>6.1f} ms max"
+        )
+
+    output = {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "scale": args.scale,
+            "offload": args.offload,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as fp:
+        json.dump(output, fp, indent=4)
+    print(f"Results written to {args.output}")
+
+
+def compare(args: argparse.Namespace) -> None:
+    """Compare results against a baseline and flag regressions."""
+    with open(args.baseline, "r") as fp:
+        baseline = json.load(fp)["results"]
+    with open(args.current, "r") as fp:
+        current = json.load(fp)["results"]
+
+    regressions = []
+    for name, baseline_result in baseline.items():
+        if name not in current:
+            print(f"{name:<36} missing from current results")
+            continue
+        changes = []
+        for metric in METRICS:
+            if not (baseline_value := baseline_result.get(metric)):
+                continue
+            change = current[name][metric] / baseline_value - 1
+            flag = ""
+            if change > args.threshold:
+                flag = " REGRESSION"
+                regressions.append((name, metric, change))
+            changes.append(f"{metric} {change:+7.1%}{flag}")
+        print(f"{name:<36} {', '.join(changes)}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for name, metric, change in regressions:
+            print(f"  {name} {metric} {change:+.1%}")
+        sys.exit(1)
+    print(f"\nNo regressions above {args.threshold:.0%}")
+
+
+def main() -> None:
+    """Parse arguments and run the command."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks")
+    run_parser.add_argument("--output", type=pathlib.Path, default="benchmark.json")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument(
+        "--scale", type=float, help="Benchmark a synthetic network of this scale"
+    )
+    run_parser.add_argument("--filter", help="Only run benchmarks containing this")
+    run_parser.add_argument(
+        "--offload",
+        action="store_true",
+        help="Decode and build large payloads outside of the event loop",
+    )
+
+    compare_parser = subparsers.add_parser("compare", help="Compare results")
+    compare_parser.add_argument("baseline", type=pathlib.Path)
+    compare_parser.add_argument("current", type=pathlib.Path)
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative increase of a metric that counts as a regression",
+    )
+
+    measure_parser = subparsers.add_parser("_measure")
+    measure_parser.add_argument("name", choices=BENCHMARKS)
+    measure_parser.add_argument("--repeat", type=int, default=5)
+    measure_parser.add_argument("--scale", type=float)
+    measure_parser.add_argument("--offload", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        compare(args)
+    else:
+        result = asyncio.run(measure(args.name, args.repeat, args.scale, args.offload))
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -75,6 +75,7 @@ API_CALLS: dict[str, list[APICall]] = {
         {"enum": RailEndpoint.RAIL_INCIDENTS},
         {"enum": RailEndpoint.LINES},
         {"enum": RailEndpoint.NEXT_TRAINS, "additional_path": "A15"},
+        {"enum": RailEndpoint.NEXT_TRAINS, "additional_path": "All"},
         {"enum": RailEndpoint.STANDARD_ROUTES, "params": CONTENT_TYPE},
         {"enum": RailEndpoint.STATION_ENTRANCES},
         {"enum": RailEndpoint.STATION_PARKING_INFORMATION},
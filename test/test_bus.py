@@ -1,9 +1,16 @@
 """Test pywmataio client for buses."""
-from datetime import date, datetime
+import asyncio
+import json
+from datetime import date, datetime, timedelta
 
+import pytest
+
+from wmataio.bus.models.live_position import LiveBusPosition
 from wmataio.bus.util import find_direct_route_start_end_stop_pairs
 from wmataio.client import Client
 from wmataio.const import TZ
+from wmataio.exceptions import WMATAError
+from wmataio.incidents import IncidentEventType
 from wmataio.models.area import Area
 from wmataio.models.coordinates import Coordinates
 
@@ -210,3 +217,341 @@ async def test_get_stop_pairs_closest_to_coordinates(wmata_responses):
     assert pairs == [
         ((client.bus.stops["1002631"], 0.07), (client.bus.stops["1001746"], 0.12))
     ]
+
+
+async def test_watch_positions(wmata_responses, monkeypatch):
+    """Test MetroBus.watch_positions."""
+    client = Client("", test_mode=True)
+    watcher = client.bus.watch_positions(interval=0)
+    delta = await anext(watcher)
+    assert delta.added
+    assert not delta.moved
+    assert not delta.removed
+    positions = list(delta.current.values())
+    moved_position = LiveBusPosition(
+        client.bus, {**positions[0].data, "Lat": positions[0].data["Lat"] + 0.01}
+    )
+
+    async def get_live_positions(route=None, area=None):
+        return [moved_position, *positions[2:]]
+
+    monkeypatch.setattr(client.bus, "get_live_positions", get_live_positions)
+    delta = await anext(watcher)
+    assert not delta.added
+    assert delta.moved == {moved_position.vehicle_id: moved_position}
+    assert delta.removed == {positions[1].vehicle_id: positions[1]}
+    await watcher.aclose()
+
+
+async def test_get_next_buses_at_stops(wmata_responses):
+    """Test MetroBus.get_next_buses_at_stops."""
+    client = Client("", test_mode=True)
+    await client.bus.load_data()
+    stop = client.bus.stops["1002916"]
+    missing_stop = client.bus.stops["1000533"]
+    batch = client.bus.get_next_buses_at_stops(
+        [stop, missing_stop, stop], max_concurrency=2
+    )
+    results = [result async for result in batch]
+    assert len(results) == 1
+    result_stop, next_buses = results[0]
+    assert result_stop is stop
+    assert len(next_buses) == 3
+    assert list(batch.errors) == [missing_stop]
+
+    stats = batch.stats
+    assert stats.requested == 3
+    assert stats.unique == 2
+    assert stats.completed == 1
+    assert stats.failed == 1
+    assert len(stats.durations) == 2
+    assert stats.elapsed >= stats.first_result > 0
+    assert stats.slowest_duration >= stats.mean_duration > 0
+
+    batch = client.bus.get_next_buses_at_stops([stop])
+    assert list(await batch.results()) == [stop]
+
+    # Closing a batch early cancels its remaining requests and waits for them
+    batch = client.bus.get_next_buses_at_stops(
+        [stop, *list(client.bus.stops.values())[:5]], max_concurrency=1
+    )
+    assert (await anext(batch))[0] is stop
+    await batch.aclose()
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+
+
+async def test_watch_incidents(wmata_responses):
+    """Test MetroBus.watch_incidents."""
+    client = Client("", test_mode=True)
+    await client.bus.load_data()
+    feed = client.bus.watch_incidents(interval=0)
+    event = await anext(feed)
+    assert event.type == IncidentEventType.CREATED
+    assert len(feed.incidents) == 6
+    assert event.incident is feed.incidents[event.id]
+    assert set(feed.index["96"]) == {"B1D890F9-0A65-4FA4-A9AA-565B61CEC94A"}
+    await feed.aclose()
+
+    feed = client.bus.watch_incidents(route=client.bus.routes["10A"])
+    assert feed.update([]) == []
+
+
+async def test_canonical_instances(wmata_responses):
+    """Test that APIs return canonical stops and routes that compare by ID."""
+    client = Client("", test_mode=True)
+    area = Area(2000, 38.9031442, -77.0785817)
+
+    # Without a dataset, repeated calls return the first instances they built
+    stops = await client.bus.get_stops(area)
+    stop_id, stop = next(iter(stops.items()))
+    assert (await client.bus.get_stops(area))[stop_id] is stop
+    assert len(client.identities) == len(stops)
+
+    await client.bus.load_data()
+    assert client.bus.stops[stop_id] == stop
+    assert client.bus.stops[stop_id] is not stop
+    assert (await client.bus.get_stops(area))[stop_id] is client.bus.stops[stop_id]
+    routes = await client.bus.get_all_routes()
+    assert routes["10A"] is client.bus.routes["10A"]
+    assert stop in [client.bus.stops[stop_id]]
+    assert stop != client.bus.routes["10A"]
+
+
+async def test_update_positions_in_place(wmata_responses):
+    """Test updating live bus positions in place."""
+    client = Client("", test_mode=True)
+    positions = await client.bus.get_live_positions()
+    previous = {position.vehicle_id: position for position in positions}
+    assert "coordinates" in positions[0].changed
+
+    updated = await client.bus.get_live_positions(previous=previous)
+    assert all(position is previous[position.vehicle_id] for position in updated)
+    assert not any(position.changed for position in updated)
+
+    position = positions[0]
+    coordinates = position.coordinates
+    assert position.update({**position.data, "Lat": position.data["Lat"] + 0.01}) == {
+        "coordinates"
+    }
+    assert position.changed == {"coordinates"}
+    assert position.coordinates.latitude == coordinates.latitude + 0.01
+
+    # Fields whose keys are missing from newer data keep their values
+    deviation = position.deviation
+    data = {**position.data, "Lon": position.data["Lon"] + 0.01}
+    del data["Lat"], data["Deviation"]
+    assert position.update(data) == set()
+    assert position.coordinates.longitude == coordinates.longitude
+    assert position.deviation == deviation
+
+
+async def test_route_timetable(wmata_responses):
+    """Test querying a route's columnar timetable."""
+    client = Client("", test_mode=True)
+    await client.bus.load_data()
+    route = client.bus.routes["10A"]
+    route_schedule = await client.bus.get_route_schedule(route)
+    timetable = await client.bus.get_route_timetable(route)
+    assert route_schedule.timetable.directions.keys() == timetable.directions.keys()
+    assert len(timetable) == sum(
+        len(direction_schedule.stop_times)
+        for direction_schedules in route_schedule.directions_schedules.values()
+        for direction_schedule in direction_schedules
+    )
+
+    stop_times = sorted(
+        (
+            (stop_time.time, direction_schedule.trip_id, stop_time)
+            for direction_schedules in route_schedule.directions_schedules.values()
+            for direction_schedule in direction_schedules
+            for stop_time in direction_schedule.stop_times
+        ),
+        key=lambda item: item[:2],
+    )
+    stop = stop_times[len(stop_times) // 2][2].stop
+    at_stop = [
+        (time, trip_id)
+        for time, trip_id, stop_time in stop_times
+        if stop_time.stop == stop
+    ]
+    after = at_stop[len(at_stop) // 2][0]
+
+    departures = timetable.get_next_departures(stop, after, count=4)
+    assert (
+        sorted((departure.time, departure.trip_id) for departure in departures)
+        == [item for item in at_stop if item[0] >= after][:4]
+    )
+    assert all(departure.stop_id == stop.stop_id for departure in departures)
+
+    # Naive datetimes are in local time
+    assert (
+        timetable.get_next_departures(stop, after.replace(tzinfo=None), count=4)
+        == departures
+    )
+
+    end = after + timedelta(hours=2)
+    departures = timetable.get_departures_between(stop, after, end)
+    assert sorted((departure.time, departure.trip_id) for departure in departures) == [
+        item for item in at_stop if after <= item[0] < end
+    ]
+    for direction_num in timetable.directions:
+        assert {
+            departure.direction_num
+            for departure in timetable.get_departures_between(
+                stop, after, end, direction_num=direction_num
+            )
+        } <= {direction_num}
+    assert timetable.get_next_departures(stop, at_stop[-1][0] + timedelta(1)) == []
+    other_stop = next(
+        stop for stop in client.bus.stops.values() if route not in stop.routes
+    )
+    assert timetable.get_departures_between(other_stop, after, end) == []
+
+
+async def test_local_stop_schedules(wmata_responses):
+    """Test building stop schedules from route schedules."""
+    client = Client("", test_mode=True)
+    await client.bus.load_data()
+    route = client.bus.routes["10A"]
+    stop_schedules = await client.bus.get_local_stop_schedules([route])
+    assert stop_schedules.route_ids == {"10A"}
+    route_schedule = await client.bus.get_route_schedule(route)
+
+    expected: dict[str, list] = {}
+    for (
+        direction_num,
+        direction_schedules,
+    ) in route_schedule.directions_schedules.items():
+        for direction_schedule in direction_schedules:
+            for stop_time in direction_schedule.stop_times:
+                expected.setdefault(stop_time.stop_id, []).append(
+                    (stop_time.time, direction_num, direction_schedule.trip_id)
+                )
+    assert set(stop_schedules) == set(expected)
+    assert len(stop_schedules) == len(expected)
+
+    for stop_id, arrivals in stop_schedules.items():
+        assert all(arrival.stop is client.bus.stops[stop_id] for arrival in arrivals)
+        assert [arrival.schedule_time for arrival in arrivals] == sorted(
+            arrival.schedule_time for arrival in arrivals
+        )
+        assert sorted(
+            (arrival.schedule_time, arrival.direction_number, arrival.trip_id)
+            for arrival in arrivals
+        ) == sorted(expected[stop_id])
+
+    arrival = stop_schedules[stop_id][0]
+    direction_schedule = next(
+        direction_schedule
+        for direction_schedule in route_schedule.directions_schedules[
+            arrival.direction_number
+        ]
+        if direction_schedule.trip_id == arrival.trip_id
+    )
+    assert arrival.route == direction_schedule.route
+    assert arrival.start_time == direction_schedule.start_time
+    assert arrival.end_time == direction_schedule.end_time
+    assert arrival.direction == direction_schedule.direction
+    assert arrival.trip_headsign == direction_schedule.trip_headsign
+    assert stop_schedules[stop_id] is stop_schedules.get_stop_schedule(arrival.stop)
+
+    # Adding a route again replaces its arrivals
+    count = len(stop_schedules[stop_id])
+    stop_schedules.add(route, route_schedule.data)
+    assert len(stop_schedules[stop_id]) == count
+    assert stop_schedules.get_stop_schedule(client.bus.stops["1000533"]) == []
+
+
+async def test_schedule_cache(wmata_responses, monkeypatch):
+    """Test caching schedules by service date."""
+    client = Client("", test_mode=True)
+    await client.bus.load_data()
+    cache = client.bus.schedule_cache
+    now = datetime(2023, 3, 30, 22, 45, tzinfo=TZ)
+    monkeypatch.setattr(cache, "_now", lambda: now)
+    route = client.bus.routes["10A"]
+    stop = client.bus.stops["1000533"]
+
+    route_schedule = await cache.get_route_schedule(route)
+    assert await cache.get_route_schedule(route) is route_schedule
+    route_path, *stop_schedules = await asyncio.gather(
+        cache.get_route_path(route),
+        cache.get_stop_schedule(stop),
+        cache.get_stop_schedule(stop),
+    )
+    assert stop_schedules[0] is stop_schedules[1]
+    assert (cache.hits, cache.misses, len(cache)) == (2, 3, 3)
+
+    # Failed requests are not cached
+    async def get_route_path(route, date_=None):
+        raise WMATAError("Error while making request")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(client.bus, "get_route_path", get_route_path)
+        for _ in range(2):
+            with pytest.raises(WMATAError):
+                await cache.get_route_path(client.bus.routes["10B"])
+    assert len(cache) == 3
+
+    # Tomorrow's entries are prefetched, and today's are evicted after midnight
+    assert cache._get_seconds_until_prefetch() == 23 * 60 * 60 + 45 * 60
+    assert await cache.prefetch() == 3
+    assert await cache.prefetch() == 0
+    assert len(cache) == 6
+    tomorrow_route_schedule = await cache.get_route_schedule(route, date(2023, 3, 31))
+    now = datetime(2023, 3, 31, 0, 5, tzinfo=TZ)
+    assert len(cache) == 3
+    assert await cache.get_route_schedule(route) is tomorrow_route_schedule
+    assert tomorrow_route_schedule is not route_schedule
+    assert (cache.hits, cache.misses, cache.prefetched) == (4, 5, 3)
+
+    cache.start()
+    assert cache.running
+    await cache.stop()
+    assert not cache.running
+
+
+async def test_crawl(wmata_responses, tmp_path):
+    """Test crawling route paths and schedules into a resumable file."""
+    client = Client("", test_mode=True)
+    await client.bus.load_data()
+    path = tmp_path / "crawl.bin"
+    routes = [client.bus.routes["10A"], client.bus.routes["10B"]]
+    reports = []
+
+    def progress_callback(progress):
+        reports.append((progress, progress.completed, progress.failed))
+
+    progress = await client.bus.crawl(
+        path, routes, date(2023, 3, 31), progress_callback=progress_callback
+    )
+    # Only 10A has fixtures
+    assert (progress.total, progress.completed, progress.failed) == (4, 2, 2)
+    assert progress.remaining == 0
+    assert progress.eta == 0
+    assert reports[-1][0] is progress
+    # Failed requests are reported as they happen too
+    assert [completed + failed for _, completed, failed in reports] == [1, 2, 3, 4, 4]
+
+    route_paths, route_schedules = client.bus.read_crawl(path)
+    assert (
+        route_paths["10A"].data
+        == (await client.bus.get_route_path(routes[0], date(2023, 3, 31))).data
+    )
+    assert (
+        route_schedules["10A"].data
+        == (await client.bus.get_route_schedule(routes[0], date(2023, 3, 31))).data
+    )
+    # The crawl is stored compressed
+    assert path.stat().st_size < len(json.dumps(route_schedules["10A"].data)) / 5
+
+    # An interrupted crawl resumes without fetching what it already has
+    size = path.stat().st_size
+    with open(path, "ab") as fp:
+        fp.write(b"\x00\x03\x00")
+    progress = await client.bus.crawl(path, routes, date(2023, 3, 31))
+    assert (progress.resumed, progress.completed, progress.failed) == (2, 2, 2)
+    assert path.stat().st_size == size
+
+    with pytest.raises(ValueError):
+        await client.bus.crawl(path, routes, date(2023, 4, 1))
@@ -0,0 +1,31 @@
+"""Test pywmataio helpers."""
+from datetime import datetime
+
+from wmataio.const import TZ
+from wmataio.helpers import parse_datetime, parse_datetimes, parse_epoch, parse_epochs
+
+
+def test_parse_timestamps():
+    """Test parsing WMATA timestamps."""
+    timestamps = [
+        "2023-03-31T05:43:00",
+        "2023-03-31T05:43:00",
+        # Either side of the DST transitions
+        "2023-03-12T01:59:30",
+        "2023-03-12T03:00:01",
+        "2023-11-05T00:59:59",
+        "2023-11-05T02:15:00",
+        "2023-03-31T05:43:00.500000",
+    ]
+    expected = [
+        datetime.fromisoformat(value).replace(tzinfo=TZ) for value in timestamps
+    ]
+    assert parse_datetime(timestamps[0]) == expected[0]
+    assert parse_datetime(timestamps[0]) is parse_datetime(timestamps[1])
+    assert parse_datetimes(timestamps) == expected
+    assert [parse_epoch(value) for value in timestamps] == [
+        int(value.timestamp()) for value in expected
+    ]
+    epochs = parse_epochs(timestamps)
+    assert epochs.typecode == "q"
+    assert list(epochs) == [int(value.timestamp()) for value in expected]
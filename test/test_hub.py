@@ -0,0 +1,60 @@
+"""Test pywmataio polling hub."""
+from wmataio.client import Client
+from wmataio.rail.const import RailEndpoint
+
+CONTENT_TYPE = {"contentType": "json"}
+
+
+async def test_hub(wmata_responses):
+    """Test subscribing to shared pollers."""
+    client = Client("", test_mode=True)
+    hub = client.hub
+    subscription_1 = hub.subscribe(
+        RailEndpoint.TRAIN_POSITIONS, params=CONTENT_TYPE, interval=0.01
+    )
+    subscription_2 = hub.subscribe(
+        RailEndpoint.TRAIN_POSITIONS, params=CONTENT_TYPE, interval=1, maxsize=1
+    )
+    assert len(hub.keys) == 1
+    key = hub.keys[0]
+    assert hub.subscriber_count(key) == 2
+
+    # Both subscribers receive the same payload from a single request
+    payload = await anext(subscription_1)
+    assert len(payload["TrainPositions"]) == 82
+    assert await anext(subscription_2) is payload
+
+    # The poller uses the shortest interval and the slow subscriber drops the
+    # oldest payloads
+    for _ in range(3):
+        await anext(subscription_1)
+    assert subscription_2.dropped >= 2
+    assert subscription_1.dropped == 0
+
+    # A different endpoint gets its own poller
+    async with hub.subscribe(RailEndpoint.RAIL_INCIDENTS, interval=0.01) as incidents:
+        assert len((await anext(incidents))["Incidents"]) == 1
+        assert len(hub.keys) == 2
+    assert hub.keys == [key]
+
+    await subscription_1.aclose()
+    assert hub.subscriber_count(key) == 1
+    await subscription_2.aclose()
+    assert not hub.keys
+    assert [item async for item in subscription_2] == []
+
+
+async def test_shared_watch_positions(wmata_responses):
+    """Test that shared position watchers share deltas."""
+    client = Client("", test_mode=True)
+    watcher_1 = client.rail.watch_positions(interval=0, shared=True)
+    watcher_2 = client.rail.watch_positions(interval=0, shared=True)
+    assert len(client.hub.keys) == 1
+
+    delta = await anext(watcher_1)
+    assert len(delta.added) == 82
+    assert await anext(watcher_2) is delta
+
+    await watcher_1.aclose()
+    await watcher_2.aclose()
+    assert not client.hub.keys
@@ -0,0 +1,128 @@
+"""Test pywmataio dependency-aware loading."""
+import asyncio
+
+import pytest
+
+from wmataio.client import Client
+from wmataio.exceptions import WMATAError
+from wmataio.load import LoadPlan
+
+
+async def test_load_all(wmata_responses):
+    """Test loading bus and rail data together."""
+    client = Client("", test_mode=True)
+    report = await client.load_all()
+    assert len(client.bus.routes) == 390
+    assert len(client.bus.stops) == 9360
+    assert len(client.rail.lines) == 6
+    assert len(client.rail.stations) == 101
+    assert client.rail.circuit_positions
+
+    assert set(report.stages) == {
+        "bus.fetch.routes",
+        "bus.fetch.stops",
+        "bus.routes",
+        "bus.stops",
+        "bus.dataset",
+        "rail.fetch.standard_routes",
+        "rail.fetch.lines",
+        "rail.fetch.station_parking",
+        "rail.fetch.station_entrances",
+        "rail.fetch.station_timings",
+        "rail.fetch.stations",
+        "rail.lines",
+        "rail.stations",
+        "rail.circuit_positions",
+        "rail.dataset",
+    }
+    circuit_positions = report.stages["rail.circuit_positions"]
+    assert circuit_positions.started >= report.stages["rail.lines"].finished
+    assert all(stage.finished <= report.elapsed for stage in report.stages.values())
+    critical_path = report.critical_path
+    assert not critical_path[0].dependencies
+    assert critical_path[-1].finished == max(
+        stage.finished for stage in report.stages.values()
+    )
+
+    # Loading one API at a time uses the same stages
+    report = await Client("", test_mode=True).rail.load_data()
+    assert all(name.startswith("rail.") for name in report.stages)
+
+
+async def test_refresh(wmata_responses):
+    """Test swapping in refreshed datasets."""
+    client = Client("", test_mode=True)
+    await client.load_all()
+    assert client.bus.dataset.version == 1
+    assert client.rail.dataset.version == 1
+
+    bus = client.bus.snapshot()
+    rail = client.rail.snapshot()
+    stop = bus.stops["5002201"]
+    station = rail.stations["A15"]
+
+    # Refreshing swaps in new datasets without affecting snapshots
+    refresher = client.start_refresh(interval=0.01)
+    assert refresher.running
+    while refresher.refreshes < 2:
+        await asyncio.sleep(0.01)
+    await refresher.stop()
+    assert not refresher.running
+    assert refresher.failures == 0
+    assert refresher.last_report.stages
+
+    assert client.bus.dataset.version == 3
+    assert client.rail.dataset.version == 3
+    assert bus.dataset.version == 1
+    assert rail.dataset.version == 1
+    assert bus.stops["5002201"] is stop
+    assert client.bus.stops["5002201"] is not stop
+    assert rail.stations["A15"] is station
+    assert client.rail.stations["A15"] is not station
+
+    # Models keep a consistent view of the dataset they were built with
+    assert stop.bus.dataset.version == 1
+    assert stop.routes == {bus.routes[route_id] for route_id in stop.route_ids}
+    new_stop = client.bus.stops["5002201"]
+    assert new_stop.bus.dataset is client.bus.dataset
+    assert station.lines == {rail.lines["RD"]}
+
+    # Failed refreshes keep the current datasets
+    dataset = client.bus.dataset
+    wmata_responses.clear()
+    assert await refresher.refresh() is None
+    assert refresher.failures == 1
+    assert isinstance(refresher.last_error, WMATAError)
+    assert client.bus.dataset is dataset
+
+
+async def test_load_plan():
+    """Test load plan ordering and failures."""
+    plan = LoadPlan()
+    started = []
+
+    async def fetch(value):
+        started.append(value)
+        await asyncio.sleep(0.05)
+        return value
+
+    plan.add_fetch("a", lambda: fetch(1))
+    plan.add_fetch("b", lambda: fetch(2))
+    plan.add_build("sum", ["a", "b"], lambda a, b: a + b)
+    with pytest.raises(ValueError):
+        plan.add_build("sum", ["a"], lambda a: a)
+    with pytest.raises(ValueError):
+        plan.add_build("c", ["d"], lambda d: d)
+
+    report = await plan.run()
+    assert started == [1, 2]
+    # Fetches run concurrently
+    assert report.elapsed < 0.09
+    assert plan.stages == ["a", "b", "sum"]
+
+    async def fail():
+        raise WMATAError("Error while making request")
+
+    plan.add_fetch("fail", fail)
+    with pytest.raises(WMATAError):
+        await plan.run()
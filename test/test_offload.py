@@ -0,0 +1,65 @@
+"""Test pywmataio offloading of large payloads."""
+import asyncio
+import threading
+import time
+
+from wmataio.client import Client
+from wmataio.offload import LoopLagMonitor, Offloader
+
+
+async def test_offloader(wmata_responses):
+    """Test decoding and building large payloads outside of the event loop."""
+    offloader = Offloader(min_bytes=0, min_items=1000)
+    client = Client("", test_mode=True, offloader=offloader)
+    track_circuits = await client.rail.get_track_circuits()
+    assert track_circuits
+    assert offloader.decoded == 1
+    assert offloader.built == 1
+
+    # Payloads below the thresholds are handled on the event loop
+    offloader.min_bytes = offloader.min_items = 1_000_000
+    assert len(await client.rail.get_track_circuits()) == len(track_circuits)
+    assert offloader.decoded == offloader.built == 1
+
+    # Loading builds lines, stations and stops in the offloader
+    offloader.min_items = 1000
+    await client.load_all()
+    assert offloader.built == 4
+    assert client.rail.stations["A01"].station_times
+    assert client.rail.lines["RD"].standard_routes
+    route_schedule = await client.bus.get_route_schedule(client.bus.routes["10A"])
+    assert route_schedule.directions_schedules
+
+
+async def test_offloader_build():
+    """Test that builds above the threshold run in another thread."""
+    offloader = Offloader(min_items=10)
+    assert await offloader.build(threading.get_ident, items=1) == threading.get_ident()
+    assert await offloader.build(threading.get_ident, items=10) != threading.get_ident()
+    assert await offloader.decode(b'{"a": 1}') == {"a": 1}
+    assert offloader.decoded == 0
+
+
+async def test_loop_lag_monitor():
+    """Test measuring event loop lag."""
+    monitor = LoopLagMonitor(0.001)
+    monitor.start()
+    assert monitor.running
+    await asyncio.sleep(0.01)
+    time.sleep(0.05)
+    await asyncio.sleep(0.01)
+    stats = await monitor.stop()
+    assert not monitor.running
+    assert stats.samples > 1
+    assert stats.max >= 0.04
+    assert 0 < stats.mean <= stats.max
+    assert monitor.reset() is stats
+    assert monitor.stats.samples == 0
+
+    # Blocking right before stopping is counted from the pending sleep
+    monitor.start()
+    await asyncio.sleep(0)
+    time.sleep(0.05)
+    stats = await monitor.stop()
+    assert stats.samples == 1
+    assert stats.max >= 0.04
@@ -0,0 +1,168 @@
+"""Test pywmataio journey planner."""
+from datetime import date, datetime, timedelta
+
+from haversine import Unit, haversine
+
+from wmataio.client import Client
+from wmataio.const import TZ
+from wmataio.planner import JourneyPlanner
+
+DEPARTURE = datetime(2023, 3, 31, 8, 0, tzinfo=TZ)
+
+
+async def _get_client_and_planner():
+    """Get a client with loaded data and a planner for the 10A and MetroRail."""
+    client = Client("", test_mode=True)
+    await client.load_all()
+    planner = await client.get_journey_planner(
+        [client.bus.routes["10A"]], date(2023, 3, 31)
+    )
+    return client, planner
+
+
+def _assert_connected(journey, departure):
+    """Assert that the legs of a journey connect in order."""
+    assert journey.departure >= departure
+    for leg, next_leg in zip(journey.legs, journey.legs[1:]):
+        assert leg.to_id == next_leg.from_id
+        assert leg.arrival <= next_leg.departure
+    assert all(leg.departure <= leg.arrival for leg in journey.legs)
+
+
+async def test_plan(wmata_responses):
+    """Test planning journeys between stops and stations."""
+    client, planner = await _get_client_and_planner()
+    assert len(planner) > len(client.rail.stations)
+
+    # Rail only
+    journeys = planner.plan(
+        client.rail.stations["A15"], client.rail.stations["A01"], DEPARTURE
+    )
+    assert len(journeys) == 1
+    (leg,) = journeys[0].legs
+    assert (leg.mode, leg.route_id, leg.from_id, leg.to_id) == (
+        "rail",
+        "RD",
+        "A15",
+        "A01",
+    )
+    assert timedelta(minutes=30) < journeys[0].duration < timedelta(minutes=45)
+    _assert_connected(journeys[0], DEPARTURE)
+
+    # The direct journey matches the earliest direct trip in the route schedule
+    route_schedule = await client.bus.get_route_schedule(
+        client.bus.routes["10A"], date(2023, 3, 31)
+    )
+    direction_schedule = route_schedule.directions_schedules[0][0]
+    origin = direction_schedule.stop_times[0].stop
+    destination = direction_schedule.stop_times[-1].stop
+    direct_arrival = min(
+        end.time
+        for direction_schedules in route_schedule.directions_schedules.values()
+        for direction_schedule in direction_schedules
+        for start in direction_schedule.stop_times
+        for end in direction_schedule.stop_times
+        if start.stop == origin
+        and end.stop == destination
+        and start.stop_sequence < end.stop_sequence
+        and start.time >= DEPARTURE
+    )
+    bus_planner = JourneyPlanner()
+    bus_planner.add_route_schedule(route_schedule)
+    journey = bus_planner.plan(origin, destination, DEPARTURE)[0]
+    assert journey.transfers == 0
+    assert {leg.route_id for leg in journey.legs if leg.mode != "walk"} == {"10A"}
+    assert journey.arrival == direct_arrival
+
+    # Walking to MetroRail beats the direct bus
+    journeys = planner.plan(origin, destination, DEPARTURE)
+    assert journeys[0].arrival < direct_arrival
+    assert [leg.mode for leg in journeys[0].legs] == ["walk", "rail", "walk"]
+    # Journeys with more transfers are only returned if they arrive earlier
+    for journey, next_journey in zip(journeys, journeys[1:]):
+        assert journey.transfers < next_journey.transfers
+        assert journey.arrival > next_journey.arrival
+    for journey in journeys:
+        _assert_connected(journey, DEPARTURE)
+        assert journey.legs[0].from_id == origin.stop_id
+        assert journey.legs[-1].to_id == destination.stop_id
+
+    # Bus to rail
+    journeys = planner.plan(
+        client.bus.stops["4000010"], client.rail.stations["A01"], DEPARTURE
+    )
+    assert [leg.mode for leg in journeys[0].legs][:3] == ["bus", "walk", "rail"]
+
+    assert planner.plan(origin, client.bus.stops["1000533"], DEPARTURE) == []
+
+    # Journeys can start by walking from the origin
+    journeys = planner.plan(
+        client.bus.stops["6000938"], client.rail.stations["A01"], DEPARTURE
+    )
+    assert journeys
+    for journey in journeys:
+        _assert_connected(journey, DEPARTURE)
+        assert journey.legs[0].mode == "walk"
+        assert journey.legs[0].from_id == "6000938"
+        assert journey.legs[0].to_id == "C07"
+        assert journey.legs[-1].to_id == "A01"
+
+    # Walking is the fastest way to a nearby station
+    journeys = planner.plan(
+        client.bus.stops["4000478"], client.rail.stations["C12"], DEPARTURE
+    )
+    assert len(journeys) == 1
+    (leg,) = journeys[0].legs
+    assert (leg.mode, leg.from_id, leg.to_id) == ("walk", "4000478", "C12")
+    assert leg.departure == DEPARTURE
+    assert journeys[0].duration < timedelta(minutes=1)
+
+
+async def test_plan_between_coordinates(wmata_responses):
+    """Test planning journeys between coordinates."""
+    client, planner = await _get_client_and_planner()
+    start = client.rail.stations["A15"].coordinates
+    end = client.rail.stations["K08"].coordinates
+    journeys = planner.plan_between_coordinates(start, end, DEPARTURE)
+    assert journeys
+    for journey in journeys:
+        _assert_connected(journey, DEPARTURE)
+        assert journey.legs[0].from_id in ("start", "A15")
+        assert journey.legs[-1].to_id in ("end", "K08")
+        assert journey.transfers >= 1
+
+    # Coordinates next to each other are walked between
+    journeys = planner.plan_between_coordinates(start, start, DEPARTURE)
+    assert len(journeys) == 1
+    (leg,) = journeys[0].legs
+    assert (leg.mode, leg.from_id, leg.to_id) == ("walk", "start", "end")
+    assert leg.departure == DEPARTURE
+
+    # Nothing is within walking distance of the middle of the Potomac
+    assert (
+        planner.plan_between_coordinates(
+            start.__class__(38.85, -77.2), end, DEPARTURE, max_walking_distance=0.1
+        )
+        == []
+    )
+
+
+async def test_footpaths(wmata_responses):
+    """Test that walking transfers connect every pair within the transfer distance."""
+    _, planner = await _get_client_and_planner()
+    coordinates = [
+        (node, point) for node, point in enumerate(planner._coordinates) if point
+    ]
+    expected = {
+        (node, other)
+        for node, point in coordinates
+        for other, other_point in coordinates
+        if node != other
+        and haversine(point, other_point, unit=Unit.MILES) <= planner.transfer_distance
+    }
+    assert expected
+    assert {
+        (node, other)
+        for node, footpaths in enumerate(planner._footpaths)
+        for other, _ in footpaths
+    } == expected
@@ -3,8 +3,12 @@ from datetime import date, datetime, time
 
 from wmataio.client import Client
 from wmataio.const import TZ
+from wmataio.incidents import IncidentEventType
 from wmataio.models.coordinates import Coordinates
-from wmataio.rail.models.live_position import TrainDirection
+from wmataio.rail.const import RailEndpoint
+from wmataio.rail.eta import TrainEtaEngine
+from wmataio.rail.models.live_position import LiveTrainPosition, TrainDirection
+from wmataio.rail.models.next_train import NextTrain
 
 
 async def test_rail_apis(wmata_responses):
@@ -204,6 +208,43 @@ async def test_rail_apis(wmata_responses):
     assert live_position.line is None
     assert live_position.seconds_at_location == 12157
     assert live_position.service_type == "Unknown"
+    assert live_position.circuit_positions == {}
+    assert live_position.circuit_position is None
+
+    assert len(client.rail.circuit_positions) == 3230
+    circuit_position = client.rail.circuit_positions[2603]["BL"]
+    assert circuit_position.line_code == "BL"
+    assert circuit_position.line == line
+    assert circuit_position.track_number == 1
+    assert circuit_position.sequence_number == 0
+    assert circuit_position.previous_station_code is None
+    assert circuit_position.previous_station is None
+    assert circuit_position.next_station_code == "J03"
+    assert circuit_position.next_station == client.rail.stations["J03"]
+    assert circuit_position.fraction is None
+    assert not circuit_position.at_station
+
+    live_position = live_positions["221"]
+    assert set(live_position.circuit_positions) == {"BL", "YL"}
+    circuit_position = live_position.circuit_position
+    assert circuit_position.line_code == "BL"
+    assert circuit_position.previous_station_code == "C13"
+    assert circuit_position.next_station_code == "C13"
+    assert circuit_position.fraction == 0
+    assert circuit_position.at_station
+
+    circuit_position = live_positions["439"].circuit_position
+    assert circuit_position.line_code == "BL"
+    assert circuit_position.track_number == 2
+    assert circuit_position.sequence_number == 96
+    assert circuit_position.previous_station == client.rail.stations["C12"]
+    assert circuit_position.next_station == client.rail.stations["C10"]
+    assert round(circuit_position.fraction, 2) == 0.24
+
+    # Train running off of its line falls back to the circuit's only line
+    circuit_position = live_positions["193"].circuit_position
+    assert live_positions["193"].line_code == "BL"
+    assert circuit_position.line_code == "OR"
 
     track_circuits = await client.rail.get_track_circuits()
     assert len(track_circuits) == 3315
@@ -243,3 +284,247 @@ async def test_get_station_pairs_closest_to_coordinates(wmata_responses):
     assert pairs == [
         ((client.rail.stations["E05"], 1.59), (client.rail.stations["E03"], 0.38))
     ]
+
+
+async def test_train_eta_engine(wmata_responses):
+    """Test TrainEtaEngine."""
+    client = Client("", test_mode=True)
+    engine = TrainEtaEngine(client.rail)
+    estimates = await engine.update()
+    assert len(estimates) == 94
+
+    next_trains = estimates["A01"]
+    assert [
+        (next_train.destination_station_code, next_train.minutes)
+        for next_train in next_trains
+    ] == [("A15", 11), ("B11", 14), ("B11", 24), ("A15", 27), ("B11", 36)]
+    next_train = next_trains[0]
+    assert next_train.location == client.rail.stations["A01"]
+    assert next_train.location_name == "Metro Center"
+    assert next_train.line == client.rail.lines["RD"]
+    assert next_train.destination_station == client.rail.stations["A15"]
+    assert next_train.destination_station_name == "Shady Grove"
+    assert next_train.group == 2
+    assert estimates["C05"][0].minutes == "BRD"
+
+    # Trains at their destination are not estimated
+    assert "B11" not in estimates
+
+    # A train that covers 10 circuits in 60 seconds lowers their estimates
+    positions = await client.rail.get_live_positions()
+    train = positions["165"]
+    engine.learn(positions, now=1000)
+    moved_train = LiveTrainPosition(
+        client.rail, {**train.data, "CircuitId": 143, "SecondsAtLocation": 0}
+    )
+    engine.learn({"165": moved_train}, now=1000 - train.seconds_at_location + 60)
+    assert len(engine.circuit_seconds) == 10
+    assert {round(seconds, 1) for seconds in engine.circuit_seconds.values()} == {10.8}
+
+    # Trains bound for a station with two codes stop at the platform of either one
+    rerouted_train = LiveTrainPosition(
+        client.rail, {**positions["184"].data, "DestinationStationCode": "C01"}
+    )
+    assert set(engine.estimate({"184": rerouted_train})) == {
+        "B01",
+        "B02",
+        "B03",
+        "B04",
+        "B35",
+    }
+
+    prediction = NextTrain(client.rail, {**next_trains[1].data, "Min": "16"})
+    accuracy = engine.compare(estimates, [prediction])
+    assert accuracy.compared == 1
+    assert accuracy.unmatched == 0
+    assert accuracy.mean_absolute_error == 2
+    assert accuracy.within_one_minute == 0
+
+    accuracy = engine.compare(
+        estimates,
+        await client.rail.get_next_trains_at_station(client.rail.stations["A15"]),
+    )
+    assert accuracy.compared == 0
+    assert accuracy.unmatched == 2
+    assert accuracy.mean_absolute_error is None
+
+
+async def test_watch_positions(wmata_responses, monkeypatch):
+    """Test MetroRail.watch_positions."""
+    client = Client("", test_mode=True)
+    watcher = client.rail.watch_positions(interval=0)
+    delta = await anext(watcher)
+    assert len(delta.added) == 82
+    assert not delta.moved
+    assert not delta.removed
+    assert delta.current == delta.added
+
+    positions = dict(delta.current)
+    train = positions.pop("075")
+    positions["221"] = LiveTrainPosition(
+        client.rail, {**positions["221"].data, "CircuitId": 970}
+    )
+    positions["999"] = LiveTrainPosition(client.rail, {**train.data, "TrainId": "999"})
+
+    async def get_live_positions():
+        return positions
+
+    monkeypatch.setattr(client.rail, "get_live_positions", get_live_positions)
+    delta = await anext(watcher)
+    assert list(delta.added) == ["999"]
+    assert list(delta.moved) == ["221"]
+    assert delta.removed == {"075": train}
+    assert delta.current is positions
+    await watcher.aclose()
+
+
+async def test_next_trains_board(wmata_responses):
+    """Test the network wide next trains board."""
+    client = Client("", test_mode=True)
+    await client.rail.load_data()
+    stations = client.rail.stations
+    board = await client.rail.get_next_trains_board()
+    assert len(board.next_trains) == 13
+    assert set(board.by_location_code) == {"A01", "A15", "B11", "C01"}
+    assert len(board.by_line_code["RD"]) == 8
+    assert len(board.by_line_code[None]) == 1
+    assert len(board.by_destination_code["A15"]) == 4
+
+    # The board is reused until it is older than max_age
+    assert await client.rail.get_next_trains_board() is board
+    assert await client.rail.get_next_trains_board(max_age=0) is not board
+
+    next_trains = await client.rail.get_next_trains_at_station(
+        stations["A15"], max_age=60
+    )
+    assert next_trains == await client.rail.get_next_trains_at_station(stations["A15"])
+
+    next_trains = board.get([stations["A01"], stations["C01"]])
+    assert [next_train.minutes for next_train in next_trains] == [
+        None,
+        "BRD",
+        "ARR",
+        3,
+        4,
+        8,
+        9,
+        11,
+        14,
+    ]
+    next_trains = board.get(stations["A01"], destination=stations["B11"])
+    assert [next_train.minutes for next_train in next_trains] == [3, 11]
+    next_trains = board.get(line=client.rail.lines["RD"], destination=stations["A15"])
+    assert [
+        (next_train.location_code, next_train.minutes) for next_train in next_trains
+    ] == [("A01", "BRD"), ("B11", "BRD"), ("A01", 8), ("B11", 12)]
+    assert len(board.get(destination=stations["G05"])) == 1
+    assert board.get() == board.next_trains
+
+
+async def test_watch_incidents(wmata_responses):
+    """Test rail incident change feeds."""
+    client = Client("", test_mode=True)
+    await client.rail.load_data()
+    feed = client.rail.watch_elevator_escalator_incidents(interval=0)
+    event = await anext(feed)
+    assert event.type == IncidentEventType.CREATED
+    assert len(feed.incidents) == 34
+    assert event.incident is feed.incidents[event.id]
+    assert set(feed.index["C05"]) == {"C05E03"}
+    assert sum(len(incidents) for incidents in feed.index.values()) == 34
+
+    incidents_data = (await client.fetch(RailEndpoint.ELEVATOR_ESCALATOR_INCIDENTS))[
+        "ElevatorIncidents"
+    ]
+    resolved = feed.incidents["C05E03"]
+    unchanged = feed.incidents[incidents_data[1]["UnitName"]]
+    updated_data = {**incidents_data[1], "DateUpdated": "2023-04-01T08:00:00"}
+    created_data = {**incidents_data[2], "UnitName": "A01E99", "StationCode": "A01"}
+    incidents_data = [
+        updated_data if index == 1 else incident_data
+        for index, incident_data in enumerate(incidents_data)
+        if incident_data["UnitName"] != "C05E03"
+    ]
+    events = feed.update([*incidents_data, created_data])
+    assert [(event.type, event.id) for event in events] == [
+        (IncidentEventType.UPDATED, updated_data["UnitName"]),
+        (IncidentEventType.CREATED, "A01E99"),
+        (IncidentEventType.RESOLVED, "C05E03"),
+    ]
+    assert events[0].incident is not unchanged
+    assert events[2].incident is resolved
+    assert "C05" not in feed.index
+    assert "A01E99" in feed.index["A01"]
+    assert feed.update([*incidents_data, created_data]) == []
+    await feed.aclose()
+
+    feed = client.rail.watch_rail_incidents()
+    events = feed.update((await client.fetch(RailEndpoint.RAIL_INCIDENTS))["Incidents"])
+    assert len(events) == 1
+    assert feed.index["YL"] == {events[0].id: events[0].incident}
+    assert [event.type for event in feed.update([])] == [IncidentEventType.RESOLVED]
+    assert not feed.index
+
+
+async def test_canonical_instances(wmata_responses):
+    """Test that APIs return canonical stations and lines that compare by ID."""
+    client = Client("", test_mode=True)
+    await client.rail.load_data()
+    stations = await client.rail.get_stations()
+    assert stations["A01"] is client.rail.stations["A01"]
+    lines = await client.rail.get_all_lines()
+    assert lines["RD"] is client.rail.lines["RD"]
+    assert stations["A01"] != stations["A02"]
+    assert stations["A01"] != lines["RD"]
+
+
+async def test_update_in_place(wmata_responses, monkeypatch):
+    """Test updating live train positions and next trains in place."""
+    client = Client("", test_mode=True)
+    await client.rail.load_data()
+    board = await client.rail.get_next_trains_board()
+    next_trains = set(map(id, board.next_trains))
+    assert await client.rail.get_next_trains_board(max_age=0, in_place=True) is board
+    assert set(map(id, board.next_trains)) == next_trains
+    assert not any(next_train.changed for next_train in board.next_trains)
+
+    # Fields whose keys are missing from newer data keep their values
+    next_train = board.next_trains[0]
+    minutes = next_train.minutes
+    data = {**next_train.data, "Car": 6}
+    del data["Min"]
+    assert next_train.update(data) == {"num_cars"}
+    assert next_train.num_cars == 6
+    assert next_train.minutes == minutes
+
+    watcher = client.rail.watch_positions(interval=0, in_place=True)
+    positions = dict((await anext(watcher)).current)
+    data = await client.fetch(
+        RailEndpoint.TRAIN_POSITIONS, params={"contentType": "json"}
+    )
+    trains_data = [
+        {**train_data, "CircuitId": 970}
+        if train_data["TrainId"] == "221"
+        else train_data
+        for train_data in data["TrainPositions"]
+        if train_data["TrainId"] != "075"
+    ]
+
+    async def fetch(*args, **kwargs):
+        return {"TrainPositions": trains_data}
+
+    monkeypatch.setattr(client, "fetch", fetch)
+    delta = await anext(watcher)
+    assert not delta.added
+    assert delta.moved == {"221": positions["221"]}
+    assert delta.moved["221"] is positions["221"]
+    assert positions["221"].changed == {"circuit_id"}
+    assert positions["221"].circuit_id == 970
+    seconds_at_location = positions["221"].seconds_at_location
+    data = {**positions["221"].data, "CircuitId": 971}
+    del data["SecondsAtLocation"]
+    assert positions["221"].update(data) == {"circuit_id"}
+    assert positions["221"].seconds_at_location == seconds_at_location
+    assert list(delta.removed) == ["075"]
+    assert all(delta.current[id_] is positions[id_] for id_ in delta.current)
+    await watcher.aclose()
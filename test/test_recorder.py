@@ -0,0 +1,102 @@
+"""Test pywmataio position recorder."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from wmataio.client import Client
+from wmataio.const import TZ
+from wmataio.recorder import (
+    BUS_POSITIONS_FILE,
+    BUS_RECORD,
+    HEADER,
+    MAGIC,
+    STRINGS_FILE,
+    VERSION,
+    PositionReader,
+    PositionRecorder,
+)
+
+
+async def test_recorder(wmata_responses, tmp_path):
+    """Test recording and reading back live positions."""
+    client = Client("", test_mode=True)
+    bus_positions = await client.bus.get_live_positions()
+    train_positions = list((await client.rail.get_live_positions()).values())
+    start = datetime(2023, 3, 1, 8, tzinfo=TZ)
+
+    with PositionRecorder(tmp_path) as recorder:
+        for poll in range(3):
+            timestamp = start + timedelta(seconds=10 * poll)
+            assert recorder.record_bus_positions(bus_positions, timestamp) == len(
+                bus_positions
+            )
+            recorder.record_train_positions(train_positions, timestamp)
+
+    # Records are fixed width and strings are only stored once
+    assert (tmp_path / BUS_POSITIONS_FILE).stat().st_size == HEADER.size + 3 * len(
+        bus_positions
+    ) * BUS_RECORD.size
+    reader = PositionReader(tmp_path)
+    assert len(reader.strings) == len(set(reader.strings))
+
+    records = list(reader.bus_positions())
+    assert len(records) == 3 * len(bus_positions)
+    assert records[0].timestamp == start
+    assert records[-1].timestamp == start + timedelta(seconds=20)
+    position = bus_positions[0]
+    assert records[0].vehicle_id == position.vehicle_id
+    assert records[0].route_id == position.route_id
+    assert records[0].last_update == position.last_update
+    assert abs(records[0].latitude - position.coordinates.latitude) < 1e-4
+
+    # Reopening a recording appends to it
+    with PositionRecorder(tmp_path) as recorder:
+        recorder.record_train_positions(train_positions, start + timedelta(seconds=30))
+    assert PositionReader(tmp_path).strings == reader.strings
+    records = list(PositionReader(tmp_path).train_positions())
+    assert len(records) == 4 * len(train_positions)
+    assert records[-1].timestamp == start + timedelta(seconds=30)
+    position = train_positions[-1]
+    record = records[-1]
+    assert record.train_id == position.train_id
+    assert record.line_code == position.line_code
+    assert record.destination_station_code == position.destination_station_code
+    assert record.direction == position.direction
+    assert record.service_type == position.service_type
+    assert record.circuit_id == position.circuit_id
+
+    # Polls timestamped before the start of a recording are recorded too
+    with PositionRecorder(tmp_path) as recorder:
+        recorder.record_bus_positions(bus_positions, start - timedelta(seconds=5))
+    records = list(PositionReader(tmp_path).bus_positions())
+    assert records[-1].timestamp == start - timedelta(seconds=5)
+
+    # A string or record cut short by an interrupted recorder is dropped on reopen
+    with open(tmp_path / BUS_POSITIONS_FILE, "ab") as fp:
+        fp.write(b"\x00" * (BUS_RECORD.size // 2))
+    with open(tmp_path / STRINGS_FILE, "a", encoding="utf-8") as fp:
+        fp.write("partial")
+    with PositionRecorder(tmp_path) as recorder:
+        recorder.record_bus_positions(bus_positions, start + timedelta(seconds=40))
+    reader = PositionReader(tmp_path)
+    assert "partial" not in reader.strings
+    appended = list(reader.bus_positions())
+    assert len(appended) == len(records) + len(bus_positions)
+    assert appended[-1].vehicle_id == bus_positions[-1].vehicle_id
+    assert appended[-1].timestamp == start + timedelta(seconds=40)
+
+    # Recordings in another format aren't appended to
+    (tmp_path / "old").mkdir()
+    with open(tmp_path / "old" / BUS_POSITIONS_FILE, "wb") as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION - 1, 0))
+    with PositionRecorder(tmp_path / "old") as recorder, pytest.raises(ValueError):
+        recorder.record_bus_positions(bus_positions, start)
+
+    # Polls too far from the start are rejected without interning their strings
+    with PositionRecorder(tmp_path / "skewed") as recorder:
+        recorder.record_bus_positions([], start)
+        with pytest.raises(ValueError):
+            recorder.record_bus_positions(
+                bus_positions, datetime(1900, 1, 1, tzinfo=TZ)
+            )
+    assert PositionReader(tmp_path / "skewed").strings == []
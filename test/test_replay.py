@@ -0,0 +1,63 @@
+"""Test pywmataio response recording and replay."""
+import pytest
+
+from wmataio.client import Client
+from wmataio.exceptions import WMATAError
+from wmataio.replay import ReplayTransport, ResponseRecorder, read_recorded_responses
+
+
+async def test_replay(wmata_responses, tmp_path):
+    """Test recording responses and replaying them through a client."""
+    path = tmp_path / "responses.jsonl"
+    client = Client("", test_mode=True)
+    with ResponseRecorder(path, client.request) as client.transport:
+        live_positions = await client.rail.get_live_positions()
+        await client.rail.get_rail_incidents()
+
+    records = read_recorded_responses(path)
+    assert [record["endpoint"] for record in records] == [
+        "RailEndpoint.TRAIN_POSITIONS",
+        "RailEndpoint.RAIL_INCIDENTS",
+    ]
+
+    # Add two later polls of train positions, each with one less train
+    positions = records[0]
+    for poll in range(1, 3):
+        records.append(
+            {
+                **positions,
+                "timestamp": positions["timestamp"] + 10 * poll,
+                "response": {
+                    "TrainPositions": positions["response"]["TrainPositions"][poll:]
+                },
+            }
+        )
+
+    # Without a speedup, each request is served the next recorded response
+    replay_client = Client("", transport=(transport := ReplayTransport(records)))
+    assert transport.now is None
+    replayed_positions = await replay_client.rail.get_live_positions()
+    assert replayed_positions.keys() == live_positions.keys()
+    assert transport.now == positions["timestamp"]
+    assert len(await replay_client.rail.get_live_positions()) == 81
+    assert not transport.finished
+    assert len(await replay_client.rail.get_live_positions()) == 80
+    assert len(await replay_client.rail.get_rail_incidents()) == 1
+    assert transport.finished
+    assert transport.now == positions["timestamp"] + 20
+    assert len(await replay_client.rail.get_live_positions()) == 80
+
+    with pytest.raises(WMATAError):
+        await replay_client.bus.get_live_positions()
+
+    # With a speedup, requests are served the response recorded at replay time
+    clock = [100.0]
+    transport = ReplayTransport(records, speedup=1000, clock=lambda: clock[0])
+    replay_client = Client("", transport=transport)
+    assert len(await replay_client.rail.get_live_positions()) == 82
+    clock[0] += 0.012
+    assert len(await replay_client.rail.get_live_positions()) == 81
+    assert not transport.finished
+    clock[0] += 0.01
+    assert len(await replay_client.rail.get_live_positions()) == 80
+    assert transport.finished
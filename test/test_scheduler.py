@@ -0,0 +1,112 @@
+"""Test pywmataio adaptive scheduler."""
+import json
+
+from wmataio.client import Client
+from wmataio.rail.const import RailEndpoint
+from wmataio.rate_limit import RateLimiter
+from wmataio.scheduler import AdaptiveScheduler, get_change_fraction
+
+with open(
+    "test/fixtures/models/rail/train_positions..contentType_json.json", "r"
+) as fp:
+    TRAIN_POSITIONS = json.load(fp)
+
+
+def _move_trains(count: int) -> dict:
+    """Return train positions with the first `count` trains moved."""
+    return {
+        "TrainPositions": [
+            {**position, "CircuitId": position["CircuitId"] + 1}
+            if index < count
+            else position
+            for index, position in enumerate(TRAIN_POSITIONS["TrainPositions"])
+        ]
+    }
+
+
+def test_get_change_fraction():
+    """Test get_change_fraction function."""
+    endpoint = RailEndpoint.TRAIN_POSITIONS
+    assert get_change_fraction(endpoint, TRAIN_POSITIONS, TRAIN_POSITIONS) == 0
+    assert get_change_fraction(endpoint, TRAIN_POSITIONS, _move_trains(41)) == 0.5
+    assert get_change_fraction(endpoint, TRAIN_POSITIONS, {"TrainPositions": []}) == 1
+    assert get_change_fraction(endpoint, {}, {}) == 0
+
+    trains = {"Trains": [{"LocationCode": "A01", "Min": "3"}]}
+    assert get_change_fraction(RailEndpoint.NEXT_TRAINS, trains, trains) == 0
+    assert (
+        get_change_fraction(
+            RailEndpoint.NEXT_TRAINS,
+            trains,
+            {"Trains": [{"LocationCode": "A01", "Min": "2"}]},
+        )
+        == 1
+    )
+
+
+def test_adaptive_scheduler():
+    """Test AdaptiveScheduler."""
+    endpoint = RailEndpoint.TRAIN_POSITIONS
+    rate_limiter = RateLimiter(10, 50_000)
+    scheduler = AdaptiveScheduler(rate_limiter, min_interval=5, max_interval=40)
+
+    decision = scheduler.schedule("key", endpoint, 1)
+    assert decision.endpoint == "TRAIN_POSITIONS"
+    assert decision.interval == 10
+    assert decision.change_fraction is None
+    assert decision.reason == "no change history"
+
+    # Few changes widen the interval up to the maximum
+    scheduler.record("key", endpoint, TRAIN_POSITIONS, TRAIN_POSITIONS)
+    assert scheduler.schedule("key", endpoint, 1).interval == 20
+    assert scheduler.schedule("key", endpoint, 1).interval == 40
+    decision = scheduler.schedule("key", endpoint, 1)
+    assert decision.interval == 40
+    assert decision.change_fraction == 0
+    assert decision.reason == "low change rate"
+
+    # Many changes narrow it down to the minimum
+    for _ in range(5):
+        scheduler.record("key", endpoint, TRAIN_POSITIONS, _move_trains(82))
+    assert scheduler.schedule("key", endpoint, 1).interval == 20
+    assert scheduler.schedule("key", endpoint, 1).interval == 10
+    decision = scheduler.schedule("key", endpoint, 1)
+    assert decision.interval == 5
+    assert decision.change_fraction == 1
+    assert decision.reason == "high change rate"
+
+    # A nearly exhausted daily quota stretches the interval to last until it resets
+    rate_limiter.requests_today = 49_999
+    decision = scheduler.schedule("key", endpoint, 1)
+    assert decision.interval > rate_limiter.seconds_left_today
+    assert decision.reason == "high change rate, limited by daily quota"
+    rate_limiter.requests_today = 50_000
+    decision = scheduler.schedule("key", endpoint, 1)
+    assert decision.reason == "high change rate, limited by daily quota exhausted"
+
+    # Feeds without subscribers are not polled
+    decision = scheduler.schedule("key", endpoint, 0)
+    assert decision.interval is None
+    assert decision.reason == "no subscribers"
+    assert scheduler.latest["key"] is decision
+    assert len(scheduler.decisions) == 10
+
+
+async def test_adaptive_subscription(wmata_responses):
+    """Test subscribing to a feed with an adaptive interval."""
+    client = Client("", test_mode=True)
+    subscription = client.hub.subscribe(
+        RailEndpoint.TRAIN_POSITIONS, params={"contentType": "json"}, interval=None
+    )
+    assert len((await anext(subscription))["TrainPositions"]) == 82
+    key = subscription.key
+    decision = client.scheduler.latest[key]
+    assert decision.interval == 10
+    assert decision.reason == "no change history"
+
+    await subscription.aclose()
+    assert not client.hub.keys
+    decision = client.scheduler.latest[key]
+    assert decision.interval is None
+    assert decision.reason == "no subscribers"
+    assert client.rate_limiter.requests_today == 1
@@ -0,0 +1,70 @@
+"""Test pywmataio stand-in WMATA API server."""
+import sys
+from pathlib import Path
+
+import pytest
+from aiohttp import ClientSession
+
+from wmataio.client import Client
+from wmataio.exceptions import WMATAError
+from wmataio.server import Faults, StandInServer, main
+
+CONTENT_TYPE = {"contentType": "json"}
+FIXTURES_PATH = Path(__file__).parent / "fixtures/models"
+
+
+async def test_server():
+    """Test fetching fixtures from the stand-in server through the HTTP stack."""
+    async with StandInServer(FIXTURES_PATH) as server:
+        client = Client("", base_url=server.base_url)
+        await client.rail.load_data()
+        assert len(client.rail.stations) > 0
+        assert len(await client.rail.get_live_positions()) == 82
+        board = await client.rail.get_next_trains_board()
+        assert board.next_trains
+        assert server.stats.succeeded == server.stats.requests
+        assert server.stats.bytes_sent > 0
+
+    # Bursts of rate limited requests
+    faults = Faults(rate_limit_every=2, rate_limit_burst=1)
+    async with StandInServer(
+        FIXTURES_PATH, faults=faults
+    ) as server, ClientSession() as session:
+        statuses = []
+        for _ in range(6):
+            async with session.get(
+                f"{server.base_url}/TrainPositions/TrainPositions", params=CONTENT_TYPE
+            ) as response:
+                statuses.append(response.status)
+        assert statuses == [200, 200, 429, 200, 200, 429]
+        assert server.stats.rate_limited == 2
+
+    # Server errors and slow bodies
+    async with StandInServer(
+        FIXTURES_PATH, faults=Faults(error_rate=1, seed=1)
+    ) as server:
+        client = Client("", base_url=server.base_url)
+        with pytest.raises(WMATAError):
+            await client.rail.get_live_positions()
+        assert server.stats.errors == 1
+
+    faults = Faults(latency=0.01, slow_body_chunk_size=1024, slow_body_delay=0.001)
+    async with StandInServer(FIXTURES_PATH, faults=faults) as server:
+        client = Client("", base_url=server.base_url)
+        assert len(await client.rail.get_live_positions()) == 82
+
+    # Payloads can be provided directly and missing payloads are not found
+    fixtures = {"rail/train_positions..contentType_json": {"TrainPositions": []}}
+    async with StandInServer(fixtures) as server:
+        client = Client("", base_url=server.base_url)
+        assert await client.rail.get_live_positions() == {}
+        with pytest.raises(WMATAError):
+            await client.rail.get_rail_incidents()
+        assert server.stats.not_found == 1
+
+
+def test_server_requires_fixtures(monkeypatch):
+    """Test that the command line requires fixtures or a synthetic network."""
+    monkeypatch.setattr(sys, "argv", ["server"])
+    with pytest.raises(SystemExit):
+        main()
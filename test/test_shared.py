@@ -0,0 +1,88 @@
+"""Test pywmataio shared datasets."""
+import gc
+from functools import partial
+
+import pytest
+
+from wmataio.bus.models.stop import Stop
+from wmataio.client import Client
+from wmataio.shared import BUS_STOPS_TABLE, SharedDataset, SharedModels
+
+
+async def test_shared_dataset(wmata_responses, tmp_path):
+    """Test publishing a dataset and attaching to it from another client."""
+    path = tmp_path / "dataset.bin"
+    loader = Client("", test_mode=True)
+    await loader.load_all()
+    assert loader.publish_dataset(path) == path.stat().st_size
+
+    worker = Client("", test_mode=True)
+    shared = worker.attach_shared_dataset(path)
+    assert not shared.stale
+    assert shared.bus_version == worker.bus.dataset.version == 1
+    assert shared.rail_version == worker.rail.dataset.version == 1
+    assert isinstance(worker.bus.stops, SharedModels)
+
+    assert len(worker.bus.routes) == 390
+    assert len(worker.bus.stops) == 9360
+    assert len(worker.rail.lines) == 6
+    assert len(worker.rail.stations) == 101
+    assert worker.rail.circuit_positions.keys() == loader.rail.circuit_positions.keys()
+    assert set(worker.bus.stops) == set(loader.bus.stops)
+
+    stop = worker.bus.stops["1000533"]
+    assert stop.bus.dataset is worker.bus.dataset
+    assert stop.data == loader.bus.stops["1000533"].data
+    assert worker.bus.stops["1000533"] is stop
+    assert worker.bus.routes["10A"].data == loader.bus.routes["10A"].data
+    station = worker.rail.stations["A01"]
+    assert station.data == loader.rail.stations["A01"].data
+    assert len(station.entrances) == len(loader.rail.stations["A01"].entrances)
+    assert "missing" not in worker.bus.stops
+    with pytest.raises(KeyError):
+        worker.bus.stops["missing"]
+
+    # Every stop can be built from the shared records, and stays the same instance
+    # while it is referenced
+    stops = list(worker.bus.stops.values())
+    assert sum(len(stop.routes) for stop in stops) == sum(
+        len(stop.routes) for stop in loader.bus.stops.values()
+    )
+    assert all(stop is other for stop, other in zip(stops, worker.bus.stops.values()))
+    assert worker.bus.stops["1000533"] is stop
+
+    # Walking every model only keeps the most recently used ones alive
+    models = SharedModels(
+        shared.tables[BUS_STOPS_TABLE], partial(Stop, worker.bus), max_cached=10
+    )
+    model = models["1000533"]
+    assert len(list(models.values())) == 9360
+    gc.collect()
+    # The cached models and the one that is still referenced
+    assert len(models._models) == 11
+    assert models["1000533"] is model
+
+    # Republishing replaces the file, so the attached dataset goes stale
+    await loader.load_all()
+    loader.publish_dataset(path)
+    assert shared.stale
+    with SharedDataset(path) as republished:
+        assert republished.bus_version == 2
+    assert republished.closed
+    assert len(shared.tables[BUS_STOPS_TABLE]) == 9360
+
+    # Models that were built stay usable once the mapped file is closed
+    shared.close()
+    assert shared.closed
+    assert worker.bus.stops["1000533"] is stop
+    assert stop.data == loader.bus.stops["1000533"].data
+    with pytest.raises(ValueError):
+        SharedModels(shared.tables[BUS_STOPS_TABLE], dict)["1000533"]
+
+
+def test_not_a_shared_dataset(tmp_path):
+    """Test attaching to a file that isn't a shared dataset."""
+    path = tmp_path / "dataset.bin"
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        SharedDataset(path)
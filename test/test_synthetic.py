@@ -0,0 +1,65 @@
+"""Test pywmataio synthetic network generator."""
+import pytest
+
+from wmataio.client import Client
+from wmataio.server import StandInServer
+from wmataio.synthetic import SyntheticNetwork
+
+
+async def test_synthetic_network(tmp_path):
+    """Test generating a synthetic network and serving it to a client."""
+    network = SyntheticNetwork(scale=0.1)
+    assert network["bus/stops"] == SyntheticNetwork(scale=0.1)["bus/stops"]
+    assert network["bus/stops"] != SyntheticNetwork(scale=0.1, seed=1)["bus/stops"]
+    assert len(list(network)) == len(network)
+    with pytest.raises(KeyError):
+        network["bus/route_path..RouteID_R1000"]
+
+    # Every stop is on the path of each route that serves it
+    route_stops = {
+        route_id: {
+            stop["StopID"]
+            for stop in network[f"bus/route_path..RouteID_{route_id}"]["Direction0"][
+                "Stops"
+            ]
+        }
+        for route_id in network.route_ids
+    }
+    for stop in network["bus/stops"]["Stops"]:
+        for route_id in stop["Routes"]:
+            assert stop["StopID"] in route_stops[route_id]
+    assert sum(len(stops) for stops in route_stops.values()) == sum(
+        len(stop["Routes"]) for stop in network["bus/stops"]["Stops"]
+    )
+
+    async with StandInServer(network) as server:
+        client = Client("", base_url=server.base_url)
+        await client.bus.load_data()
+        await client.rail.load_data()
+        assert len(client.bus.stops) == len(network["bus/stops"]["Stops"])
+        assert len(client.bus.routes) == len(network.route_ids)
+        assert len(client.rail.lines) == 2
+        transfers = [
+            station
+            for station in client.rail.stations.values()
+            if len(station.lines) > 1
+        ]
+        assert len(transfers) == 1
+        assert set(transfers[0].line_codes) == {"H0", "V0"}
+        assert client.rail.circuit_positions
+
+        route = client.bus.routes["R0"]
+        route_path = await client.bus.get_route_path(route)
+        assert len(route_path.path_directions[0].stops) == len(route_stops["R0"])
+        route_schedule = await client.bus.get_route_schedule(route)
+        trip = route_schedule.directions_schedules[0][0]
+        assert (
+            trip.stop_times[0].stop_id == route_path.path_directions[0].stops[0].stop_id
+        )
+        assert trip.start_time.date() == network.service_date
+
+    network.write(tmp_path)
+    assert (tmp_path / "bus" / "stops.json").exists()
+    assert (
+        tmp_path / "bus" / "route_schedule..RouteID_R0_IncludingVariations_false.json"
+    ).exists()
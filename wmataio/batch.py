@@ -0,0 +1,126 @@
+"""Run many requests concurrently and yield results as they complete."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Awaitable, Callable, Generic, Hashable, TypeVar
+
+from .exceptions import WMATAError
+
+_LOGGER = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class BatchStats:
+    """Timing statistics for a batch of requests."""
+
+    requested: int
+    unique: int
+    completed: int = 0
+    failed: int = 0
+    elapsed: float | None = None
+    first_result: float | None = None
+    mean_duration: float | None = None
+    slowest_duration: float | None = None
+    durations: list[float] = field(default_factory=list, repr=False)
+
+    def add_duration(self, duration: float) -> None:
+        """Add the duration of a request."""
+        self.durations.append(duration)
+        self.mean_duration = sum(self.durations) / len(self.durations)
+        self.slowest_duration = max(self.slowest_duration or 0, duration)
+
+
+class Batch(Generic[K, V]):
+    """
+    Run requests with bounded concurrency and iterate over results as they complete.
+
+    Each request is identified by a key and duplicate keys are only requested once.
+    Requests that fail are skipped and their errors are collected in `errors`.
+    Closing the batch before it is exhausted cancels the remaining requests.
+    """
+
+    stats: BatchStats
+    errors: dict[K, BaseException]
+
+    def __init__(
+        self,
+        keys: list[K],
+        request_func: Callable[[K], Awaitable[V]],
+        max_concurrency: int,
+    ) -> None:
+        """Initialize."""
+        self._keys = list(dict.fromkeys(keys))
+        self._request_func = request_func
+        self._max_concurrency = max_concurrency
+        self._iterator: AsyncGenerator[tuple[K, V], None] | None = None
+        self.stats = BatchStats(len(keys), len(self._keys))
+        self.errors = {}
+
+    async def _request(
+        self, semaphore: asyncio.Semaphore, key: K
+    ) -> tuple[K, V | None, BaseException | None, float]:
+        """Make a single request once the semaphore allows it."""
+        async with semaphore:
+            start = time.monotonic()
+            try:
+                result = await self._request_func(key)
+            except (Exception, WMATAError) as error:  # pylint: disable=broad-except
+                return key, None, error, time.monotonic() - start
+            return key, result, None, time.monotonic() - start
+
+    async def _run(self) -> AsyncGenerator[tuple[K, V], None]:
+        """Run the requests and yield results as they complete."""
+        start = time.monotonic()
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        tasks = [
+            asyncio.create_task(self._request(semaphore, key)) for key in self._keys
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                key, result, error, duration = await next_done
+                self.stats.add_duration(duration)
+                if error is not None:
+                    _LOGGER.warning("Request for %s failed: %s", key, error)
+                    self.stats.failed += 1
+                    self.errors[key] = error
+                    continue
+                self.stats.completed += 1
+                if self.stats.first_result is None:
+                    self.stats.first_result = time.monotonic() - start
+                yield key, result  # type: ignore[misc]
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Wait for cancelled requests to unwind so none are left pending
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.stats.elapsed = time.monotonic() - start
+            _LOGGER.debug("Batch finished: %s", self.stats)
+
+    def __aiter__(self) -> Batch[K, V]:
+        """Return the async iterator."""
+        return self
+
+    async def __anext__(self) -> tuple[K, V]:
+        """Return the next completed result."""
+        if self._iterator is None:
+            self._iterator = self._run()
+        return await anext(self._iterator)
+
+    async def aclose(self) -> None:
+        """Cancel any remaining requests."""
+        if self._iterator is not None:
+            await self._iterator.aclose()
+
+    async def results(self) -> dict[K, V]:
+        """Wait for every request and return the results keyed by request key."""
+        return {key: result async for key, result in self}
+
+    def __repr__(self) -> str:
+        """Return the representation."""
+        return f"Batch({self.stats!r})"
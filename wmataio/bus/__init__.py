@@ -1,21 +1,47 @@
 """Module for interacting with MetroBus API."""
 from __future__ import annotations
 
+import asyncio
+import copy
 from datetime import date
-from typing import TYPE_CHECKING, Any, cast
-
-from ..helpers import get_stop_or_station_pairs_closest_to_coordinates
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterable, Mapping, cast
+
+from ..batch import Batch
+from ..const import (
+    DEFAULT_INCIDENTS_POLL_INTERVAL,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_POSITIONS_POLL_INTERVAL,
+)
+from ..helpers import (
+    get_delta,
+    get_stop_or_station_pairs_closest_to_coordinates,
+    update_models,
+)
+from ..incidents import IncidentFeed
+from ..load import LoadPlan, LoadReport
 from ..models.area import Area
 from ..models.coordinates import Coordinates
+from ..models.delta import Delta
+from ..shared import BUS_ROUTES_TABLE, BUS_STOPS_TABLE, SharedDataset, SharedModels
 from .const import BusEndpoint
-from .models.bus_incident import BusIncident
-from .models.live_position import LiveBusPosition
+from .crawler import CrawlProgress, RouteCrawler, read_crawl
+from .models.bus_incident import BusIncident, BusIncidentData
+from .models.dataset import BusDataset
+from .models.live_position import LiveBusPosition, LiveBusPositionData
 from .models.next_bus import NextBus
 from .models.route import Route
 from .models.route_path import RoutePath, RoutePathData
-from .models.route_schedule import RouteSchedule, RouteScheduleData
+from .models.route_schedule import (
+    RouteSchedule,
+    RouteScheduleData,
+    get_route_schedule_size,
+)
 from .models.stop import Stop, StopData
-from .models.stop_schedule import StopArrival
+from .models.stop_schedule import LocalStopSchedules, StopArrival
+from .models.timetable import RouteTimetable
+from .schedule_cache import ScheduleCache
 
 if TYPE_CHECKING:
     from ..client import Client
@@ -25,19 +51,84 @@ class MetroBus:
     """Class to represent client for MetroBus APIs."""
 
     client: "Client"
-    routes: dict[str, Route]
-    stops: dict[str, Stop]
+    dataset: BusDataset
+    schedule_cache: ScheduleCache
 
     def __init__(self, client: "Client") -> None:
         """Initialize."""
         self.client = client
-        self.routes = {}
-        self.stops = {}
+        self.dataset = BusDataset(0, {}, {})
+        self.schedule_cache = ScheduleCache(self)
+
+    @property
+    def routes(self) -> Mapping[str, Route]:
+        """Return the routes of the current dataset."""
+        return self.dataset.routes
+
+    @property
+    def stops(self) -> Mapping[str, Stop]:
+        """Return the stops of the current dataset."""
+        return self.dataset.stops
 
-    async def load_data(self) -> None:
+    def snapshot(self) -> MetroBus:
+        """
+        Return a view of the API that is pinned to the current dataset.
+
+        Loading data swaps in a new dataset without affecting existing snapshots, so
+        long running queries can use a snapshot to keep a consistent view.
+        """
+        return copy.copy(self)
+
+    async def load_data(self) -> LoadReport:
         """Load the base data."""
-        self.routes = await self.get_all_routes()
-        self.stops = await self.get_stops()
+        plan = LoadPlan()
+        self.add_load_stages(plan)
+        return await plan.run()
+
+    def add_load_stages(self, plan: LoadPlan) -> None:
+        """Add the stages that load the base data to a load plan."""
+        plan.add_fetch(
+            "bus.fetch.routes", lambda: self.client.fetch(BusEndpoint.ROUTES)
+        )
+        plan.add_fetch("bus.fetch.stops", lambda: self.client.fetch(BusEndpoint.STOPS))
+        # Models are built against a snapshot that is only pinned to the new dataset
+        # once it is complete, so they never see a mix of old and new data
+        view = self.snapshot()
+        plan.add_build("bus.routes", ["bus.fetch.routes"], self._build_routes)
+        plan.add_build(
+            "bus.stops",
+            ["bus.fetch.stops"],
+            lambda data: self.client.build(
+                partial(view.get_all_stops_from_stop_data, use_internal_data=False),
+                data["Stops"],
+                items=len(data["Stops"]),
+            ),
+        )
+        plan.add_build(
+            "bus.dataset",
+            ["bus.routes", "bus.stops"],
+            partial(self._swap_dataset, view),
+        )
+
+    def _swap_dataset(
+        self, view: MetroBus, routes: dict[str, Route], stops: dict[str, Stop]
+    ) -> BusDataset:
+        """Swap in a new dataset."""
+        dataset = BusDataset(self.dataset.version + 1, routes, stops)
+        view.dataset = self.dataset = dataset
+        return dataset
+
+    def attach_shared_dataset(self, shared: SharedDataset) -> BusDataset:
+        """Swap in a dataset that was published by another process."""
+        view = self.snapshot()
+        dataset = BusDataset(
+            shared.bus_version,
+            SharedModels(shared.tables[BUS_ROUTES_TABLE], Route),
+            SharedModels(shared.tables[BUS_STOPS_TABLE], partial(Stop, view)),
+            shared.published_at,
+        )
+        view.dataset = self.dataset = dataset
+        return dataset
 
     def get_stop_from_stop_data(
         self, stop_data: StopData, use_internal_data: bool = True
@@ -63,9 +154,37 @@ class MetroBus:
 
         return data
 
+    def get_canonical_stops_from_stop_data(
+        self, stops_data: list[StopData]
+    ) -> dict[str, Stop]:
+        """Get the canonical instance of every stop in a list of StopData."""
+        identities = self.client.identities
+        return {
+            stop_id: identities.get_canonical(stop, stop_id, self.stops)
+            for stop_id, stop in self.get_all_stops_from_stop_data(
+                stops_data, use_internal_data=False
+            ).items()
+        }
+
     async def get_all_routes(self) -> dict[str, Route]:
         """Get all routes."""
-        data = await self.client.fetch(BusEndpoint.ROUTES)
+        identities = self.client.identities
+        return {
+            route_id: identities.get_canonical(route, route_id, self.routes)
+            for route_id, route in (
+                await self._build_routes(await self.client.fetch(BusEndpoint.ROUTES))
+            ).items()
+        }
+
+    async def _build_routes(self, data: dict) -> dict[str, Route]:
+        """Build all routes, in the client's offloader if the payload is large."""
+        return await self.client.build(
+            self.get_routes_from_data, data, items=len(data["Routes"])
+        )
+
+    @staticmethod
+    def get_routes_from_data(data: dict) -> dict[str, Route]:
+        """Get all routes from routes data."""
         return {
             route_data["RouteID"]: Route(route_data) for route_data in data["Routes"]
         }
@@ -76,18 +195,24 @@ class MetroBus:
         if area:
             params = dict(area.to_dict())
         data = await self.client.fetch(BusEndpoint.STOPS, params=params)
-        return self.get_all_stops_from_stop_data(data["Stops"], use_internal_data=False)
+        return await self.client.build(
+            self.get_canonical_stops_from_stop_data,
+            data["Stops"],
+            items=len(data["Stops"]),
+        )
 
     async def get_live_positions(
         self,
         route: Route | None = None,
         area: Area | None = None,
+        previous: Mapping[str, LiveBusPosition] | None = None,
     ) -> list[LiveBusPosition]:
         """
         Get live bus position(s).
 
         If no route or area is provided, all bus positions will be
-        returned.
+        returned. Positions in `previous`, keyed by vehicle ID, are updated in place
+        for vehicles that are still reported instead of being built again.
         """
         params: dict[str, Any] = {}
         if route:
@@ -96,10 +221,80 @@ class MetroBus:
             params.update(area.to_dict())
 
         data = await self.client.fetch(BusEndpoint.POSITIONS, params=params)
-        return sorted(
-            [LiveBusPosition(self, position) for position in data["BusPositions"]],
-            key=lambda position: position.trip_start_time,
+        positions = update_models(
+            previous,
+            cast(list[LiveBusPositionData], data["BusPositions"]),
+            lambda position: position["VehicleID"],
+            partial(LiveBusPosition, self),
         )
+        return sorted(positions.values(), key=lambda position: position.trip_start_time)
+
+    def watch_positions(
+        self,
+        interval: float = DEFAULT_POSITIONS_POLL_INTERVAL,
+        route: Route | None = None,
+        area: Area | None = None,
+        shared: bool = False,
+        in_place: bool = False,
+    ) -> AsyncIterator[Delta[LiveBusPosition]]:
+        """
+        Poll live bus positions and yield the changes keyed by vehicle ID.
+
+        The first delta contains every bus as added. After that, a delta is only
+        yielded when a bus was added, moved or removed.
+
+        When `shared` is set, watchers with the same interval, route and area share
+        one poller on the client's hub, and a watcher that joins late starts from the
+        next delta.
+
+        When `in_place` is set, the positions of buses that are still reported are
+        updated in place on every poll and their `changed` fields flag what changed,
+        so positions from earlier deltas should not be kept as snapshots.
+        """
+        if shared:
+            return self.client.hub.subscribe_source(
+                (
+                    "watch_positions",
+                    BusEndpoint.POSITIONS,
+                    interval,
+                    route,
+                    area,
+                    in_place,
+                ),
+                lambda: self._watch_positions(interval, route, area, in_place),
+            )
+        return self._watch_positions(interval, route, area, in_place)
+
+    async def _watch_positions(
+        self,
+        interval: float,
+        route: Route | None,
+        area: Area | None,
+        in_place: bool,
+    ) -> AsyncIterator[Delta[LiveBusPosition]]:
+        """Poll live bus positions and yield the changes."""
+        previous: dict[str, LiveBusPosition] = {}
+        first = True
+        while True:
+            positions = (
+                await self.get_live_positions(route=route, area=area, previous=previous)
+                if in_place
+                else await self.get_live_positions(route=route, area=area)
+            )
+            current = {position.vehicle_id: position for position in positions}
+            delta = get_delta(
+                previous,
+                current,
+                # Positions updated in place flag whether they moved
+                (lambda _, new: "coordinates" in new.changed)
+                if in_place
+                else (lambda old, new: old.coordinates != new.coordinates),
+            )
+            previous = current
+            if delta or first:
+                first = False
+                yield delta
+            await asyncio.sleep(interval)
 
     async def get_bus_incidents(self, route: Route | None = None) -> list[BusIncident]:
         """
@@ -119,6 +314,33 @@ class MetroBus:
             key=lambda incident: incident.date_updated,
         )
 
+    def watch_incidents(
+        self,
+        route: Route | None = None,
+        interval: float = DEFAULT_INCIDENTS_POLL_INTERVAL,
+    ) -> IncidentFeed[BusIncident]:
+        """
+        Poll bus incidents and yield created, updated and resolved incidents.
+
+        The returned feed's `index` maps route IDs to the open incidents affecting
+        them.
+        """
+        params = None
+        if route:
+            params = {"Route": route.route_id}
+
+        async def fetch_incidents() -> list[BusIncidentData]:
+            data = await self.client.fetch(BusEndpoint.BUS_INCIDENTS, params=params)
+            return cast(list[BusIncidentData], data["BusIncidents"])
+
+        return IncidentFeed(
+            fetch_incidents,
+            "IncidentID",
+            lambda incident_data: BusIncident(self, incident_data),
+            lambda incident: incident.route_ids_affected,
+            interval,
+        )
+
     async def get_route_path(
         self, route: Route, date_: date | None = None
     ) -> RoutePath:
@@ -127,15 +349,20 @@ class MetroBus:
 
         If no date_ is provided, the current date will be used.
         """
+        return RoutePath(self, await self.fetch_route_path_data(route, date_))
+
+    async def fetch_route_path_data(
+        self, route: Route, date_: date | None = None
+    ) -> RoutePathData:
+        """Fetch the path data for a given route."""
         params = {"RouteID": route.route_id}
         if date_:
             params["Date"] = date_.strftime("%Y-%m-%d")
 
-        data = cast(
+        return cast(
             RoutePathData,
             await self.client.fetch(BusEndpoint.ROUTE_PATH, params=params),
         )
-        return RoutePath(self, data)
 
     async def get_route_schedule(
         self,
@@ -150,6 +377,39 @@ class MetroBus:
         - include_variations specifies whether variations for the input route should be
         included.
         """
+        data = await self.fetch_route_schedule_data(route, date_, include_variations)
+        return await self.client.build(
+            RouteSchedule,
+            self,
+            route,
+            data,
+            items=get_route_schedule_size(data),
+        )
+
+    async def get_route_timetable(
+        self,
+        route: Route,
+        date_: date | None = None,
+        include_variations: bool = False,
+    ) -> RouteTimetable:
+        """
+        Return the schedule for a given route as a columnar timetable.
+
+        Takes the same arguments as `get_route_schedule`, but skips building the
+        schedule's stop time objects.
+        """
+        data = await self.fetch_route_schedule_data(route, date_, include_variations)
+        return await self.client.build(
+            RouteTimetable, route, data, items=get_route_schedule_size(data)
+        )
+
+    async def fetch_route_schedule_data(
+        self,
+        route: Route,
+        date_: date | None = None,
+        include_variations: bool = False,
+    ) -> RouteScheduleData:
+        """Fetch the schedule data for a given route."""
         params = {
             "RouteID": route.route_id,
             "IncludingVariations": str(include_variations).lower(),
@@ -157,11 +417,10 @@ class MetroBus:
         if date_:
             params["Date"] = date_.strftime("%Y-%m-%d")
 
-        data = cast(
+        return cast(
             RouteScheduleData,
             await self.client.fetch(BusEndpoint.ROUTE_SCHEDULE, params=params),
         )
-        return RouteSchedule(self, route, data)
 
     async def get_next_buses_at_stop(self, stop: Stop) -> list[NextBus]:
         """Return next buses for a given stop."""
@@ -170,6 +429,25 @@ class MetroBus:
         )
         return [NextBus(self, next_bus_data) for next_bus_data in data["Predictions"]]
 
+    def get_next_buses_at_stops(
+        self, stops: Iterable[Stop], max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    ) -> Batch[Stop, list[NextBus]]:
+        """
+        Return next buses for many stops.
+
+        Duplicate stops are only requested once and at most `max_concurrency`
+        requests run at a time, subject to the client's rate limit. Iterating over
+        the returned batch yields `(stop, next_buses)` tuples as each request
+        completes, and `batch.stats` reports the batch's timing.
+        """
+        stops = list(stops)
+        unique_stops = {stop.stop_id: stop for stop in stops}
+        batch: Batch[Stop, list[NextBus]] = Batch(
+            list(unique_stops.values()), self.get_next_buses_at_stop, max_concurrency
+        )
+        batch.stats.requested = len(stops)
+        return batch
+
     async def get_stop_schedule(
         self, stop: Stop, date_: date | None = None
     ) -> list[StopArrival]:
@@ -191,6 +469,73 @@ class MetroBus:
             key=lambda stop_arrival_schedule: stop_arrival_schedule.schedule_time,
         )
 
+    async def get_local_stop_schedules(
+        self,
+        routes: Iterable[Route] | None = None,
+        date_: date | None = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ) -> LocalStopSchedules:
+        """
+        Return the schedules of every stop served by routes, from route schedules.
+
+        This makes one request per route instead of one per stop. If no routes are
+        provided, every route is used, and if no date_ is provided, the current date
+        will be used. Routes whose schedule can't be fetched are skipped.
+        """
+        stop_schedules = LocalStopSchedules(self)
+        batch: Batch[Route, RouteScheduleData] = Batch(
+            list(self.routes.values() if routes is None else routes),
+            partial(
+                self.fetch_route_schedule_data, date_=date_, include_variations=False
+            ),
+            max_concurrency,
+        )
+        async for route, data in batch:
+            stop_schedules.add(route, data)
+        return stop_schedules
+
+    async def crawl(
+        self,
+        path: str | Path,
+        routes: Iterable[Route] | None = None,
+        date_: date | None = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        progress_callback: Callable[[CrawlProgress], None] | None = None,
+    ) -> CrawlProgress:
+        """
+        Fetch the path and schedule of routes into a crawl file at path.
+
+        If no routes are provided, every route is crawled, and if no date_ is
+        provided, the current date will be used. Crawling into the file of an
+        interrupted crawl resumes it. `progress_callback` is called with the crawl's
+        progress, including its ETA, after every request.
+        """
+        crawler = RouteCrawler(
+            self,
+            path,
+            self.routes.values() if routes is None else routes,
+            date_,
+            max_concurrency,
+            progress_callback,
+        )
+        return await crawler.run()
+
+    def read_crawl(
+        self, path: str | Path
+    ) -> tuple[dict[str, RoutePath], dict[str, RouteSchedule]]:
+        """Return the route paths and route schedules in a crawl file."""
+        crawl = read_crawl(path)
+        return (
+            {
+                route_id: RoutePath(self, data)
+                for route_id, data in crawl.route_paths.items()
+            },
+            {
+                route_id: RouteSchedule(self, self.routes[route_id], data)
+                for route_id, data in crawl.route_schedules.items()
+            },
+        )
+
     async def get_stop_pairs_closest_to_coordinates(
         self,
         start_coordinates: Coordinates,
@@ -0,0 +1,260 @@
+"""
+Crawl the path and schedule of every route into a compact, resumable file.
+
+A crawl file starts with a header holding the service date that was crawled,
+followed by one record per fetched payload: the endpoint, the route ID and the
+payload as zlib compressed JSON. Records are appended and flushed as each request
+completes, so the file is its own checkpoint. Crawling into an existing file only
+requests the payloads that are missing from it, after dropping any record that
+was cut short when the previous crawl was interrupted.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import struct
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Callable, Iterable, Iterator
+
+from ..batch import Batch
+from ..const import DEFAULT_MAX_CONCURRENCY, TZ
+from .const import BusEndpoint
+
+if TYPE_CHECKING:
+    from . import MetroBus
+    from .models.route import Route
+    from .models.route_path import RoutePathData
+    from .models.route_schedule import RouteScheduleData
+
+_LOGGER = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<4sHxxi")
+MAGIC = b"WMCR"
+VERSION = 1
+
+# Endpoint index, route ID length, compressed payload length
+RECORD = struct.Struct("<BHI")
+CRAWL_ENDPOINTS = (BusEndpoint.ROUTE_PATH, BusEndpoint.ROUTE_SCHEDULE)
+
+CrawlKey = tuple[BusEndpoint, str]
+
+
+@dataclass
+class CrawlProgress:
+    """Progress of a crawl, counting payloads already in the file as completed."""
+
+    total: int
+    completed: int = 0
+    resumed: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic, repr=False)
+    elapsed: float = 0.0
+
+    @property
+    def remaining(self) -> int:
+        """Return the number of payloads that haven't been attempted yet."""
+        return self.total - self.completed - self.failed
+
+    @property
+    def rate(self) -> float | None:
+        """Return the number of payloads fetched per second by this crawl."""
+        if not self.elapsed or not (
+            fetched := self.completed - self.resumed + self.failed
+        ):
+            return None
+        return fetched / self.elapsed
+
+    @property
+    def eta(self) -> float | None:
+        """Return the estimated number of seconds until the crawl finishes."""
+        if not self.remaining:
+            return 0.0
+        if (rate := self.rate) is None:
+            return None
+        return self.remaining / rate
+
+    def update_elapsed(self) -> None:
+        """Update the elapsed time."""
+        self.elapsed = time.monotonic() - self.started_at
+
+
+@dataclass
+class Crawl:
+    """Payloads read from a crawl file, keyed by route ID."""
+
+    service_date: date
+    route_paths: dict[str, RoutePathData] = field(default_factory=dict)
+    route_schedules: dict[str, RouteScheduleData] = field(default_factory=dict)
+
+
+def _read_records(fp: IO[bytes]) -> Iterator[tuple[int, CrawlKey, bytes]]:
+    """Read complete records and yield each with the offset of its end."""
+    offset = HEADER.size
+    while (head := fp.read(RECORD.size)) and len(head) == RECORD.size:
+        endpoint_index, key_size, payload_size = RECORD.unpack(head)
+        body = fp.read(key_size + payload_size)
+        if len(body) < key_size + payload_size or endpoint_index >= len(
+            CRAWL_ENDPOINTS
+        ):
+            return
+        offset += RECORD.size + key_size + payload_size
+        yield (
+            offset,
+            (CRAWL_ENDPOINTS[endpoint_index], body[:key_size].decode("utf-8")),
+            body[key_size:],
+        )
+
+
+def _read_header(fp: IO[bytes], path: Path) -> date:
+    """Read the header of a crawl file and return its service date."""
+    header = fp.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"`{path}` is not a crawl file")
+    magic, version, ordinal = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"`{path}` is not a crawl file")
+    return date.fromordinal(ordinal)
+
+
+def read_crawl(path: str | Path) -> Crawl:
+    """Read the payloads of a crawl file."""
+    path = Path(path)
+    with open(path, "rb") as fp:
+        crawl = Crawl(_read_header(fp, path))
+        for _, (endpoint, route_id), payload in _read_records(fp):
+            data = json.loads(zlib.decompress(payload))
+            if endpoint == BusEndpoint.ROUTE_PATH:
+                crawl.route_paths[route_id] = data
+            else:
+                crawl.route_schedules[route_id] = data
+    return crawl
+
+
+class RouteCrawler:
+    """
+    Fetch the path and schedule of many routes into a crawl file.
+
+    At most `max_concurrency` requests run at a time, subject to the client's rate
+    limit, so that the rate limit rather than request latency bounds the crawl.
+    `progress_callback` is called with the progress after every request, including
+    requests that fail.
+    """
+
+    path: Path
+    service_date: date
+    progress: CrawlProgress
+
+    def __init__(
+        self,
+        bus: "MetroBus",
+        path: str | Path,
+        routes: Iterable["Route"],
+        date_: date | None = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        progress_callback: Callable[[CrawlProgress], None] | None = None,
+    ) -> None:
+        """Initialize."""
+        self.bus = bus
+        self.path = Path(path)
+        self.routes = {route.route_id: route for route in routes}
+        self.date_ = date_
+        self.service_date = date_ or datetime.now(TZ).date()
+        self.max_concurrency = max_concurrency
+        self.progress_callback = progress_callback
+        self.progress = CrawlProgress(len(self.routes) * len(CRAWL_ENDPOINTS))
+
+    def _resume(self) -> set[CrawlKey]:
+        """Open the crawl file and return the keys that are already in it."""
+        done: set[CrawlKey] = set()
+        if not self.path.exists() or self.path.stat().st_size < HEADER.size:
+            with open(self.path, "wb") as fp:
+                fp.write(HEADER.pack(MAGIC, VERSION, self.service_date.toordinal()))
+            return done
+
+        end = HEADER.size
+        with open(self.path, "rb") as fp:
+            if (service_date := _read_header(fp, self.path)) != self.service_date:
+                raise ValueError(
+                    f"`{self.path}` is a crawl of {service_date}, not "
+                    f"{self.service_date}"
+                )
+            for end, key, _ in _read_records(fp):
+                done.add(key)
+        if end < self.path.stat().st_size:
+            _LOGGER.debug("Dropping an incomplete record at the end of %s", self.path)
+            with open(self.path, "r+b") as fp:
+                fp.truncate(end)
+        return done
+
+    async def _fetch(self, key: CrawlKey) -> Any:
+        """Fetch the payload for a key, reporting progress if the request fails."""
+        endpoint, route_id = key
+        try:
+            if endpoint == BusEndpoint.ROUTE_PATH:
+                return await self.bus.fetch_route_path_data(
+                    self.routes[route_id], self.date_
+                )
+            return await self.bus.fetch_route_schedule_data(
+                self.routes[route_id], self.date_, False
+            )
+        except Exception:
+            self.progress.failed += 1
+            self._report()
+            raise
+
+    def _report(self) -> None:
+        """Update the progress and report it."""
+        self.progress.update_elapsed()
+        _LOGGER.debug("Crawl progress: %s", self.progress)
+        if self.progress_callback is not None:
+            self.progress_callback(self.progress)
+
+    async def run(self) -> CrawlProgress:
+        """Crawl every payload that isn't in the crawl file yet."""
+        done = self._resume()
+        keys = [
+            key
+            for route_id in self.routes
+            for endpoint in CRAWL_ENDPOINTS
+            if (key := (endpoint, route_id)) not in done
+        ]
+        self.progress.completed = self.progress.resumed = self.progress.total - len(
+            keys
+        )
+        if (
+            remaining_today := self.bus.client.rate_limiter.remaining_today
+        ) is not None:
+            if remaining_today < len(keys):
+                _LOGGER.warning(
+                    "Crawling %s payloads exceeds the %s requests left today",
+                    len(keys),
+                    remaining_today,
+                )
+
+        batch: Batch[CrawlKey, Any] = Batch(keys, self._fetch, self.max_concurrency)
+        with open(self.path, "ab") as fp:
+            async for (endpoint, route_id), data in batch:
+                key_bytes = route_id.encode("utf-8")
+                payload = zlib.compress(
+                    json.dumps(data, separators=(",", ":")).encode("utf-8")
+                )
+                fp.write(
+                    RECORD.pack(
+                        CRAWL_ENDPOINTS.index(endpoint), len(key_bytes), len(payload)
+                    )
+                    + key_bytes
+                    + payload
+                )
+                fp.flush()
+                self.progress.completed += 1
+                self._report()
+        self._report()
+        return self.progress
+
+    def read(self) -> Crawl:
+        """Read the payloads in the crawl file."""
+        return read_crawl(self.path)
@@ -0,0 +1,32 @@
+"""Dataset models for MetroBus WMATA API."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Mapping
+
+from ...const import TZ
+
+if TYPE_CHECKING:
+    from .route import Route
+    from .stop import Stop
+
+
+@dataclass(frozen=True)
+class BusDataset:
+    """
+    Immutable version of the MetroBus base data.
+
+    A dataset is swapped in as a whole when it is loaded, so its routes and stops are
+    always consistent with each other. The mappings are shared with every reader and
+    must not be mutated.
+    """
+
+    version: int
+    routes: Mapping[str, "Route"] = field(repr=False)
+    stops: Mapping[str, "Stop"] = field(repr=False)
+    loaded_at: datetime = field(default_factory=lambda: datetime.now(TZ))
+
+    def __hash__(self) -> int:
+        """Return the hash."""
+        return hash(self.version)
@@ -3,9 +3,9 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import TYPE_CHECKING, TypedDict
+from typing import TYPE_CHECKING, Container, TypedDict
 
-from ...const import TZ
+from ...helpers import get_changed_keys, parse_datetime
 from ...models.coordinates import Coordinates
 
 if TYPE_CHECKING:
@@ -48,25 +48,59 @@ class LiveBusPosition:
     trip_start_time: datetime = field(init=False)
     vehicle_id: str = field(init=False)
     id: str = field(init=False)
+    changed: frozenset[str] = field(init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         """Post init."""
-        self.last_update = datetime.fromisoformat(self.data["DateTime"]).replace(
-            tzinfo=TZ
-        )
-        self.deviation = self.data["Deviation"]
-        self.direction_text = self.data["DirectionText"]
-        self.coordinates = Coordinates(self.data["Lat"], self.data["Lon"])
-        self.route_id = self.data["RouteID"]
-        self.trip_end_time = datetime.fromisoformat(self.data["TripEndTime"]).replace(
-            tzinfo=TZ
-        )
-        self.trip_headsign = self.data["TripHeadsign"]
-        self.trip_id = self.data["TripID"]
-        self.trip_start_time = datetime.fromisoformat(
-            self.data["TripStartTime"]
-        ).replace(tzinfo=TZ)
-        self.id = self.vehicle_id = self.data["VehicleID"]
+        self.changed = frozenset(self._parse(self.data.keys()))
+
+    def _parse(self, keys: Container[str]) -> set[str]:
+        """Parse the fields that depend on any of the keys and return their names."""
+        fields = set()
+        if "DateTime" in keys:
+            self.last_update = parse_datetime(self.data["DateTime"])
+            fields.add("last_update")
+        if "Deviation" in keys:
+            self.deviation = self.data["Deviation"]
+            fields.add("deviation")
+        if "DirectionText" in keys:
+            self.direction_text = self.data["DirectionText"]
+            fields.add("direction_text")
+        if ("Lat" in keys or "Lon" in keys) and {"Lat", "Lon"} <= self.data.keys():
+            self.coordinates = Coordinates(self.data["Lat"], self.data["Lon"])
+            fields.add("coordinates")
+        if "RouteID" in keys:
+            self.route_id = self.data["RouteID"]
+            fields.add("route_id")
+        if "TripEndTime" in keys:
+            self.trip_end_time = parse_datetime(self.data["TripEndTime"])
+            fields.add("trip_end_time")
+        if "TripHeadsign" in keys:
+            self.trip_headsign = self.data["TripHeadsign"]
+            fields.add("trip_headsign")
+        if "TripID" in keys:
+            self.trip_id = self.data["TripID"]
+            fields.add("trip_id")
+        if "TripStartTime" in keys:
+            self.trip_start_time = parse_datetime(self.data["TripStartTime"])
+            fields.add("trip_start_time")
+        if "VehicleID" in keys:
+            self.id = self.vehicle_id = self.data["VehicleID"]
+            fields.add("vehicle_id")
+        return fields
+
+    def update(self, data: LiveBusPositionData) -> frozenset[str]:
+        """
+        Update the position in place from newer data for the same vehicle.
+
+        Only fields whose data changed are parsed again. The names of those fields
+        are returned and kept in `changed` until the next update. Fields whose keys
+        are missing from the newer data keep their values.
+        """
+        keys = get_changed_keys(self.data, data)
+        self.data = data
+        self.changed = frozenset(self._parse(keys))
+        return self.changed
 
     def __hash__(self) -> int:
         """Return the hash."""
@@ -27,6 +27,12 @@ class Route:
         """Return the hash."""
         return hash(self.route_id)
 
+    def __eq__(self, other: object) -> bool:
+        """Return whether the other object is the same route."""
+        if not isinstance(other, Route):
+            return NotImplemented
+        return self.route_id == other.route_id
+
     def __post_init__(self) -> None:
         """Post init."""
         self.id = self.route_id = self.data["RouteID"]
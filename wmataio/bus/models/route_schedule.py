@@ -3,9 +3,11 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import datetime
+from functools import cached_property
 from typing import TYPE_CHECKING, TypedDict
 
-from ...const import TZ
+from ...helpers import parse_datetime
+from .timetable import RouteTimetable
 
 if TYPE_CHECKING:
     from .. import MetroBus
@@ -39,7 +41,7 @@ class StopTime:
         self.id = self.stop_id = self.data["StopID"]
         self.stop_name = self.data["StopName"]
         self.stop_sequence = self.data["StopSeq"]
-        self.time = datetime.fromisoformat(self.data["Time"]).replace(tzinfo=TZ)
+        self.time = parse_datetime(self.data["Time"])
 
     def __hash__(self) -> int:
         """Return the hash."""
@@ -85,12 +87,10 @@ class DirectionSchedule:
     def __post_init__(self) -> None:
         """Post init."""
         self.id = self.direction_num
-        self.end_time = datetime.fromisoformat(self.data["EndTime"]).replace(tzinfo=TZ)
+        self.end_time = parse_datetime(self.data["EndTime"])
         self.route_id = self.data["RouteID"]
         self.route = self.route_schedule.bus.routes[self.route_id]
-        self.start_time = datetime.fromisoformat(self.data["StartTime"]).replace(
-            tzinfo=TZ
-        )
+        self.start_time = parse_datetime(self.data["StartTime"])
         self.stop_times_data = self.data["StopTimes"]
         self.stop_times = sorted(
             [StopTime(self, stop_time_data) for stop_time_data in self.stop_times_data],
@@ -112,6 +112,15 @@ class RouteScheduleData(TypedDict):
     Direction1: list[DirectionScheduleData] | None
 
 
+def get_route_schedule_size(data: RouteScheduleData) -> int:
+    """Return the number of stop times in route schedule data."""
+    return sum(
+        len(direction_schedule_data["StopTimes"])
+        for direction_schedules_data in (data["Direction0"], data["Direction1"])
+        for direction_schedule_data in direction_schedules_data or []
+    )
+
+
 @dataclass
 class RouteSchedule:
     """Schedule for a Route."""
@@ -145,3 +154,8 @@ class RouteSchedule:
     def __hash__(self) -> int:
         """Return the hash."""
         return hash(self.directions_schedules.values())
+
+    @cached_property
+    def timetable(self) -> RouteTimetable:
+        """Return the schedule as a columnar timetable."""
+        return RouteTimetable(self.route, self.data)
@@ -37,6 +37,12 @@ class Stop:
         """Return the hash."""
         return hash(self.stop_id)
 
+    def __eq__(self, other: object) -> bool:
+        """Return whether the other object is the same stop."""
+        if not isinstance(other, Stop):
+            return NotImplemented
+        return self.stop_id == other.stop_id
+
     def __post_init__(self) -> None:
         """Post init."""
         if isinstance(self.data["StopID"], str):
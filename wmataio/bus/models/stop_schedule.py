@@ -1,15 +1,17 @@
 """Stop schedule models for MetroBus WMATA API."""
 from __future__ import annotations
 
+from collections import defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import TYPE_CHECKING, TypedDict
+from typing import TYPE_CHECKING, Iterator, Mapping, TypedDict
 
-from ...const import TZ
+from ...helpers import parse_datetime, parse_epoch
 
 if TYPE_CHECKING:
     from .. import MetroBus
     from .route import Route
+    from .route_schedule import RouteScheduleData
     from .stop import Stop
 
 
@@ -45,14 +47,10 @@ class StopArrival:
     def __post_init__(self) -> None:
         """Post init."""
         self.direction_number = int(self.data["DirectionNum"])
-        self.end_time = datetime.fromisoformat(self.data["EndTime"]).replace(tzinfo=TZ)
+        self.end_time = parse_datetime(self.data["EndTime"])
         self.route_id = self.data["RouteID"]
-        self.schedule_time = datetime.fromisoformat(self.data["ScheduleTime"]).replace(
-            tzinfo=TZ
-        )
-        self.start_time = datetime.fromisoformat(self.data["StartTime"]).replace(
-            tzinfo=TZ
-        )
+        self.schedule_time = parse_datetime(self.data["ScheduleTime"])
+        self.start_time = parse_datetime(self.data["StartTime"])
         self.direction = self.data["TripDirectionText"]
         self.trip_headsign = self.data["TripHeadsign"]
         self.trip_id = self.data["TripID"]
@@ -65,3 +63,100 @@ class StopArrival:
     def route(self) -> "Route":
         """Return the route."""
         return self.bus.routes[self.route_id]
+
+
+class LocalStopSchedules(Mapping[str, list[StopArrival]]):
+    """
+    Stop schedules built locally by inverting route schedules, keyed by stop ID.
+
+    Route schedules are added as raw data, so no route schedule models are built.
+    Every stop time of every trip in an added route schedule becomes a stop arrival
+    at its stop, so the schedule of any stop served by the added routes is
+    available without requesting it. Arrivals are built and sorted by schedule time
+    when a stop's schedule is first accessed. Adding the schedule of a route again
+    replaces its arrivals, and all added schedules should be for the same date.
+    """
+
+    def __init__(self, bus: "MetroBus") -> None:
+        """Initialize."""
+        self.bus = bus
+        self._arrivals_data: defaultdict[
+            str, list[tuple[int, str, StopArrivalData]]
+        ] = defaultdict(list)
+        self._arrivals: dict[str, list[StopArrival]] = {}
+        self._route_stop_ids: dict[str, set[str]] = {}
+
+    def add(self, route: "Route", data: "RouteScheduleData") -> None:
+        """Add the arrivals of a route's schedule data."""
+        route_id = route.route_id
+        for stop_id in self._route_stop_ids.pop(route_id, ()):
+            self._arrivals.pop(stop_id, None)
+            self._arrivals_data[stop_id] = [
+                arrival_data
+                for arrival_data in self._arrivals_data[stop_id]
+                if arrival_data[1] != route_id
+            ]
+            if not self._arrivals_data[stop_id]:
+                del self._arrivals_data[stop_id]
+
+        stop_ids = self._route_stop_ids[route_id] = set()
+        for direction_num, direction_schedules_data in (
+            (0, data["Direction0"]),
+            (1, data["Direction1"]),
+        ):
+            for direction_schedule_data in direction_schedules_data or []:
+                for stop_time_data in direction_schedule_data["StopTimes"]:
+                    stop_id = stop_time_data["StopID"]
+                    stop_ids.add(stop_id)
+                    self._arrivals_data[stop_id].append(
+                        (
+                            parse_epoch(stop_time_data["Time"]),
+                            route_id,
+                            {
+                                "DirectionNum": str(direction_num),
+                                "EndTime": direction_schedule_data["EndTime"],
+                                "RouteID": direction_schedule_data["RouteID"],
+                                "ScheduleTime": stop_time_data["Time"],
+                                "StartTime": direction_schedule_data["StartTime"],
+                                "TripDirectionText": direction_schedule_data[
+                                    "TripDirectionText"
+                                ],
+                                "TripHeadsign": direction_schedule_data["TripHeadsign"],
+                                "TripID": direction_schedule_data["TripID"],
+                            },
+                        )
+                    )
+        for stop_id in stop_ids:
+            self._arrivals.pop(stop_id, None)
+
+    def __getitem__(self, stop_id: str) -> list[StopArrival]:
+        """Return the arrivals at a stop, sorted by schedule time."""
+        if (arrivals := self._arrivals.get(stop_id)) is not None:
+            return arrivals
+        if stop_id not in self._arrivals_data:
+            raise KeyError(stop_id)
+        stop = self.bus.stops[stop_id]
+        arrivals = self._arrivals[stop_id] = [
+            StopArrival(self.bus, stop, arrival_data)
+            for _, _, arrival_data in sorted(
+                self._arrivals_data[stop_id], key=lambda arrival_data: arrival_data[0]
+            )
+        ]
+        return arrivals
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the IDs of the stops with arrivals."""
+        return iter(self._arrivals_data)
+
+    def __len__(self) -> int:
+        """Return the number of stops with arrivals."""
+        return len(self._arrivals_data)
+
+    @property
+    def route_ids(self) -> set[str]:
+        """Return the IDs of the routes whose schedules were added."""
+        return set(self._route_stop_ids)
+
+    def get_stop_schedule(self, stop: "Stop") -> list[StopArrival]:
+        """Return the arrivals at a stop, which is empty if no added route serves it."""
+        return self.get(stop.stop_id, [])
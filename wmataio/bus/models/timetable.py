@@ -0,0 +1,209 @@
+"""Columnar timetable models for MetroBus WMATA API."""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from dataclasses import InitVar, dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, NamedTuple
+
+from ...const import TZ
+from ...helpers import parse_epoch
+
+if TYPE_CHECKING:
+    from .route import Route
+    from .route_schedule import DirectionScheduleData, RouteScheduleData
+    from .stop import Stop
+
+
+def to_epoch(value: datetime) -> int:
+    """Convert a datetime, in local time if it is naive, to epoch seconds."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=TZ)
+    return int(value.timestamp())
+
+
+class Departure(NamedTuple):
+    """Scheduled departure of a trip from a stop."""
+
+    route_id: str
+    direction_num: int
+    trip_id: str
+    trip_headsign: str
+    stop_id: str
+    stop_sequence: int
+    time: datetime
+
+
+@dataclass
+class DirectionTimetable:
+    """
+    Timetable of the trips of a route in one direction, stored in columns.
+
+    Every stop time of every trip is a row of the `trips`, `stops`, `sequences` and
+    `times` columns. Rows are ordered by trip and then by stop sequence, and the
+    rows of trip `i` are `trip_offsets[i]` to `trip_offsets[i + 1]`. Trips are
+    ordered by start time.
+
+    `stop_rows` holds every row ordered by stop and then by time, with the rows of
+    stop `i` at `stop_offsets[i]` to `stop_offsets[i + 1]`, and `stop_times` holds
+    the time of each of those rows so that departures can be binary searched.
+    """
+
+    direction_num: int
+    data: InitVar[list["DirectionScheduleData"]]
+    trip_ids: list[str] = field(init=False, repr=False)
+    trip_route_ids: list[str] = field(init=False, repr=False)
+    trip_headsigns: list[str] = field(init=False, repr=False)
+    trip_offsets: array[int] = field(init=False, repr=False)
+    stop_ids: list[str] = field(init=False, repr=False)
+    stop_indexes: dict[str, int] = field(init=False, repr=False)
+    trips: array[int] = field(init=False, repr=False)
+    stops: array[int] = field(init=False, repr=False)
+    sequences: array[int] = field(init=False, repr=False)
+    times: array[int] = field(init=False, repr=False)
+    stop_offsets: array[int] = field(init=False, repr=False)
+    stop_rows: array[int] = field(init=False, repr=False)
+    stop_times: array[int] = field(init=False, repr=False)
+
+    def __post_init__(self, data: list["DirectionScheduleData"]) -> None:
+        """Post init."""
+        self.trip_ids = []
+        self.trip_route_ids = []
+        self.trip_headsigns = []
+        self.trip_offsets = array("I", [0])
+        self.stop_ids = []
+        self.stop_indexes = {}
+        self.trips = array("I")
+        self.stops = array("I")
+        self.sequences = array("I")
+        self.times = array("q")
+        for trip_index, trip_data in enumerate(
+            sorted(data, key=lambda trip_data: parse_epoch(trip_data["StartTime"]))
+        ):
+            self.trip_ids.append(trip_data["TripID"])
+            self.trip_route_ids.append(trip_data["RouteID"])
+            self.trip_headsigns.append(trip_data["TripHeadsign"])
+            for stop_time_data in sorted(
+                trip_data["StopTimes"], key=lambda stop_time: stop_time["StopSeq"]
+            ):
+                stop_id = stop_time_data["StopID"]
+                if (stop_index := self.stop_indexes.get(stop_id)) is None:
+                    stop_index = self.stop_indexes[stop_id] = len(self.stop_ids)
+                    self.stop_ids.append(stop_id)
+                self.trips.append(trip_index)
+                self.stops.append(stop_index)
+                self.sequences.append(stop_time_data["StopSeq"])
+                self.times.append(parse_epoch(stop_time_data["Time"]))
+            self.trip_offsets.append(len(self.times))
+
+        stops, times = self.stops, self.times
+        self.stop_rows = array(
+            "I", sorted(range(len(times)), key=lambda row: (stops[row], times[row]))
+        )
+        self.stop_times = array("q", (times[row] for row in self.stop_rows))
+        counts = [0] * len(self.stop_ids)
+        for stop_index in stops:
+            counts[stop_index] += 1
+        self.stop_offsets = array("I", [0])
+        for count in counts:
+            self.stop_offsets.append(self.stop_offsets[-1] + count)
+
+    def __hash__(self) -> int:
+        """Return the hash."""
+        return hash((self.direction_num, tuple(self.trip_ids)))
+
+    def __len__(self) -> int:
+        """Return the number of stop times."""
+        return len(self.times)
+
+    def get_stop_rows(
+        self, stop_id: str, start: int, end: int | None = None
+    ) -> array[int]:
+        """Return the rows of a stop from `start` until before `end`, by time."""
+        if (stop_index := self.stop_indexes.get(stop_id)) is None:
+            return array("I")
+        low = self.stop_offsets[stop_index]
+        high = self.stop_offsets[stop_index + 1]
+        first = bisect_left(self.stop_times, start, low, high)
+        last = high if end is None else bisect_left(self.stop_times, end, first, high)
+        return self.stop_rows[first:last]
+
+    def get_departure(self, row: int) -> Departure:
+        """Return the departure of a row."""
+        trip_index = self.trips[row]
+        return Departure(
+            self.trip_route_ids[trip_index],
+            self.direction_num,
+            self.trip_ids[trip_index],
+            self.trip_headsigns[trip_index],
+            self.stop_ids[self.stops[row]],
+            self.sequences[row],
+            datetime.fromtimestamp(self.times[row], TZ),
+        )
+
+
+@dataclass
+class RouteTimetable:
+    """Timetable of a route, with a columnar timetable per direction."""
+
+    route: "Route"
+    data: InitVar["RouteScheduleData"]
+    directions: dict[int, DirectionTimetable] = field(
+        init=False, default_factory=dict, repr=False
+    )
+
+    def __post_init__(self, data: "RouteScheduleData") -> None:
+        """Post init."""
+        if (direction_schedules_data := data["Direction0"]) is not None:
+            self.directions[0] = DirectionTimetable(0, direction_schedules_data)
+        if (direction_schedules_data := data["Direction1"]) is not None:
+            self.directions[1] = DirectionTimetable(1, direction_schedules_data)
+
+    def __hash__(self) -> int:
+        """Return the hash."""
+        return hash((self.route, *self.directions.values()))
+
+    def __len__(self) -> int:
+        """Return the number of stop times."""
+        return sum(len(direction) for direction in self.directions.values())
+
+    def _get_departures(
+        self,
+        stop: "Stop",
+        start: int,
+        end: int | None,
+        count: int | None,
+        direction_num: int | None,
+    ) -> list[Departure]:
+        """Return the departures from a stop in a time window, by time."""
+        rows = [
+            (direction.times[row], row, direction)
+            for number, direction in self.directions.items()
+            if direction_num is None or number == direction_num
+            for row in direction.get_stop_rows(stop.stop_id, start, end)[:count]
+        ]
+        rows.sort(key=lambda time_row: time_row[0])
+        return [direction.get_departure(row) for _, row, direction in rows[:count]]
+
+    def get_next_departures(
+        self,
+        stop: "Stop",
+        after: datetime,
+        count: int = 3,
+        direction_num: int | None = None,
+    ) -> list[Departure]:
+        """Return the next departures from a stop at or after a time."""
+        return self._get_departures(stop, to_epoch(after), None, count, direction_num)
+
+    def get_departures_between(
+        self,
+        stop: "Stop",
+        start: datetime,
+        end: datetime,
+        direction_num: int | None = None,
+    ) -> list[Departure]:
+        """Return the departures from a stop from `start` until before `end`."""
+        return self._get_departures(
+            stop, to_epoch(start), to_epoch(end), None, direction_num
+        )
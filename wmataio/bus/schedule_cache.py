@@ -0,0 +1,211 @@
+"""Cache route paths and schedules by service date."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import date, datetime, time, timedelta
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, cast
+
+from ..batch import Batch
+from ..const import DEFAULT_MAX_CONCURRENCY, DEFAULT_SCHEDULE_PREFETCH_TIME, TZ
+from ..exceptions import WMATAError
+from .const import BusEndpoint
+
+if TYPE_CHECKING:
+    from . import MetroBus
+    from .models.route import Route
+    from .models.route_path import RoutePath
+    from .models.route_schedule import RouteSchedule
+    from .models.stop import Stop
+    from .models.stop_schedule import StopArrival
+
+_LOGGER = logging.getLogger(__name__)
+
+EntryKey = tuple[BusEndpoint, str, date]
+Fetcher = Callable[[date | None], Awaitable[Any]]
+
+
+class ScheduleCache:
+    """
+    Cache route paths, route schedules and stop schedules by service date.
+
+    Results for a route or stop don't change within a service day, so they are kept
+    until the day rolls over in the WMATA timezone. Concurrent requests for the same
+    entry share one request, and failed requests are not cached. Once started, the
+    cache fetches tomorrow's entries for everything requested today at
+    `prefetch_time`, so the first requests after midnight don't all miss at once.
+    """
+
+    prefetch_time: time
+    max_concurrency: int
+    hits: int
+    misses: int
+    prefetched: int
+
+    def __init__(
+        self,
+        bus: "MetroBus",
+        prefetch_time: time = DEFAULT_SCHEDULE_PREFETCH_TIME,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ) -> None:
+        """Initialize."""
+        self.bus = bus
+        self.prefetch_time = prefetch_time
+        self.max_concurrency = max_concurrency
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self._entries: dict[EntryKey, asyncio.Future[Any]] = {}
+        self._fetchers: dict[tuple[BusEndpoint, str], Fetcher] = {}
+        self._date = self._now().date()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        """Return the number of cached entries for the current and later days."""
+        self._roll_over()
+        return len(self._entries)
+
+    @staticmethod
+    def _now() -> datetime:
+        """Return the current time in the WMATA timezone."""
+        return datetime.now(TZ)
+
+    def _roll_over(self) -> date:
+        """Evict entries for past days if the day rolled over and return the day."""
+        if (today := self._now().date()) != self._date:
+            self._date = today
+            for key in [key for key in self._entries if key[2] < today]:
+                del self._entries[key]
+            self._fetchers = {
+                (endpoint, id_): self._fetchers[(endpoint, id_)]
+                for endpoint, id_, _ in self._entries
+            }
+            _LOGGER.debug("Service day rolled over to %s", today)
+        return today
+
+    async def _fetch(self, key: EntryKey, fetch: Fetcher, date_: date | None) -> Any:
+        """Return a cached entry, fetching it if it isn't cached yet."""
+        if (future := self._entries.get(key)) is None:
+            future = self._entries[key] = asyncio.ensure_future(fetch(date_))
+            self._fetchers[key[:2]] = fetch
+        try:
+            # Shielded so that a cancelled caller doesn't cancel the shared request
+            return await asyncio.shield(future)
+        except (Exception, WMATAError):
+            if self._entries.get(key) is future:
+                del self._entries[key]
+            raise
+
+    async def _get(
+        self, endpoint: BusEndpoint, id_: str, date_: date | None, fetch: Fetcher
+    ) -> Any:
+        """Return an entry for a date, or for today if no date is provided."""
+        key = (endpoint, id_, date_ or self._roll_over())
+        if key in self._entries:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return await self._fetch(key, fetch, date_)
+
+    async def get_route_path(
+        self, route: "Route", date_: date | None = None
+    ) -> "RoutePath":
+        """Return the path for a given route from the cache."""
+        return cast(
+            "RoutePath",
+            await self._get(
+                BusEndpoint.ROUTE_PATH,
+                route.route_id,
+                date_,
+                lambda date_: self.bus.get_route_path(route, date_),
+            ),
+        )
+
+    async def get_route_schedule(
+        self, route: "Route", date_: date | None = None
+    ) -> "RouteSchedule":
+        """Return the schedule for a given route from the cache."""
+        return cast(
+            "RouteSchedule",
+            await self._get(
+                BusEndpoint.ROUTE_SCHEDULE,
+                route.route_id,
+                date_,
+                lambda date_: self.bus.get_route_schedule(route, date_),
+            ),
+        )
+
+    async def get_stop_schedule(
+        self, stop: "Stop", date_: date | None = None
+    ) -> list["StopArrival"]:
+        """Return the schedule for a given stop from the cache."""
+        return cast(
+            list["StopArrival"],
+            await self._get(
+                BusEndpoint.STOP_SCHEDULE,
+                stop.stop_id,
+                date_,
+                lambda date_: self.bus.get_stop_schedule(stop, date_),
+            ),
+        )
+
+    async def prefetch(self, date_: date | None = None) -> int:
+        """
+        Fetch every entry cached for today for another date, by default tomorrow.
+
+        Returns the number of entries that were fetched.
+        """
+        today = self._roll_over()
+        prefetch_date = date_ or today + timedelta(days=1)
+        keys = [
+            (endpoint, id_)
+            for endpoint, id_, entry_date in self._entries
+            if entry_date == today
+            and (endpoint, id_, prefetch_date) not in self._entries
+        ]
+        batch: Batch[tuple[BusEndpoint, str], Any] = Batch(
+            keys,
+            lambda key: self._fetch(
+                (*key, prefetch_date), self._fetchers[key], prefetch_date
+            ),
+            self.max_concurrency,
+        )
+        fetched = len(await batch.results())
+        self.prefetched += fetched
+        _LOGGER.debug("Prefetched %s entries for %s", fetched, prefetch_date)
+        return fetched
+
+    def _get_seconds_until_prefetch(self) -> float:
+        """Return the number of seconds until the next prefetch."""
+        now = self._now()
+        prefetch_at = datetime.combine(now.date(), self.prefetch_time, TZ)
+        if prefetch_at <= now:
+            prefetch_at = datetime.combine(
+                now.date() + timedelta(days=1), self.prefetch_time, TZ
+            )
+        return prefetch_at.timestamp() - now.timestamp()
+
+    async def _run(self) -> None:
+        """Prefetch tomorrow's entries every day until stopped."""
+        while True:
+            await asyncio.sleep(self._get_seconds_until_prefetch())
+            await self.prefetch()
+
+    @property
+    def running(self) -> bool:
+        """Return whether prefetching is running."""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start prefetching in the background."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop prefetching."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
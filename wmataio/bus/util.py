@@ -12,6 +12,18 @@ if TYPE_CHECKING:
     from ..client import Client
 
 
+def _get_stop_indexes(
+    stop_indexes: dict[RoutePathDirection, dict[Stop, int]],
+    direction: RoutePathDirection,
+) -> dict[Stop, int]:
+    """Get the first position of each stop in a direction, indexing it if needed."""
+    if (route_stops := stop_indexes.get(direction)) is None:
+        route_stops = stop_indexes[direction] = {}
+        for index, stop in enumerate(direction.stops):
+            route_stops.setdefault(stop, index)
+    return route_stops
+
+
 async def find_direct_route_start_end_stop_pairs(
     client: "Client",
     start_stops: Iterable[Stop],
@@ -22,6 +34,9 @@ async def find_direct_route_start_end_stop_pairs(
         tuple[Stop, Stop], set[RoutePathDirection]
     ] = defaultdict(set)
     route_paths: dict[Route, RoutePath] = {}
+    # Index of the first position of each stop in each direction, so that checking
+    # whether and where a direction serves a stop doesn't scan its stops
+    stop_indexes: dict[RoutePathDirection, dict[Stop, int]] = {}
 
     for start_stop in start_stops:
         for end_stop in end_stops:
@@ -31,10 +46,10 @@ async def find_direct_route_start_end_stop_pairs(
                 if route not in route_paths:
                     route_paths[route] = await client.bus.get_route_path(route)
                 for direction in route_paths[route].path_directions.values():
-                    route_stops = direction.stops
+                    route_stops = _get_stop_indexes(stop_indexes, direction)
                     if start_stop not in route_stops or end_stop not in route_stops:
                         continue
-                    if route_stops.index(start_stop) < route_stops.index(end_stop):
+                    if route_stops[start_stop] < route_stops[end_stop]:
                         stop_pair = (start_stop, end_stop)
                     else:
                         stop_pair = (end_stop, start_stop)
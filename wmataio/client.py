@@ -2,39 +2,98 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
 from contextlib import nullcontext
 from dataclasses import dataclass, field
+from datetime import date, datetime
+from functools import partial
 from json.decoder import JSONDecodeError
-from typing import Any, cast
+from pathlib import Path
+from typing import Any, Callable, Iterable, Protocol, TypeVar, cast
 
 from aiohttp import ClientSession, client_exceptions
 
+from .batch import Batch
 from .bus import MetroBus
 from .bus.const import BusEndpoint
-from .const import ADDITIONAL_PATH_HEADER, CLASS_HEADER, ENUM_HEADER, WMATAEndpoint
+from .bus.models.route import Route
+from .bus.models.timetable import RouteTimetable
+from .const import (
+    ADDITIONAL_PATH_HEADER,
+    BASE_WMATA_URL,
+    CLASS_HEADER,
+    DEFAULT_CALLS_PER_SECOND,
+    DEFAULT_DAILY_QUOTA,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_STATIC_REFRESH_INTERVAL,
+    ENUM_HEADER,
+    TZ,
+    WMATAEndpoint,
+)
 from .exceptions import WMATAError
+from .hub import PollingHub
+from .identity import IdentityMap
+from .load import LoadPlan, LoadReport
+from .offload import Offloader
+from .planner import JourneyPlanner
 from .rail import MetroRail
 from .rail.const import RailEndpoint
+from .rate_limit import RateLimiter
+from .refresh import DatasetRefresher
+from .scheduler import AdaptiveScheduler
+from .shared import SharedDataset, publish_dataset
 
 _LOGGER = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+class Transport(Protocol):
+    """Transport that serves responses to `Client.fetch` in place of the WMATA API."""
+
+    async def fetch(
+        self,
+        enum_: BusEndpoint | RailEndpoint | WMATAEndpoint,
+        params: dict[str, Any] | None = None,
+        additional_path: str | None = None,
+    ) -> dict:
+        """Fetch data for a request."""
+
 
 @dataclass
 class Client:
-    """Client to provide API request support."""
+    """
+    Client to provide API request support.
+
+    Every request is throttled to `calls_per_second`, which defaults to the 10
+    requests per second of the WMATA default API tier. Pass None to disable it.
+    """
 
     api_key: str
     session: ClientSession | None = None
     test_mode: bool = False
+    calls_per_second: float | None = DEFAULT_CALLS_PER_SECOND
+    daily_quota: int | None = DEFAULT_DAILY_QUOTA
+    transport: Transport | None = None
+    base_url: str = BASE_WMATA_URL
+    offloader: Offloader | None = None
+    identities: IdentityMap = field(init=False)
     bus: MetroBus = field(init=False)
     rail: MetroRail = field(init=False)
+    hub: PollingHub = field(init=False)
+    rate_limiter: RateLimiter = field(init=False)
+    scheduler: AdaptiveScheduler = field(init=False)
     _headers: dict[str, str] = field(init=False, default_factory=dict)
 
     def __post_init__(self) -> None:
         """Post initialize."""
+        self.identities = IdentityMap()
         self.bus = MetroBus(self)
         self.rail = MetroRail(self)
+        self.hub = PollingHub(self)
+        self.rate_limiter = RateLimiter(self.calls_per_second, self.daily_quota)
+        self.scheduler = AdaptiveScheduler(self.rate_limiter)
         self._headers = {"api_key": self.api_key}
 
     def _get_headers(
@@ -52,14 +111,108 @@ class Client:
             }
         return self._headers
 
+    async def load_all(self) -> LoadReport:
+        """
+        Load the base data for both MetroBus and MetroRail.
+
+        Every static endpoint is fetched concurrently and models are built as soon as
+        the payloads they depend on arrive.
+        """
+        plan = LoadPlan()
+        self.bus.add_load_stages(plan)
+        self.rail.add_load_stages(plan)
+        return await plan.run()
+
+    def start_refresh(
+        self, interval: float = DEFAULT_STATIC_REFRESH_INTERVAL
+    ) -> DatasetRefresher:
+        """
+        Reload the base data for MetroBus and MetroRail in the background.
+
+        New datasets are swapped in atomically once they are fully built. Call
+        `stop` on the returned refresher to stop refreshing.
+        """
+        refresher = DatasetRefresher(self.load_all, interval)
+        refresher.start()
+        return refresher
+
+    def publish_dataset(self, path: str | Path) -> int:
+        """
+        Publish the current MetroBus and MetroRail datasets for other processes.
+
+        Returns the size of the published file. Worker processes attach to it with
+        `attach_shared_dataset` instead of loading the base data themselves.
+        """
+        return publish_dataset(path, self.bus.dataset, self.rail.dataset)
+
+    def attach_shared_dataset(self, path: str | Path) -> SharedDataset:
+        """
+        Attach MetroBus and MetroRail to datasets published by another process.
+
+        Attach again once the returned dataset is `stale` to pick up a newer one.
+        """
+        shared = SharedDataset(path)
+        self.bus.attach_shared_dataset(shared)
+        self.rail.attach_shared_dataset(shared)
+        return shared
+
+    async def get_journey_planner(
+        self,
+        routes: Iterable[Route] | None = None,
+        date_: date | None = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ) -> JourneyPlanner:
+        """
+        Return a journey planner over bus routes and MetroRail for a date.
+
+        The base data must be loaded first. If no routes are provided, every route is
+        used, and if no date_ is provided, the current date will be used. Routes
+        whose timetable can't be fetched are skipped. Planning with the returned
+        planner makes no requests.
+        """
+        planner = JourneyPlanner()
+        batch: Batch[Route, RouteTimetable] = Batch(
+            list(self.bus.routes.values() if routes is None else routes),
+            partial(self.bus.get_route_timetable, date_=date_),
+            max_concurrency,
+        )
+        async for _, timetable in batch:
+            planner.add_route_timetable(timetable, self.bus.stops)
+        planner.add_rail(self.rail, date_ or datetime.now(TZ).date())
+        await self.build(planner.build, items=len(planner))
+        return planner
+
+    async def build(self, func: Callable[..., T], *args: Any, items: int) -> T:
+        """
+        Build models from a payload with a number of records.
+
+        Large payloads are built outside of the event loop when an offloader is set.
+        """
+        if self.offloader is None:
+            return func(*args)
+        return await self.offloader.build(func, *args, items=items)
+
     async def fetch(
         self,
         enum_: BusEndpoint | RailEndpoint | WMATAEndpoint,
         params: dict[str, Any] | None = None,
         additional_path: str | None = None,
     ) -> dict:
-        """Fetch data from WMATA API."""
+        """Fetch data from the transport if one is set, otherwise from WMATA API."""
+        if self.transport is not None:
+            return await self.transport.fetch(enum_, params, additional_path)
+        return await self.request(enum_, params, additional_path)
+
+    async def request(
+        self,
+        enum_: BusEndpoint | RailEndpoint | WMATAEndpoint,
+        params: dict[str, Any] | None = None,
+        additional_path: str | None = None,
+    ) -> dict:
+        """Request data from WMATA API."""
         url = enum_.value
+        if self.base_url != BASE_WMATA_URL:
+            url = f"{self.base_url.rstrip('/')}{url.removeprefix(BASE_WMATA_URL)}"
         if additional_path:
             url = f"{url}/{additional_path}"
 
@@ -68,6 +221,7 @@ class Client:
         context_manager = nullcontext(self.session) if self.session else ClientSession()
         async with context_manager as session:
             while retry:
+                await self.rate_limiter.acquire()
                 try:
                     response = await session.get(
                         url,
@@ -85,10 +239,14 @@ class Client:
                 else:
                     retry = False
 
+            body = await response.read()
             try:
-                response_json = await response.json(content_type=None)
+                if self.offloader is None:
+                    response_json = json.loads(body)
+                else:
+                    response_json = await self.offloader.decode(body)
             except JSONDecodeError as error:
-                _LOGGER.error("Invalid JSON: %s", response.text())
+                _LOGGER.error("Invalid JSON: %s", body)
                 raise WMATAError("Invalid JSON") from error
             _LOGGER.debug("Response: %s", response_json)
 
@@ -1,4 +1,5 @@
 """Constants for WMATA API."""
+from datetime import time
 from enum import Enum
 from zoneinfo import ZoneInfo
 
@@ -9,6 +10,40 @@ CLASS_HEADER = f"{HEADER_PREFIX}-class"
 ENUM_HEADER = f"{HEADER_PREFIX}-enum"
 ADDITIONAL_PATH_HEADER = f"{HEADER_PREFIX}-additional-path"
 
+# Limits of the WMATA default API tier
+DEFAULT_CALLS_PER_SECOND = 10
+DEFAULT_DAILY_QUOTA = 50_000
+# Number of requests a batch runs at the same time
+DEFAULT_MAX_CONCURRENCY = 10
+
+# WMATA refreshes live positions roughly every 7 to 10 seconds
+DEFAULT_POSITIONS_POLL_INTERVAL = 10
+# Incidents change far less often than positions
+DEFAULT_INCIDENTS_POLL_INTERVAL = 60
+# Bounds for adaptive polling intervals
+DEFAULT_MIN_POLL_INTERVAL = 5
+DEFAULT_MAX_POLL_INTERVAL = 300
+# Number of results buffered for each subscriber to a shared poller
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 10
+# Static data such as routes and stations rarely changes more than once a day
+DEFAULT_STATIC_REFRESH_INTERVAL = 24 * 60 * 60
+# Number of models each worker keeps built from a shared dataset
+DEFAULT_SHARED_CACHE_SIZE = 1024
+# Payloads at least this large are decoded and parsed outside of the event loop
+DEFAULT_OFFLOAD_MIN_BYTES = 256 * 1024
+DEFAULT_OFFLOAD_MIN_ITEMS = 1000
+# Number of distinct timestamp strings whose parsed values are cached
+DEFAULT_TIMESTAMP_CACHE_SIZE = 1 << 16
+# How often the event loop lag is sampled
+DEFAULT_LOOP_LAG_INTERVAL = 0.01
+# Local time at which schedules for the next service day are prefetched
+DEFAULT_SCHEDULE_PREFETCH_TIME = time(22, 30)
+# Journey planning limits, with distances in miles and speeds in miles per hour
+DEFAULT_MAX_TRANSFERS = 4
+DEFAULT_TRANSFER_DISTANCE = 0.25
+DEFAULT_WALKING_SPEED = 3.0
+DEFAULT_MIN_TRANSFER_SECONDS = 60
+
 GEOCODE_URL = "https://geocoding.geo.census.gov/geocoder/locations/onelineaddress"
 DEFAULT_GEOCODE_PARAMS = {
     "benchmark": "Public_AR_Current",
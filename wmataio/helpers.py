@@ -5,12 +5,26 @@ Generally should only be used internally.
 """
 from __future__ import annotations
 
+from array import array
 from dataclasses import astuple
-from typing import TYPE_CHECKING, Callable, TypeVar, cast
+from datetime import datetime
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Mapping,
+    Protocol,
+    TypeVar,
+    cast,
+)
 
 from haversine import Unit, haversine
 
+from .const import DEFAULT_TIMESTAMP_CACHE_SIZE, TZ
 from .models.coordinates import Coordinates
+from .models.delta import Delta
 
 if TYPE_CHECKING:
     from .bus.models.route import Route
@@ -20,9 +34,62 @@ if TYPE_CHECKING:
 
 T = TypeVar("T", "Station", "Stop")
 U = TypeVar("U", "Line", "Route")
+V = TypeVar("V")
+D = TypeVar("D")
+
+
+class Updatable(Protocol):
+    """Model that can be updated in place from newer data."""
+
+    def update(self, data: Any) -> frozenset[str]:
+        """Update the model and return the names of the fields that changed."""
+
+
+M = TypeVar("M", bound=Updatable)
 StopDistanceType = tuple[T, float]
 
 
+@lru_cache(maxsize=DEFAULT_TIMESTAMP_CACHE_SIZE)
+def parse_datetime(value: str) -> datetime:
+    """
+    Parse a WMATA timestamp, which is in local time without an offset.
+
+    Payloads such as route schedules repeat the same timestamps many times, so
+    parsed values are cached. Datetimes are immutable, so they can be shared.
+    """
+    return datetime.fromisoformat(value).replace(tzinfo=TZ)
+
+
+@lru_cache(maxsize=DEFAULT_TIMESTAMP_CACHE_SIZE)
+def _parse_hour_epoch(value: str) -> int:
+    """Parse the hour of a WMATA timestamp into epoch seconds."""
+    return int(parse_datetime(f"{value}:00:00").timestamp())
+
+
+@lru_cache(maxsize=DEFAULT_TIMESTAMP_CACHE_SIZE)
+def parse_epoch(value: str) -> int:
+    """
+    Parse a WMATA timestamp into epoch seconds.
+
+    Parsed values are cached. On a cache miss, only the hour of the timestamp is
+    parsed as a datetime, and cached, because the UTC offset can change between
+    hours. Minutes and seconds are added as integers.
+    """
+    if len(value) == 19 and value[10] == "T" and value[13] == ":":
+        return _parse_hour_epoch(value[:13]) + int(value[14:16]) * 60 + int(value[17:])
+    return int(parse_datetime(value).timestamp())
+
+
+def parse_datetimes(values: Iterable[str]) -> list[datetime]:
+    """Parse a column of WMATA timestamps."""
+    return list(map(parse_datetime, values))
+
+
+def parse_epochs(values: Iterable[str]) -> array[int]:
+    """Parse a column of WMATA timestamps into a compact array of epoch seconds."""
+    return array("q", map(parse_epoch, values))
+
+
 def __dist_between(start: Coordinates, end: T) -> float:
     """Get the distance between a Coordinates and a Stop/Station."""
     return cast(
@@ -31,7 +98,7 @@ def __dist_between(start: Coordinates, end: T) -> float:
 
 
 def __sorted_locations_and_dist(
-    locations_dict: dict[str, T], coordinate: Coordinates
+    locations_dict: Mapping[str, T], coordinate: Coordinates
 ) -> list[StopDistanceType]:
     """Sort the locations by distance from the given coordinate."""
     return sorted(
@@ -44,7 +111,7 @@ def __sorted_locations_and_dist(
 
 
 async def get_stop_or_station_pairs_closest_to_coordinates(
-    locations_dict: dict[str, T],
+    locations_dict: Mapping[str, T],
     routes_func: Callable[[T], set[U]],
     start_coordinate: Coordinates,
     end_coordinate: Coordinates,
@@ -106,3 +173,64 @@ async def get_stop_or_station_pairs_closest_to_coordinates(
         return start_end_pairs[:max_pairs]
 
     return start_end_pairs
+
+
+def get_delta(
+    previous: dict[str, V],
+    current: dict[str, V],
+    moved_func: Callable[[V, V], bool],
+) -> Delta[V]:
+    """
+    Get the changes between two snapshots keyed by entity ID.
+
+    `moved_func` is called with the previous and current entity for every ID in both
+    snapshots and should return whether the entity moved.
+    """
+    added: dict[str, V] = {}
+    moved: dict[str, V] = {}
+    for id_, entity in current.items():
+        if (previous_entity := previous.get(id_)) is None:
+            added[id_] = entity
+        elif moved_func(previous_entity, entity):
+            moved[id_] = entity
+    removed = {id_: entity for id_, entity in previous.items() if id_ not in current}
+    return Delta(added, moved, removed, current)
+
+
+def get_changed_keys(
+    previous: Mapping[str, object], current: Mapping[str, object]
+) -> set[str]:
+    """
+    Get the keys of a payload whose values are new or differ from a previous payload.
+
+    Keys that were dropped from the payload aren't returned, since there is nothing
+    to parse for them.
+    """
+    return {
+        key
+        for key, value in current.items()
+        if key not in previous or previous[key] != value
+    }
+
+
+def update_models(
+    previous: Mapping[str, M] | None,
+    items_data: Iterable[D],
+    id_func: Callable[[D], str],
+    factory: Callable[[D], M],
+) -> dict[str, M]:
+    """
+    Update models in place from new data keyed by entity ID.
+
+    Models in `previous` whose ID is in the new data are updated in place, and
+    models are only built for new IDs.
+    """
+    models: dict[str, M] = {}
+    for item_data in items_data:
+        id_ = id_func(item_data)
+        if previous is not None and (model := previous.get(id_)) is not None:
+            model.update(item_data)
+        else:
+            model = factory(item_data)
+        models[id_] = model
+    return models
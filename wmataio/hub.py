@@ -0,0 +1,273 @@
+"""Shared pollers that fan results out to many subscribers."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import suppress
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Generic,
+    Hashable,
+    TypeVar,
+)
+
+from .const import (
+    DEFAULT_POSITIONS_POLL_INTERVAL,
+    DEFAULT_SUBSCRIBER_QUEUE_SIZE,
+    WMATAEndpoint,
+)
+from .exceptions import WMATAError
+
+if TYPE_CHECKING:
+    from .bus.const import BusEndpoint
+    from .client import Client
+    from .rail.const import RailEndpoint
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Closed:
+    """Marker queued when a poller stops producing results."""
+
+
+class _Error:
+    """Wrapper for an error raised by a poller."""
+
+    def __init__(self, error: BaseException) -> None:
+        """Initialize."""
+        self.error = error
+
+
+class Subscription(Generic[T]):
+    """
+    Async iterator over the results of a shared poller.
+
+    Results are buffered in a bounded queue. When a subscriber falls behind, the
+    oldest buffered result is dropped to make room for the newest one.
+    """
+
+    hub: PollingHub
+    key: Hashable
+    dropped: int
+
+    def __init__(self, hub: PollingHub, key: Hashable, maxsize: int) -> None:
+        """Initialize."""
+        self.hub = hub
+        self.key = key
+        self.dropped = 0
+        self._queue: asyncio.Queue[T | _Closed | _Error] = asyncio.Queue(maxsize)
+        self._closed = False
+
+    def put(self, item: T | _Closed | _Error) -> None:
+        """Queue an item, dropping the oldest one if the queue is full."""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def __aiter__(self) -> Subscription[T]:
+        """Return the async iterator."""
+        return self
+
+    async def __anext__(self) -> T:
+        """Return the next result."""
+        if self._closed:
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if isinstance(item, _Closed):
+            self._closed = True
+            raise StopAsyncIteration
+        if isinstance(item, _Error):
+            self._closed = True
+            raise item.error
+        return item
+
+    async def __aenter__(self) -> Subscription[T]:
+        """Enter the context manager."""
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        """Exit the context manager."""
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Unsubscribe, stopping the poller if this was its last subscriber."""
+        if not self._closed:
+            self._closed = True
+            self.put(_Closed())
+        await self.hub.unsubscribe(self)
+
+
+class _Poller:
+    """Run a single source and fan its results out to subscribers."""
+
+    def __init__(
+        self, hub: PollingHub, key: Hashable, source: AsyncIterator[Any]
+    ) -> None:
+        """Initialize."""
+        self.hub = hub
+        self.key = key
+        self.source = source
+        self.interval: float | None = None
+        self.subscribers: set[Subscription] = set()
+        self.task = asyncio.create_task(self._run())
+
+    def _publish(self, item: Any) -> None:
+        """Publish an item to every subscriber."""
+        for subscriber in self.subscribers:
+            subscriber.put(item)
+
+    async def _run(self) -> None:
+        """Run the source until it is exhausted or fails."""
+        try:
+            async for item in self.source:
+                self._publish(item)
+        except (Exception, WMATAError) as error:  # pylint: disable=broad-except
+            self._publish(_Error(error))
+        else:
+            self._publish(_Closed())
+        finally:
+            self.hub.discard_poller(self)
+
+
+class PollingHub:
+    """
+    Run one poller per distinct request and share its results with subscribers.
+
+    Pollers are started by the first subscriber and stopped when the last subscriber
+    leaves.
+    """
+
+    client: "Client"
+
+    def __init__(self, client: "Client") -> None:
+        """Initialize."""
+        self.client = client
+        self._pollers: dict[Hashable, _Poller] = {}
+
+    @property
+    def keys(self) -> list[Hashable]:
+        """Return the keys of all running pollers."""
+        return list(self._pollers)
+
+    def subscriber_count(self, key: Hashable) -> int:
+        """Return the number of subscribers to a poller."""
+        if (poller := self._pollers.get(key)) is None:
+            return 0
+        return len(poller.subscribers)
+
+    def subscribe_source(
+        self,
+        key: Hashable,
+        source_factory: Callable[[], AsyncIterator[T]],
+        maxsize: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE,
+    ) -> Subscription[T]:
+        """
+        Subscribe to the results of a source.
+
+        `source_factory` is only called to start a poller when no poller is running
+        for `key`. Subscribers that join a running poller only receive results
+        produced after they joined.
+        """
+        if (poller := self._pollers.get(key)) is None:
+            poller = self._pollers[key] = _Poller(self, key, source_factory())
+        subscription: Subscription[T] = Subscription(self, key, maxsize)
+        poller.subscribers.add(subscription)
+        return subscription
+
+    def subscribe(
+        self,
+        enum_: "BusEndpoint" | "RailEndpoint" | WMATAEndpoint,
+        params: dict[str, Any] | None = None,
+        additional_path: str | None = None,
+        interval: float | None = DEFAULT_POSITIONS_POLL_INTERVAL,
+        maxsize: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE,
+    ) -> Subscription[dict]:
+        """
+        Subscribe to the responses of an endpoint polled every `interval` seconds.
+
+        Subscribers to the same endpoint, params and additional path share one
+        poller, which polls at the shortest interval requested by any of them. When
+        every subscriber passes `None` as the interval, the poller's interval is
+        chosen by the client's adaptive scheduler.
+        """
+        key = (enum_, tuple(sorted((params or {}).items())), additional_path)
+        subscription: Subscription[dict] = self.subscribe_source(
+            key,
+            lambda: self._poll_endpoint(key, enum_, params, additional_path),
+            maxsize,
+        )
+        poller = self._pollers[key]
+        if interval is not None:
+            poller.interval = (
+                interval if poller.interval is None else min(poller.interval, interval)
+            )
+        return subscription
+
+    async def _poll_endpoint(
+        self,
+        key: Hashable,
+        enum_: "BusEndpoint" | "RailEndpoint" | WMATAEndpoint,
+        params: dict[str, Any] | None,
+        additional_path: str | None,
+    ) -> AsyncIterator[dict]:
+        """Poll an endpoint until the poller is stopped."""
+        scheduler = self.client.scheduler
+        previous: dict | None = None
+        scheduled = False
+        try:
+            while poller := self._pollers.get(key):
+                try:
+                    data = await self.client.fetch(
+                        enum_, params=params, additional_path=additional_path
+                    )
+                except WMATAError as error:
+                    _LOGGER.warning(
+                        "Error while polling %s: %s", enum_.name, error.message
+                    )
+                else:
+                    if previous is not None:
+                        scheduler.record(key, enum_, previous, data)
+                    previous = data
+                    yield data
+
+                if poller.interval is not None:
+                    await asyncio.sleep(poller.interval)
+                    continue
+                decision = scheduler.schedule(key, enum_, len(poller.subscribers))
+                if decision.interval is None:
+                    scheduled = False
+                    break
+                scheduled = True
+                await asyncio.sleep(decision.interval)
+        finally:
+            if scheduled:
+                scheduler.remove(key, enum_)
+
+    def discard_poller(self, poller: _Poller) -> None:
+        """Forget a poller that stopped, unless another one replaced it already."""
+        if self._pollers.get(poller.key) is poller:
+            del self._pollers[poller.key]
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscriber and stop the poller if it has no subscribers left."""
+        if (poller := self._pollers.get(subscription.key)) is None:
+            return
+        poller.subscribers.discard(subscription)
+        if poller.subscribers:
+            return
+        del self._pollers[subscription.key]
+        poller.task.cancel()
+        with suppress(asyncio.CancelledError):
+            await poller.task
+
+    async def close(self) -> None:
+        """Stop every poller."""
+        for poller in list(self._pollers.values()):
+            for subscription in list(poller.subscribers):
+                await subscription.aclose()
@@ -0,0 +1,52 @@
+"""Identity map of the canonical model instances of a client."""
+from __future__ import annotations
+
+import weakref
+from typing import Any, Mapping, Protocol, TypeVar, cast
+
+
+class Entity(Protocol):
+    """Model that is identified by an ID and built from a payload."""
+
+    data: Any
+
+
+T = TypeVar("T", bound=Entity)
+
+
+class IdentityMap:
+    """
+    Canonical instances of stops, routes, stations and lines keyed by type and ID.
+
+    The instance in the current dataset is canonical while its data matches what the
+    API returns. Otherwise the first instance built from the same data is canonical
+    for as long as it is referenced, so repeated calls return the same instance.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._instances: weakref.WeakValueDictionary[
+            tuple[type, str], Any
+        ] = weakref.WeakValueDictionary()
+
+    def __len__(self) -> int:
+        """Return the number of instances that are tracked outside of datasets."""
+        return len(self._instances)
+
+    def get_canonical(
+        self, instance: T, id_: str, dataset: Mapping[str, T] | None = None
+    ) -> T:
+        """Return the canonical instance for a newly built instance."""
+        if (
+            dataset is not None
+            and (existing := dataset.get(id_)) is not None
+            and existing.data == instance.data
+        ):
+            return existing
+        key = (type(instance), id_)
+        if (existing := self._instances.get(key)) is not None and (
+            existing.data == instance.data
+        ):
+            return cast(T, existing)
+        self._instances[key] = instance
+        return instance
@@ -0,0 +1,125 @@
+"""Change feeds for bus, rail and elevator/escalator incidents."""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, AsyncGenerator, Awaitable, Callable, Generic, Iterable, TypeVar
+
+T = TypeVar("T")
+
+
+class IncidentEventType(Enum):
+    """Enum for all incident event types."""
+
+    CREATED = "created"
+    UPDATED = "updated"
+    RESOLVED = "resolved"
+
+
+@dataclass
+class IncidentEvent(Generic[T]):
+    """
+    Represent a change to an incident.
+
+    For resolved incidents, `incident` is the last known version of the incident.
+    """
+
+    type: IncidentEventType
+    id: str
+    incident: T
+
+
+class IncidentFeed(Generic[T]):
+    """
+    Track incidents across polls and yield only the incidents that changed.
+
+    Incidents are keyed by the `id_key` of their data and are only rebuilt when their `DateUpdated`
+    changes. `index` maps every key returned by `index_func` for an incident (for
+    example station codes or route IDs) to the open incidents for that key, and is
+    updated incrementally as events are produced.
+    """
+
+    incidents: dict[str, T]
+    index: dict[str, dict[str, T]]
+
+    def __init__(
+        self,
+        fetch_func: Callable[[], Awaitable[list[Any]]],
+        id_key: str,
+        incident_func: Callable[[Any], T],
+        index_func: Callable[[T], Iterable[str]],
+        interval: float,
+    ) -> None:
+        """Initialize."""
+        self._fetch_func = fetch_func
+        self._id_key = id_key
+        self._incident_func = incident_func
+        self._index_func = index_func
+        self._interval = interval
+        self._dates_updated: dict[str, str] = {}
+        self._iterator: AsyncGenerator[IncidentEvent[T], None] | None = None
+        self.incidents = {}
+        self.index = {}
+
+    def _add_to_index(self, id_: str, incident: T) -> None:
+        """Add an incident to the index."""
+        for key in self._index_func(incident):
+            self.index.setdefault(key, {})[id_] = incident
+
+    def _remove_from_index(self, id_: str, incident: T) -> None:
+        """Remove an incident from the index."""
+        for key in self._index_func(incident):
+            if (incidents := self.index.get(key)) is not None:
+                if id_ in incidents:
+                    del incidents[id_]
+                if not incidents:
+                    del self.index[key]
+
+    def update(self, incidents_data: list[Any]) -> list[IncidentEvent[T]]:
+        """Update the feed with the latest incidents and return the changes."""
+        events: list[IncidentEvent[T]] = []
+        seen: set[str] = set()
+        for incident_data in incidents_data:
+            id_: str = incident_data[self._id_key]
+            seen.add(id_)
+            if self._dates_updated.get(id_) == incident_data["DateUpdated"]:
+                continue
+            event_type = IncidentEventType.CREATED
+            if (previous := self.incidents.get(id_)) is not None:
+                event_type = IncidentEventType.UPDATED
+                self._remove_from_index(id_, previous)
+            incident = self.incidents[id_] = self._incident_func(incident_data)
+            self._dates_updated[id_] = incident_data["DateUpdated"]
+            self._add_to_index(id_, incident)
+            events.append(IncidentEvent(event_type, id_, incident))
+
+        for id_ in [id_ for id_ in self.incidents if id_ not in seen]:
+            incident = self.incidents.pop(id_)
+            del self._dates_updated[id_]
+            self._remove_from_index(id_, incident)
+            events.append(IncidentEvent(IncidentEventType.RESOLVED, id_, incident))
+
+        return events
+
+    async def _watch(self) -> AsyncGenerator[IncidentEvent[T], None]:
+        """Poll incidents and yield the changes."""
+        while True:
+            for event in self.update(await self._fetch_func()):
+                yield event
+            await asyncio.sleep(self._interval)
+
+    def __aiter__(self) -> IncidentFeed[T]:
+        """Return the async iterator."""
+        return self
+
+    async def __anext__(self) -> IncidentEvent[T]:
+        """Return the next incident event."""
+        if self._iterator is None:
+            self._iterator = self._watch()
+        return await anext(self._iterator)
+
+    async def aclose(self) -> None:
+        """Stop polling."""
+        if self._iterator is not None:
+            await self._iterator.aclose()
@@ -0,0 +1,146 @@
+"""Load static data concurrently following the dependencies between stages."""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class StageTiming:
+    """Timing of a load stage, relative to the start of the load."""
+
+    name: str
+    dependencies: tuple[str, ...] = field(repr=False)
+    started: float
+    finished: float
+
+    @property
+    def duration(self) -> float:
+        """Return how long the stage took once its dependencies were ready."""
+        return self.finished - self.started
+
+
+@dataclass
+class LoadReport:
+    """Timings of every stage of a load."""
+
+    elapsed: float
+    stages: dict[str, StageTiming]
+
+    @property
+    def critical_path(self) -> list[StageTiming]:
+        """Return the chain of stages that determined when the load finished."""
+        if not self.stages:
+            return []
+        path = [max(self.stages.values(), key=lambda stage: stage.finished)]
+        while path[0].dependencies:
+            path.insert(
+                0,
+                max(
+                    (self.stages[name] for name in path[0].dependencies),
+                    key=lambda stage: stage.finished,
+                ),
+            )
+        return path
+
+
+@dataclass
+class _Stage:
+    """Stage of a load plan."""
+
+    dependencies: tuple[str, ...]
+    func: Callable[..., Awaitable[Any]]
+
+
+class LoadPlan:
+    """
+    Plan of fetch and build stages that are run as soon as their dependencies are.
+
+    Fetch stages request a payload and have no dependencies, so every fetch starts
+    immediately. Build stages are called with the results of their dependencies, in
+    order, as soon as all of them are available.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._stages: dict[str, _Stage] = {}
+
+    @property
+    def stages(self) -> list[str]:
+        """Return the name of every stage."""
+        return list(self._stages)
+
+    def add_fetch(self, name: str, fetch_func: Callable[[], Awaitable[Any]]) -> None:
+        """Add a stage that fetches a payload."""
+        self._add(name, (), fetch_func)
+
+    def add_build(
+        self,
+        name: str,
+        dependencies: list[str],
+        build_func: Callable[..., Any],
+    ) -> None:
+        """
+        Add a stage that builds models from the results of its dependencies.
+
+        `build_func` may return an awaitable, such as a build in the client's
+        offloader, which is awaited before the stage finishes.
+        """
+
+        async def build(*results: Any) -> Any:
+            """Build, awaiting the result if the build function is async."""
+            result = build_func(*results)
+            if inspect.isawaitable(result):
+                return await result
+            return result
+
+        self._add(name, tuple(dependencies), build)
+
+    def _add(
+        self,
+        name: str,
+        dependencies: tuple[str, ...],
+        func: Callable[..., Awaitable[Any]],
+    ) -> None:
+        """Add a stage."""
+        if name in self._stages:
+            raise ValueError(f"Stage `{name}` already exists")
+        for dependency in dependencies:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage `{name}` depends on unknown `{dependency}`")
+        self._stages[name] = _Stage(dependencies, func)
+
+    async def run(self) -> LoadReport:
+        """Run every stage and return the timing of each one."""
+        start = time.monotonic()
+        timings: dict[str, StageTiming] = {}
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str, stage: _Stage) -> Any:
+            """Run a stage once its dependencies have finished."""
+            results = [await tasks[dependency] for dependency in stage.dependencies]
+            started = time.monotonic() - start
+            result = await stage.func(*results)
+            timings[name] = StageTiming(
+                name, stage.dependencies, started, time.monotonic() - start
+            )
+            return result
+
+        # Stages can only depend on earlier stages, so tasks are created in order
+        for name, stage in self._stages.items():
+            tasks[name] = asyncio.create_task(run_stage(name, stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        report = LoadReport(time.monotonic() - start, timings)
+        _LOGGER.debug("Load finished: %s", report)
+        return report
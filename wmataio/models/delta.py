@@ -0,0 +1,25 @@
+"""Model for changes between snapshots of a live feed."""
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class Delta(Generic[T]):
+    """
+    Represent the changes between two snapshots of a live feed.
+
+    All dicts are keyed by entity ID. `current` is the full snapshot the delta was
+    computed against and is shared with every consumer of the delta, so it should not
+    be mutated.
+    """
+
+    added: dict[str, T]
+    moved: dict[str, T]
+    removed: dict[str, T]
+    current: dict[str, T]
+
+    def __bool__(self) -> bool:
+        """Return whether anything changed."""
+        return bool(self.added or self.moved or self.removed)
@@ -0,0 +1,150 @@
+"""
+Keep the event loop responsive while large payloads are decoded and parsed.
+
+Decoding a large response and building thousands of models from it are synchronous,
+so they block every other coroutine until they finish. An `Offloader` moves the
+work for payloads above a size threshold to an executor. Models reference the
+client they were built for, so they are always built in a thread, where the GIL is
+handed back to the event loop every `sys.getswitchinterval()` seconds. Decoding only
+needs the response body, so it can also be sent to a process pool.
+
+`LoopLagMonitor` measures how late the event loop wakes up from short sleeps, which
+is how long other coroutines were kept waiting.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from .const import (
+    DEFAULT_LOOP_LAG_INTERVAL,
+    DEFAULT_OFFLOAD_MIN_BYTES,
+    DEFAULT_OFFLOAD_MIN_ITEMS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class Offloader:
+    """
+    Run decoding and model building for large payloads in executors.
+
+    Responses of at least `min_bytes` are decoded in `decode_executor`, and models
+    are built in `build_executor` when a payload has at least `min_items` records.
+    Either executor defaults to the event loop's default thread pool.
+    """
+
+    min_bytes: int = DEFAULT_OFFLOAD_MIN_BYTES
+    min_items: int = DEFAULT_OFFLOAD_MIN_ITEMS
+    decode_executor: Executor | None = None
+    build_executor: Executor | None = None
+    decoded: int = field(init=False, default=0)
+    built: int = field(init=False, default=0)
+
+    async def decode(self, body: bytes) -> Any:
+        """Decode a JSON response body."""
+        if len(body) < self.min_bytes:
+            return json.loads(body)
+        self.decoded += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            self.decode_executor, json.loads, body
+        )
+
+    async def build(self, func: Callable[..., T], *args: Any, items: int) -> T:
+        """Build models from a payload with a number of records."""
+        if items < self.min_items:
+            return func(*args)
+        self.built += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            self.build_executor, partial(func, *args)
+        )
+
+
+@dataclass
+class LoopLagStats:
+    """How late the event loop woke up from the monitor's sleeps, in seconds."""
+
+    samples: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        """Return the mean lag."""
+        return self.total / self.samples if self.samples else 0.0
+
+
+class LoopLagMonitor:
+    """
+    Measure event loop lag by sleeping for short intervals in the background.
+
+    A sleep that is still pending when the monitor is stopped is counted as well, so
+    that the loop being blocked right before stopping isn't missed.
+    """
+
+    interval: float
+    stats: LoopLagStats
+
+    def __init__(self, interval: float = DEFAULT_LOOP_LAG_INTERVAL) -> None:
+        """Initialize."""
+        self.interval = interval
+        self.stats = LoopLagStats()
+        self._task: asyncio.Task | None = None
+        self._sleep_started: float | None = None
+
+    @property
+    def running(self) -> bool:
+        """Return whether the monitor is running."""
+        return self._task is not None and not self._task.done()
+
+    def reset(self) -> LoopLagStats:
+        """Start new stats and return the previous ones."""
+        stats, self.stats = self.stats, LoopLagStats()
+        return stats
+
+    def _record(self, started: float) -> None:
+        """Record how late a sleep that started at a time ends."""
+        lag = max(time.perf_counter() - started - self.interval, 0.0)
+        self.stats.samples += 1
+        self.stats.total += lag
+        self.stats.max = max(self.stats.max, lag)
+
+    async def _run(self) -> None:
+        """Sleep and record how late each sleep ends."""
+        while True:
+            self._sleep_started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self._record(self._sleep_started)
+            self._sleep_started = None
+
+    def start(self) -> None:
+        """Start monitoring."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> LoopLagStats:
+        """Stop monitoring and return the stats."""
+        if self._task is not None:
+            if (
+                started := self._sleep_started
+            ) is not None and time.perf_counter() - started > self.interval:
+                self._record(started)
+            self._sleep_started = None
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        _LOGGER.debug("Loop lag: %s", self.stats)
+        return self.stats
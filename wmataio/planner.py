@@ -0,0 +1,716 @@
+"""
+Plan journeys across MetroBus and MetroRail without making any requests.
+
+The planner implements RAPTOR (Round-bAsed Public Transit Optimized Router). Each
+round extends the journeys found so far by one more trip, so round `k` finds the
+earliest arrival at every stop with at most `k - 1` transfers, and the journeys
+returned for a query are the earliest arrivals for each number of transfers.
+
+Trips are grouped into patterns: trips that serve the same stops in the same order
+without overtaking each other. A pattern stores one column of times per stop, so
+the earliest trip that can be boarded at a stop is found by binary search. Walking
+transfers connect stops and stations within `transfer_distance` of each other, and
+journeys may also start by walking from the origin to a nearby stop or station.
+
+Bus trips come from route timetables. The WMATA API has no rail timetable, so rail
+trips are generated from the standard routes of each line. They run at a fixed
+headway between the first and last trains of the line's terminal, and take
+`seconds_per_circuit` per track circuit between stations.
+"""
+from __future__ import annotations
+
+import math
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import TYPE_CHECKING, Iterator, Mapping, NamedTuple, cast
+
+from haversine import Unit, haversine
+
+from .bus.models.stop import Stop
+from .bus.models.timetable import to_epoch
+from .const import (
+    DEFAULT_MAX_TRANSFERS,
+    DEFAULT_MIN_TRANSFER_SECONDS,
+    DEFAULT_TRANSFER_DISTANCE,
+    DEFAULT_WALKING_SPEED,
+    TZ,
+)
+from .rail.const import (
+    DEFAULT_RAIL_HEADWAY,
+    DEFAULT_RAIL_SERVICE_HOURS,
+    DEFAULT_SECONDS_PER_CIRCUIT,
+)
+
+if TYPE_CHECKING:
+    from .bus.models.route_schedule import RouteSchedule
+    from .bus.models.timetable import RouteTimetable
+    from .models.coordinates import Coordinates
+    from .rail import MetroRail
+    from .rail.models.standard_route import StandardRoute
+    from .rail.models.station import Station
+
+# Miles per degree of latitude
+MILES_PER_DEGREE = 69.0
+# Rail service that starts before this hour belongs to the previous service day
+SERVICE_DAY_START_HOUR = 3
+
+INFINITY = 1 << 62
+
+
+def _get_service_seconds(value: time) -> int:
+    """Get the seconds of a time since the start of its service day."""
+    hour = value.hour + (24 if value.hour < SERVICE_DAY_START_HOUR else 0)
+    return hour * 3600 + value.minute * 60 + value.second
+
+
+class Leg(NamedTuple):
+    """Leg of a journey on a bus, on a train, or on foot."""
+
+    mode: str
+    route_id: str | None
+    trip_id: str | None
+    from_id: str
+    to_id: str
+    departure: datetime
+    arrival: datetime
+
+
+@dataclass
+class Journey:
+    """Journey from an origin to a destination."""
+
+    legs: list[Leg]
+    departure: datetime = field(init=False)
+    arrival: datetime = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Post init."""
+        self.departure = self.legs[0].departure
+        self.arrival = self.legs[-1].arrival
+
+    def __hash__(self) -> int:
+        """Return the hash."""
+        return hash(tuple(self.legs))
+
+    @property
+    def duration(self) -> timedelta:
+        """Return the duration of the journey."""
+        return self.arrival - self.departure
+
+    @property
+    def transfers(self) -> int:
+        """Return the number of transfers between trips."""
+        return max(sum(1 for leg in self.legs if leg.mode != "walk") - 1, 0)
+
+
+@dataclass
+class Pattern:
+    """Trips that serve the same stops in order without overtaking each other."""
+
+    mode: str
+    stops: list[int]
+    route_ids: list[str] = field(default_factory=list, repr=False)
+    trip_ids: list[str] = field(default_factory=list, repr=False)
+    columns: list[array[int]] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        """Post init."""
+        self.columns = [array("q") for _ in self.stops]
+
+    def __hash__(self) -> int:
+        """Return the hash."""
+        return hash((self.mode, tuple(self.stops)))
+
+    def accepts(self, times: list[int]) -> bool:
+        """Return whether a trip can be added after the last trip."""
+        return not self.trip_ids or all(
+            column[-1] <= time_ for column, time_ in zip(self.columns, times)
+        )
+
+    def add_trip(self, route_id: str, trip_id: str, times: list[int]) -> None:
+        """Add a trip that departs after every other trip."""
+        self.route_ids.append(route_id)
+        self.trip_ids.append(trip_id)
+        for column, time_ in zip(self.columns, times):
+            column.append(time_)
+
+
+class JourneyPlanner:
+    """
+    Plan earliest arrival journeys with transfers over local bus and rail data.
+
+    Add route timetables or schedules and rail data, then plan journeys between
+    stops and stations, or between coordinates, without making any requests.
+    """
+
+    max_transfers: int
+    transfer_distance: float
+    walking_speed: float
+    min_transfer_seconds: int
+
+    def __init__(
+        self,
+        max_transfers: int = DEFAULT_MAX_TRANSFERS,
+        transfer_distance: float = DEFAULT_TRANSFER_DISTANCE,
+        walking_speed: float = DEFAULT_WALKING_SPEED,
+        min_transfer_seconds: int = DEFAULT_MIN_TRANSFER_SECONDS,
+    ) -> None:
+        """Initialize."""
+        self.max_transfers = max_transfers
+        self.transfer_distance = transfer_distance
+        self.walking_speed = walking_speed
+        self.min_transfer_seconds = min_transfer_seconds
+        self.patterns: list[Pattern] = []
+        self._pattern_groups: defaultdict[
+            tuple[str, tuple[int, ...]], list[int]
+        ] = defaultdict(list)
+        self._node_ids: list[str] = []
+        self._node_indexes: dict[str, int] = {}
+        self._coordinates: list[tuple[float, float] | None] = []
+        self._stop_patterns: list[list[tuple[int, int]]] | None = None
+        self._footpaths: list[list[tuple[int, int]]] | None = None
+        self._cells: dict[tuple[int, int], list[int]] | None = None
+        self._cell_scale = 1.0
+
+    def __len__(self) -> int:
+        """Return the number of stops and stations."""
+        return len(self._node_ids)
+
+    @property
+    def location_ids(self) -> list[str]:
+        """Return the IDs of the stops and the codes of the stations."""
+        return list(self._node_ids)
+
+    def _get_node(self, node_id: str, coordinates: "Coordinates" | None = None) -> int:
+        """Get the index of a stop or station, adding it if needed."""
+        if (index := self._node_indexes.get(node_id)) is None:
+            index = self._node_indexes[node_id] = len(self._node_ids)
+            self._node_ids.append(node_id)
+            self._coordinates.append(None)
+            self._stop_patterns = self._footpaths = None
+        if coordinates is not None and self._coordinates[index] is None:
+            self._coordinates[index] = (coordinates.latitude, coordinates.longitude)
+            self._footpaths = None
+        return index
+
+    def _add_trip(
+        self,
+        mode: str,
+        route_id: str,
+        trip_id: str,
+        stops: tuple[int, ...],
+        times: list[int],
+    ) -> None:
+        """Add a trip to the first pattern of its stops that it doesn't overtake."""
+        group = self._pattern_groups[(mode, stops)]
+        for pattern_index in group:
+            if (pattern := self.patterns[pattern_index]).accepts(times):
+                break
+        else:
+            pattern = Pattern(mode, list(stops))
+            group.append(len(self.patterns))
+            self.patterns.append(pattern)
+            self._stop_patterns = None
+        pattern.add_trip(route_id, trip_id, times)
+
+    def add_route_timetable(
+        self,
+        timetable: "RouteTimetable",
+        stops: Mapping[str, Stop] | None = None,
+    ) -> None:
+        """
+        Add the trips of a route timetable.
+
+        Pass the bus stops to use their coordinates for walking transfers.
+        """
+        stops = stops or {}
+        for direction in timetable.directions.values():
+            nodes = [
+                self._get_node(
+                    stop_id,
+                    stop.coordinates if (stop := stops.get(stop_id)) else None,
+                )
+                for stop_id in direction.stop_ids
+            ]
+            for trip_index, trip_id in enumerate(direction.trip_ids):
+                start = direction.trip_offsets[trip_index]
+                end = direction.trip_offsets[trip_index + 1]
+                self._add_trip(
+                    "bus",
+                    direction.trip_route_ids[trip_index],
+                    trip_id,
+                    tuple(nodes[stop] for stop in direction.stops[start:end]),
+                    list(direction.times[start:end]),
+                )
+
+    def add_route_schedule(self, route_schedule: "RouteSchedule") -> None:
+        """Add the trips of a route schedule."""
+        self.add_route_timetable(route_schedule.timetable, route_schedule.bus.stops)
+
+    @staticmethod
+    def _get_service_span(station: "Station", date_: date) -> tuple[int, int]:
+        """Get the seconds after midnight of the first and last train at a station."""
+        first, last = DEFAULT_RAIL_SERVICE_HOURS
+        if not station.station_times:
+            return first * 3600, last * 3600
+        day_time = station.station_times[0].get_day_time(date_)
+        if not day_time.first_trains or not day_time.last_trains:
+            return first * 3600, last * 3600
+        return (
+            min(_get_service_seconds(train.time) for train in day_time.first_trains),
+            max(_get_service_seconds(train.time) for train in day_time.last_trains),
+        )
+
+    def _add_standard_route(
+        self,
+        rail: "MetroRail",
+        standard_route: "StandardRoute",
+        date_: date,
+        headway: int,
+        seconds_per_circuit: float,
+    ) -> None:
+        """Add generated trips along a standard route."""
+        offsets: list[tuple[str, int]] = [
+            (track_circuit.station_code, index)
+            for index, track_circuit in enumerate(standard_route.track_circuits)
+            if track_circuit.station_code
+        ]
+        if standard_route.track_number == 2:
+            offsets.reverse()
+        if len(offsets) < 2:
+            return
+        stations = [rail.stations[station_code] for station_code, _ in offsets]
+        nodes = tuple(
+            self._get_node(station.station_code, station.coordinates)
+            for station in stations
+        )
+        run_times = [
+            round(abs(index - offsets[0][1]) * seconds_per_circuit)
+            for _, index in offsets
+        ]
+        first, last = self._get_service_span(stations[0], date_)
+        midnight = to_epoch(datetime.combine(date_, time(), TZ))
+        route_id = standard_route.line_code
+        for start in range(first, last + 1, headway):
+            self._add_trip(
+                "rail",
+                route_id,
+                f"{route_id}{standard_route.track_number}-{start}",
+                nodes,
+                [midnight + start + run_time for run_time in run_times],
+            )
+
+    def add_rail(
+        self,
+        rail: "MetroRail",
+        date_: date,
+        headway: int = DEFAULT_RAIL_HEADWAY,
+        seconds_per_circuit: float = DEFAULT_SECONDS_PER_CIRCUIT,
+    ) -> None:
+        """Add generated trips for every line of a loaded MetroRail for a date."""
+        for line in rail.lines.values():
+            for standard_route in line.standard_routes:
+                self._add_standard_route(
+                    rail, standard_route, date_, headway, seconds_per_circuit
+                )
+
+    def _get_walking_seconds(self, miles: float) -> int:
+        """Get the number of seconds it takes to walk a distance."""
+        return round(miles / self.walking_speed * 3600)
+
+    def _get_cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        """Get the grid cell of coordinates, with cells of the transfer distance."""
+        size = self.transfer_distance / MILES_PER_DEGREE
+        return (
+            math.floor(latitude / size),
+            math.floor(longitude * self._cell_scale / size),
+        )
+
+    def _get_nearby(
+        self, latitude: float, longitude: float, distance: float
+    ) -> Iterator[tuple[int, int]]:
+        """Yield the nodes within a distance of coordinates and the seconds to walk."""
+        assert self._cells is not None
+        reach = math.ceil(distance / self.transfer_distance)
+        cell_row, cell_column = self._get_cell(latitude, longitude)
+        for row in range(cell_row - reach, cell_row + reach + 1):
+            for column in range(cell_column - reach, cell_column + reach + 1):
+                for node in self._cells.get((row, column), ()):
+                    if (
+                        miles := haversine(
+                            (latitude, longitude),
+                            cast(tuple[float, float], self._coordinates[node]),
+                            unit=Unit.MILES,
+                        )
+                    ) <= distance:
+                        yield node, self._get_walking_seconds(miles)
+
+    def build(self) -> None:
+        """
+        Build the index of patterns by stop and the walking transfers.
+
+        Planning builds what is missing, so this only needs to be called to build
+        ahead of the first query.
+        """
+        if self._stop_patterns is None:
+            self._stop_patterns = [[] for _ in self._node_ids]
+            for pattern_index, pattern in enumerate(self.patterns):
+                for position, node in enumerate(pattern.stops):
+                    self._stop_patterns[node].append((pattern_index, position))
+        if self._footpaths is None:
+            # Scale longitudes at the latitude furthest from the equator, where a
+            # degree of longitude is shortest, so that every cell is at least the
+            # transfer distance wide
+            self._cell_scale = min(
+                (
+                    math.cos(math.radians(coordinates[0]))
+                    for coordinates in self._coordinates
+                    if coordinates is not None
+                ),
+                default=1.0,
+            )
+            cells: defaultdict[tuple[int, int], list[int]] = defaultdict(list)
+            for node, coordinates in enumerate(self._coordinates):
+                if coordinates is not None:
+                    cells[self._get_cell(*coordinates)].append(node)
+            self._cells = dict(cells)
+            self._footpaths = [
+                [
+                    (other, seconds)
+                    for other, seconds in self._get_nearby(
+                        *coordinates, self.transfer_distance
+                    )
+                    if other != node
+                ]
+                if coordinates is not None
+                else []
+                for node, coordinates in enumerate(self._coordinates)
+            ]
+
+    def _search(self, sources: dict[int, int], targets: dict[int, int]) -> _Search:
+        """
+        Run the rounds of a search from sources to targets.
+
+        Sources are keyed by node with their departure time, and targets are keyed
+        by node with the seconds from them to the destination.
+        """
+        self.build()
+        search = _Search(sources, [dict.fromkeys(sources)])
+        search.best = [INFINITY] * len(self._node_ids)
+        previous = search.best.copy()
+        for node, departure in sources.items():
+            search.best[node] = previous[node] = departure
+
+        # Journeys may start by walking from a source
+        marked = set(sources)
+        self._walk(search, marked, previous, search.labels[0])
+        search.add_round(0, previous, targets)
+
+        for round_ in range(1, self.max_transfers + 2):
+            current = previous.copy()
+            labels: dict[int, Label | None] = {}
+            search.labels.append(labels)
+            slack = self.min_transfer_seconds if round_ > 1 else 0
+            marked = self._scan_patterns(
+                search, marked, previous, current, labels, slack
+            )
+            self._walk(search, marked, current, labels)
+
+            search.add_round(round_, current, targets)
+            if not marked:
+                break
+            previous = current
+        return search
+
+    def _walk(
+        self,
+        search: _Search,
+        marked: set[int],
+        arrivals: list[int],
+        labels: dict[int, Label | None],
+    ) -> None:
+        """Walk from each marked node to nodes nearby, marking the ones improved."""
+        assert self._footpaths is not None
+        footpaths, best = self._footpaths, search.best
+        for node in list(marked):
+            for other, seconds in footpaths[node]:
+                if (arrival := arrivals[node] + seconds) < min(
+                    best[other], search.arrival
+                ):
+                    arrivals[other] = best[other] = arrival
+                    labels[other] = (node, seconds)
+                    marked.add(other)
+
+    def _scan_patterns(
+        self,
+        search: _Search,
+        marked: set[int],
+        previous: list[int],
+        current: list[int],
+        labels: dict[int, Label | None],
+        slack: int,
+    ) -> set[int]:
+        """
+        Ride the patterns through marked nodes and return the nodes they improved.
+
+        Each pattern is scanned from the first position that was reached last round.
+        """
+        assert self._stop_patterns is not None
+        queue: dict[int, int] = {}
+        for node in marked:
+            for pattern_index, position in self._stop_patterns[node]:
+                if position < queue.get(pattern_index, INFINITY):
+                    queue[pattern_index] = position
+        improved = set()
+        for pattern_index, start in queue.items():
+            for node, label in self._scan_pattern(
+                search, pattern_index, start, previous, slack
+            ):
+                current[node] = search.best[node]
+                labels[node] = label
+                improved.add(node)
+        return improved
+
+    def _scan_pattern(
+        self,
+        search: _Search,
+        pattern_index: int,
+        start: int,
+        previous: list[int],
+        slack: int,
+    ) -> Iterator[tuple[int, RideLabel]]:
+        """
+        Ride a pattern from a position and yield the nodes it improved with labels.
+
+        The best arrival at each node is updated before it is yielded.
+        """
+        pattern = self.patterns[pattern_index]
+        columns, best = pattern.columns, search.best
+        trip = board = -1
+        for position in range(start, len(pattern.stops)):
+            node = pattern.stops[position]
+            if trip >= 0 and columns[position][trip] < min(best[node], search.arrival):
+                best[node] = columns[position][trip]
+                yield node, (pattern_index, trip, board, position)
+            # Board an earlier trip if one can be caught, or the same trip if this
+            # stop was reached earlier than where it was boarded, so that journeys
+            # don't walk along the trip's route to board it
+            if (ready := previous[node] + slack) < INFINITY and (
+                trip < 0 or ready < columns[position][trip]
+            ):
+                if (next_trip := bisect_left(columns[position], ready)) < len(
+                    pattern.trip_ids
+                ) and (
+                    trip < 0
+                    or next_trip < trip
+                    or previous[node] < previous[pattern.stops[board]]
+                ):
+                    trip, board = next_trip, position
+
+    def _get_legs(self, search: _Search, round_: int, node: int) -> list[Leg]:
+        """Get the legs of the journey that reaches a node as of a round."""
+        legs: list[Leg] = []
+        while (round_label := search.get_label(round_, node)) is not None:
+            round_, label = round_label
+            if len(label) == 2:
+                from_node, seconds = cast(WalkLabel, label)
+                departure = search.get_arrival(self.patterns, round_, from_node)
+                legs.append(
+                    Leg(
+                        "walk",
+                        None,
+                        None,
+                        self._node_ids[from_node],
+                        self._node_ids[node],
+                        _from_epoch(departure),
+                        _from_epoch(departure + seconds),
+                    )
+                )
+                node = from_node
+                continue
+            pattern_index, trip, board, alight = cast(RideLabel, label)
+            pattern = self.patterns[pattern_index]
+            legs.append(
+                Leg(
+                    pattern.mode,
+                    pattern.route_ids[trip],
+                    pattern.trip_ids[trip],
+                    self._node_ids[pattern.stops[board]],
+                    self._node_ids[node],
+                    _from_epoch(pattern.columns[board][trip]),
+                    _from_epoch(pattern.columns[alight][trip]),
+                )
+            )
+            node = pattern.stops[board]
+            round_ -= 1
+        legs.reverse()
+        return legs
+
+    def _plan(
+        self,
+        sources: dict[int, int],
+        targets: dict[int, int],
+        start: tuple[str, int] | None = None,
+        end_id: str | None = None,
+    ) -> list[Journey]:
+        """
+        Plan journeys from sources to targets.
+
+        If a start ID and departure time are provided, journeys start by walking
+        from it to a source, and if an end ID is provided, they end by walking from
+        a target to it.
+        """
+        search = self._search(sources, targets)
+        journeys = []
+        for round_, node, arrival in search.results:
+            if not (legs := self._get_legs(search, round_, node)):
+                # The destination is reached from a source without riding or
+                # walking between stops, so the journey is a single walk
+                legs = [
+                    Leg(
+                        "walk",
+                        None,
+                        None,
+                        self._node_ids[node] if start is None else start[0],
+                        self._node_ids[node] if end_id is None else end_id,
+                        _from_epoch(sources[node] if start is None else start[1]),
+                        _from_epoch(arrival),
+                    )
+                ]
+                journeys.append(Journey(legs))
+                continue
+            if start is not None and (
+                seconds := sources[self._node_indexes[legs[0].from_id]] - start[1]
+            ):
+                legs.insert(
+                    0,
+                    Leg(
+                        "walk",
+                        None,
+                        None,
+                        start[0],
+                        legs[0].from_id,
+                        _from_epoch(start[1]),
+                        _from_epoch(start[1] + seconds),
+                    ),
+                )
+            if end_id is not None and (seconds := targets[node]):
+                legs.append(
+                    Leg(
+                        "walk",
+                        None,
+                        None,
+                        self._node_ids[node],
+                        end_id,
+                        _from_epoch(arrival - seconds),
+                        _from_epoch(arrival),
+                    )
+                )
+            journeys.append(Journey(legs))
+        return journeys
+
+    def plan(
+        self,
+        origin: Stop | Station,
+        destination: Stop | Station,
+        departure: datetime,
+    ) -> list[Journey]:
+        """
+        Plan journeys between two stops or stations, departing at or after a time.
+
+        Returns the earliest arrival journey for each number of transfers, as long
+        as it arrives earlier than the journeys with fewer transfers.
+        """
+        origin_id, destination_id = (
+            location.stop_id if isinstance(location, Stop) else location.station_code
+            for location in (origin, destination)
+        )
+        origin_node = self._node_indexes.get(origin_id)
+        destination_node = self._node_indexes.get(destination_id)
+        if origin_node is None or destination_node is None:
+            return []
+        return self._plan({origin_node: to_epoch(departure)}, {destination_node: 0})
+
+    def plan_between_coordinates(
+        self,
+        start: Coordinates,
+        end: Coordinates,
+        departure: datetime,
+        max_walking_distance: float | None = None,
+    ) -> list[Journey]:
+        """
+        Plan journeys between coordinates, departing at or after a time.
+
+        Journeys start and end by walking to and from the stops and stations within
+        `max_walking_distance` miles, which defaults to the transfer distance. The
+        first and last legs use `start` and `end` as their IDs.
+        """
+        self.build()
+        distance = max_walking_distance or self.transfer_distance
+        departure_epoch = to_epoch(departure)
+        sources = {
+            node: departure_epoch + seconds
+            for node, seconds in self._get_nearby(
+                start.latitude, start.longitude, distance
+            )
+        }
+        targets = dict(self._get_nearby(end.latitude, end.longitude, distance))
+        if not sources or not targets:
+            return []
+        return self._plan(sources, targets, ("start", departure_epoch), "end")
+
+
+# Label of how a node was reached in a round: by riding a pattern's trip between two
+# positions of the pattern, by walking from another node, or from a source
+RideLabel = tuple[int, int, int, int]
+WalkLabel = tuple[int, int]
+Label = RideLabel | WalkLabel
+
+
+def _from_epoch(epoch: int) -> datetime:
+    """Convert epoch seconds to a datetime in the WMATA timezone."""
+    return datetime.fromtimestamp(epoch, TZ)
+
+
+@dataclass
+class _Search:
+    """Labels, best arrivals and results of a search."""
+
+    sources: dict[int, int]
+    labels: list[dict[int, Label | None]]
+    arrival: int = INFINITY
+    results: list[tuple[int, int, int]] = field(default_factory=list)
+    best: list[int] = field(default_factory=list)
+
+    def add_round(
+        self, round_: int, arrivals: list[int], targets: dict[int, int]
+    ) -> None:
+        """Record the earliest arrival at the destination if a round improved it."""
+        for node, seconds in targets.items():
+            if (arrival := arrivals[node] + seconds) < self.arrival:
+                self.arrival = arrival
+                if self.results and self.results[-1][0] == round_:
+                    self.results.pop()
+                self.results.append((round_, node, arrival))
+
+    def get_label(self, round_: int, node: int) -> tuple[int, Label] | None:
+        """Get the label of a node from the last round up to a round that reached it."""
+        while node not in self.labels[round_]:
+            round_ -= 1
+        if (label := self.labels[round_][node]) is None:
+            return None
+        return round_, label
+
+    def get_arrival(self, patterns: list[Pattern], round_: int, node: int) -> int:
+        """Get the arrival time at a node as of a round."""
+        if (round_label := self.get_label(round_, node)) is None:
+            return self.sources[node]
+        round_, label = round_label
+        if len(label) == 2:
+            from_node, seconds = cast(WalkLabel, label)
+            return self.get_arrival(patterns, round_, from_node) + seconds
+        pattern_index, trip, _, alight = cast(RideLabel, label)
+        return patterns[pattern_index].columns[alight][trip]
@@ -2,17 +2,34 @@
 from __future__ import annotations
 
 import asyncio
+import copy
+import time
 from collections import defaultdict
-from typing import TYPE_CHECKING, cast
+from functools import partial
+from typing import TYPE_CHECKING, Any, AsyncIterator, Mapping, cast
 
-from ..helpers import get_stop_or_station_pairs_closest_to_coordinates
+from ..const import DEFAULT_INCIDENTS_POLL_INTERVAL, DEFAULT_POSITIONS_POLL_INTERVAL
+from ..helpers import (
+    get_delta,
+    get_stop_or_station_pairs_closest_to_coordinates,
+    update_models,
+)
+from ..incidents import IncidentFeed
+from ..load import LoadPlan, LoadReport
 from ..models.coordinates import Coordinates
-from .const import RailEndpoint
-from .models.elevator_and_escalator_incident import ElevatorAndEscalatorIncident
+from ..models.delta import Delta
+from ..shared import RAIL_LINES_TABLE, RAIL_STATIONS_TABLE, SharedDataset, SharedModels
+from .const import DEFAULT_NEXT_TRAINS_MAX_AGE, RailEndpoint
+from .models.circuit_position import CircuitPosition
+from .models.dataset import RailDataset
+from .models.elevator_and_escalator_incident import (
+    ElevatorAndEscalatorIncident,
+    ElevatorAndEscalatorIncidentData,
+)
 from .models.line import Line
-from .models.live_position import LiveTrainPosition
-from .models.next_train import NextTrain
-from .models.rail_incident import RailIncident
+from .models.live_position import LiveTrainPosition, LiveTrainPositionData
+from .models.next_train import NextTrain, NextTrainsBoard, NextTrainsData
+from .models.rail_incident import RailIncident, RailIncidentData
 from .models.standard_route import StandardRoute
 from .models.station import Station
 from .models.station_entrance import StationEntrance
@@ -29,19 +46,151 @@ class MetroRail:
     """Class to represent client for MetroRail APIs."""
 
     client: "Client"
-    lines: dict[str, Line]
-    stations: dict[str, Station]
+    dataset: RailDataset
 
     def __init__(self, client: "Client") -> None:
         """Initialize."""
         self.client = client
-        self.lines = {}
-        self.stations = {}
+        self.dataset = RailDataset(0, {}, {}, {})
+        self._next_trains_board: NextTrainsBoard | None = None
+        self._next_trains_board_lock = asyncio.Lock()
 
-    async def load_data(self) -> None:
+    @property
+    def lines(self) -> Mapping[str, Line]:
+        """Return the lines of the current dataset."""
+        return self.dataset.lines
+
+    @property
+    def stations(self) -> Mapping[str, Station]:
+        """Return the stations of the current dataset."""
+        return self.dataset.stations
+
+    @property
+    def circuit_positions(self) -> dict[int, dict[str, CircuitPosition]]:
+        """Return the circuit positions of the current dataset."""
+        return self.dataset.circuit_positions
+
+    def snapshot(self) -> MetroRail:
+        """
+        Return a view of the API that is pinned to the current dataset.
+
+        Loading data swaps in a new dataset without affecting existing snapshots, so
+        long running queries can use a snapshot to keep a consistent view.
+        """
+        return copy.copy(self)
+
+    async def load_data(self) -> LoadReport:
         """Load the base data."""
-        self.lines = await self.get_all_lines()
-        self.stations = await self.get_stations()
+        plan = LoadPlan()
+        self.add_load_stages(plan)
+        return await plan.run()
+
+    def add_load_stages(self, plan: LoadPlan) -> None:
+        """Add the stages that load the base data to a load plan."""
+        for name, enum_, params in (
+            ("standard_routes", RailEndpoint.STANDARD_ROUTES, {"contentType": "json"}),
+            ("lines", RailEndpoint.LINES, None),
+            ("station_parking", RailEndpoint.STATION_PARKING_INFORMATION, None),
+            ("station_entrances", RailEndpoint.STATION_ENTRANCES, None),
+            ("station_timings", RailEndpoint.STATION_TIMINGS, None),
+            ("stations", RailEndpoint.STATIONS, None),
+        ):
+            plan.add_fetch(
+                f"rail.fetch.{name}", partial(self.client.fetch, enum_, params)
+            )
+        # Models are built against a snapshot that is only pinned to the new dataset
+        # once it is complete, so they never see a mix of old and new data
+        view = self.snapshot()
+        plan.add_build(
+            "rail.lines",
+            ["rail.fetch.standard_routes", "rail.fetch.lines"],
+            view.build_lines,
+        )
+        plan.add_build(
+            "rail.stations",
+            [
+                "rail.fetch.station_parking",
+                "rail.fetch.station_entrances",
+                "rail.fetch.station_timings",
+                "rail.fetch.stations",
+            ],
+            view.build_stations,
+        )
+        plan.add_build(
+            "rail.circuit_positions", ["rail.lines"], self.get_circuit_positions
+        )
+        plan.add_build(
+            "rail.dataset",
+            ["rail.lines", "rail.stations", "rail.circuit_positions"],
+            partial(self._swap_dataset, view),
+        )
+
+    def _swap_dataset(
+        self,
+        view: MetroRail,
+        lines: dict[str, Line],
+        stations: dict[str, Station],
+        circuit_positions: dict[int, dict[str, CircuitPosition]],
+    ) -> RailDataset:
+        """Swap in a new dataset."""
+        dataset = RailDataset(
+            self.dataset.version + 1, lines, stations, circuit_positions
+        )
+        view.dataset = self.dataset = dataset
+        return dataset
+
+    def attach_shared_dataset(self, shared: SharedDataset) -> RailDataset:
+        """Swap in a dataset that was published by another process."""
+        view = self.snapshot()
+        # There are only a handful of lines and every one of them is needed to index
+        # circuit positions, so they are built up front
+        lines = {
+            line_code: Line(
+                view,
+                record["line"],
+                [StandardRoute(view, data) for data in record["standard_routes"]],
+            )
+            for line_code, record in shared.tables[RAIL_LINES_TABLE].items()
+        }
+        dataset = RailDataset(
+            shared.rail_version,
+            lines,
+            SharedModels(
+                shared.tables[RAIL_STATIONS_TABLE], view.get_station_from_record
+            ),
+            self.get_circuit_positions(lines),
+            shared.published_at,
+        )
+        view.dataset = self.dataset = dataset
+        return dataset
+
+    def get_station_from_record(self, record: dict[str, Any]) -> Station:
+        """Get a station from its record in a shared dataset."""
+        return Station(
+            self,
+            record["station"],
+            StationParking(self, record["parking"]) if record["parking"] else None,
+            [StationEntrance(self, data) for data in record["entrances"]],
+            [StationTime(self, data) for data in record["station_times"]],
+        )
+
+    @staticmethod
+    def get_circuit_positions(
+        lines: Mapping[str, Line]
+    ) -> dict[int, dict[str, CircuitPosition]]:
+        """
+        Get an index of circuit positions keyed by circuit ID and then line code.
+
+        A circuit that is shared by multiple lines has one position per line.
+        """
+        circuit_positions: dict[int, dict[str, CircuitPosition]] = {}
+        for line in lines.values():
+            for standard_route in line.standard_routes:
+                for circuit_position in standard_route.get_circuit_positions():
+                    circuit_positions.setdefault(circuit_position.circuit_id, {})[
+                        line.line_code
+                    ] = circuit_position
+        return circuit_positions
 
     async def get_all_lines(self) -> dict[str, Line]:
         """Get all lines."""
@@ -51,6 +200,31 @@ class MetroRail:
             ),
             self.client.fetch(RailEndpoint.LINES),
         )
+        lines = await self.build_lines(standard_routes_data, lines_data)
+        identities = self.client.identities
+        return {
+            line_code: identities.get_canonical(line, line_code, self.lines)
+            for line_code, line in lines.items()
+        }
+
+    async def build_lines(
+        self, standard_routes_data: dict, lines_data: dict
+    ) -> dict[str, Line]:
+        """Build all lines, in the client's offloader if the payload is large."""
+        return await self.client.build(
+            self.get_lines_from_data,
+            standard_routes_data,
+            lines_data,
+            items=sum(
+                len(standard_route["TrackCircuits"])
+                for standard_route in standard_routes_data["StandardRoutes"]
+            ),
+        )
+
+    def get_lines_from_data(
+        self, standard_routes_data: dict, lines_data: dict
+    ) -> dict[str, Line]:
+        """Get all lines from standard routes and lines data."""
         standard_routes = defaultdict(list)
         for standard_route_data in standard_routes_data["StandardRoutes"]:
             standard_route = StandardRoute(self, standard_route_data)
@@ -98,7 +272,48 @@ class MetroRail:
             self.client.fetch(RailEndpoint.STATION_TIMINGS),
             self.client.fetch(RailEndpoint.STATIONS, params=params),
         )
+        stations = await self.build_stations(
+            station_parking_data, entrances_data, stations_times_data, stations_data
+        )
+        identities = self.client.identities
+        return {
+            station_code: identities.get_canonical(station, station_code, self.stations)
+            for station_code, station in stations.items()
+        }
+
+    async def build_stations(
+        self,
+        station_parking_data: dict,
+        entrances_data: dict,
+        stations_times_data: dict,
+        stations_data: dict,
+    ) -> dict[str, Station]:
+        """Build all stations, in the client's offloader if the payload is large."""
+        return await self.client.build(
+            self.get_stations_from_data,
+            station_parking_data,
+            entrances_data,
+            stations_times_data,
+            stations_data,
+            # Each station time holds the first and last trains of every day
+            items=len(entrances_data["Entrances"])
+            + sum(
+                len(day_data["FirstTrains"]) + len(day_data["LastTrains"])
+                for station_time_data in stations_times_data["StationTimes"]
+                for day_data in station_time_data.values()
+                if isinstance(day_data, dict)
+            )
+            + len(stations_data["Stations"]),
+        )
 
+    def get_stations_from_data(
+        self,
+        station_parking_data: dict,
+        entrances_data: dict,
+        stations_times_data: dict,
+        stations_data: dict,
+    ) -> dict[str, Station]:
+        """Get all stations from station data."""
         station_parking = {
             station_parking["Code"]: StationParking(self, station_parking)
             for station_parking in station_parking_data["StationsParking"]
@@ -170,20 +385,98 @@ class MetroRail:
             key=lambda incident: incident.date_updated,
         )
 
+    def watch_elevator_escalator_incidents(
+        self,
+        station: Station | None = None,
+        interval: float = DEFAULT_INCIDENTS_POLL_INTERVAL,
+    ) -> IncidentFeed[ElevatorAndEscalatorIncident]:
+        """
+        Poll elevator and escalator incidents and yield the ones that changed.
+
+        Incidents are keyed by unit name. The returned feed's `index` maps station
+        codes to the open incidents at that station.
+        """
+        params = {}
+        if station:
+            params["StationCode"] = station.station_code
+
+        async def fetch_incidents() -> list[ElevatorAndEscalatorIncidentData]:
+            data = await self.client.fetch(
+                RailEndpoint.ELEVATOR_ESCALATOR_INCIDENTS, params=params
+            )
+            return cast(
+                list[ElevatorAndEscalatorIncidentData], data["ElevatorIncidents"]
+            )
+
+        return IncidentFeed(
+            fetch_incidents,
+            "UnitName",
+            lambda incident_data: ElevatorAndEscalatorIncident(self, incident_data),
+            lambda incident: [incident.station_code],
+            interval,
+        )
+
+    def watch_rail_incidents(
+        self, interval: float = DEFAULT_INCIDENTS_POLL_INTERVAL
+    ) -> IncidentFeed[RailIncident]:
+        """
+        Poll rail incidents and yield created, updated and resolved incidents.
+
+        The returned feed's `index` maps line codes to the open incidents affecting
+        them.
+        """
+
+        async def fetch_incidents() -> list[RailIncidentData]:
+            data = await self.client.fetch(RailEndpoint.RAIL_INCIDENTS)
+            return cast(list[RailIncidentData], data["Incidents"])
+
+        return IncidentFeed(
+            fetch_incidents,
+            "IncidentID",
+            lambda incident_data: RailIncident(self, incident_data),
+            lambda incident: incident.line_codes_affected,
+            interval,
+        )
+
+    async def get_next_trains_board(
+        self, max_age: float = DEFAULT_NEXT_TRAINS_MAX_AGE, in_place: bool = False
+    ) -> NextTrainsBoard:
+        """
+        Return next trains at every station.
+
+        The board is fetched with a single request and reused until it is older than
+        `max_age` seconds. Concurrent callers share the same request. When
+        `in_place` is set, an expired board and its trains are updated in place
+        instead of being built again.
+        """
+        async with self._next_trains_board_lock:
+            board = self._next_trains_board
+            if board is None or time.monotonic() - board.fetched_at >= max_age:
+                data = cast(
+                    NextTrainsData,
+                    await self.client.fetch(
+                        RailEndpoint.NEXT_TRAINS, additional_path="All"
+                    ),
+                )
+                if board is not None and in_place:
+                    board.update(data, time.monotonic())
+                else:
+                    board = self._next_trains_board = NextTrainsBoard(
+                        self, data, time.monotonic()
+                    )
+        return board
+
     async def get_next_trains_at_station(
-        self, stations: Station | list[Station]
+        self, stations: Station | list[Station], max_age: float | None = None
     ) -> list[NextTrain]:
-        """Return next trains for given station(s)."""
-
-        def key_func(train: NextTrain) -> int:
-            if not train.minutes:
-                return -3
-            if train.minutes == "BRD":
-                return -2
-            if train.minutes == "ARR":
-                return -1
-            assert isinstance(train.minutes, int)
-            return train.minutes
+        """
+        Return next trains for given station(s).
+
+        If `max_age` is provided, next trains are served from the network wide board
+        as long as it is no older than `max_age` seconds.
+        """
+        if max_age is not None:
+            return (await self.get_next_trains_board(max_age)).get(stations)
 
         if not isinstance(stations, list):
             stations = [stations]
@@ -193,24 +486,96 @@ class MetroRail:
         )
         return sorted(
             [NextTrain(self, next_train_data) for next_train_data in data["Trains"]],
-            key=key_func,
+            key=lambda train: train.sort_key,
         )
 
-    async def get_live_positions(self) -> dict[str, LiveTrainPosition]:
-        """Get live train positions."""
+    async def get_live_positions(
+        self, previous: Mapping[str, LiveTrainPosition] | None = None
+    ) -> dict[str, LiveTrainPosition]:
+        """
+        Get live train positions.
+
+        Positions in `previous`, keyed by train ID, are updated in place for trains
+        that are still reported instead of being built again.
+        """
         data = await self.client.fetch(
             RailEndpoint.TRAIN_POSITIONS, params={"contentType": "json"}
         )
-        return {
-            train_position["TrainId"]: LiveTrainPosition(self, train_position)
-            for train_position in data["TrainPositions"]
-        }
+        return update_models(
+            previous,
+            cast(list[LiveTrainPositionData], data["TrainPositions"]),
+            lambda train_position: train_position["TrainId"],
+            partial(LiveTrainPosition, self),
+        )
+
+    def watch_positions(
+        self,
+        interval: float = DEFAULT_POSITIONS_POLL_INTERVAL,
+        shared: bool = False,
+        in_place: bool = False,
+    ) -> AsyncIterator[Delta[LiveTrainPosition]]:
+        """
+        Poll live train positions and yield the changes keyed by train ID.
+
+        The first delta contains every train as added. After that, a delta is only
+        yielded when a train was added, moved to another circuit or removed.
+
+        When `shared` is set, watchers with the same interval share one poller on
+        the client's hub, and a watcher that joins late starts from the next delta.
+
+        When `in_place` is set, the positions of trains that are still reported are
+        updated in place on every poll and their `changed` fields flag what changed,
+        so positions from earlier deltas should not be kept as snapshots.
+        """
+        if shared:
+            return self.client.hub.subscribe_source(
+                ("watch_positions", RailEndpoint.TRAIN_POSITIONS, interval, in_place),
+                lambda: self._watch_positions(interval, in_place),
+            )
+        return self._watch_positions(interval, in_place)
+
+    async def _watch_positions(
+        self, interval: float, in_place: bool
+    ) -> AsyncIterator[Delta[LiveTrainPosition]]:
+        """Poll live train positions and yield the changes."""
+        previous: dict[str, LiveTrainPosition] = {}
+        first = True
+        while True:
+            current = (
+                await self.get_live_positions(previous)
+                if in_place
+                else await self.get_live_positions()
+            )
+            delta = get_delta(
+                previous,
+                current,
+                # Positions updated in place flag whether they moved
+                (lambda _, new: "circuit_id" in new.changed)
+                if in_place
+                else (lambda old, new: old.circuit_id != new.circuit_id),
+            )
+            previous = current
+            if delta or first:
+                first = False
+                yield delta
+            await asyncio.sleep(interval)
 
     async def get_track_circuits(self) -> dict[int, TrackCircuit]:
         """Get track circuits."""
         track_circuits_data = await self.client.fetch(
             RailEndpoint.TRACK_CIRCUITS, params={"contentType": "json"}
         )
+        return await self.client.build(
+            self.get_track_circuits_from_data,
+            track_circuits_data,
+            items=len(track_circuits_data["TrackCircuits"]),
+        )
+
+    @staticmethod
+    def get_track_circuits_from_data(
+        track_circuits_data: dict,
+    ) -> dict[int, TrackCircuit]:
+        """Get track circuits from track circuits data."""
         track_circuits: dict[int, TrackCircuit] = {}
         for track_circuit in track_circuits_data["TrackCircuits"]:
             track_circuits[track_circuit["CircuitId"]] = TrackCircuit(
@@ -27,3 +27,17 @@ class RailEndpoint(Enum):
     STATIONS = f"{BASE_WMATA_URL}/Rail.svc/json/jStations"
     TRACK_CIRCUITS = f"{BASE_WMATA_URL}/TrainPositions/TrackCircuits"
     TRAIN_POSITIONS = f"{BASE_WMATA_URL}/TrainPositions/TrainPositions"
+
+
+# Initial estimate of the time a train spends on a track circuit before any travel
+# times have been learned from live positions.
+DEFAULT_SECONDS_PER_CIRCUIT = 12.0
+# Weight given to each new observation when learning circuit travel times.
+DEFAULT_ETA_SMOOTHING = 0.2
+# Seconds between generated trains on each line when planning journeys, and the
+# hours of service used for stations without station timings.
+DEFAULT_RAIL_HEADWAY = 8 * 60
+DEFAULT_RAIL_SERVICE_HOURS = (5, 24)
+
+# WMATA refreshes next train predictions roughly every 20 seconds
+DEFAULT_NEXT_TRAINS_MAX_AGE = 20
@@ -0,0 +1,334 @@
+"""Estimate train arrivals at every station from live train positions."""
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from .const import DEFAULT_ETA_SMOOTHING, DEFAULT_SECONDS_PER_CIRCUIT
+from .models.live_position import LiveTrainPosition, TrainDirection
+from .models.next_train import NextTrain
+
+if TYPE_CHECKING:
+    from . import MetroRail
+    from .models.circuit_position import CircuitPosition
+
+RouteKey = tuple[str, int]
+
+
+@dataclass
+class EtaAccuracy:
+    """Accuracy of estimated next trains compared to WMATA predictions."""
+
+    compared: int
+    unmatched: int
+    mean_absolute_error: float | None
+    within_one_minute: float | None
+
+
+def _minutes_as_number(next_train: NextTrain) -> int | None:
+    """Return the minutes until a next train arrives as a number."""
+    if next_train.minutes in ("ARR", "BRD"):
+        return 0
+    if isinstance(next_train.minutes, int):
+        return next_train.minutes
+    return None
+
+
+class TrainEtaEngine:
+    """
+    Estimate next trains for every station from a single live positions poll.
+
+    Trains are walked forward along the standard route of the circuit they are on,
+    in the direction they are travelling, until they reach their destination. The
+    time spent on each circuit starts at `default_seconds_per_circuit` and is
+    learned from how long trains take to move between circuits across polls.
+    """
+
+    rail: "MetroRail"
+    default_seconds_per_circuit: float
+    smoothing: float
+    circuit_seconds: dict[tuple[str, int, int], float]
+
+    def __init__(
+        self,
+        rail: "MetroRail",
+        default_seconds_per_circuit: float = DEFAULT_SECONDS_PER_CIRCUIT,
+        smoothing: float = DEFAULT_ETA_SMOOTHING,
+    ) -> None:
+        """Initialize."""
+        self.rail = rail
+        self.default_seconds_per_circuit = default_seconds_per_circuit
+        self.smoothing = smoothing
+        self.circuit_seconds = {}
+        self._routes: dict[RouteKey, list["CircuitPosition"]] = {}
+        self._route_indexes: dict[RouteKey, dict[int, int]] = {}
+        self._station_indexes: dict[RouteKey, list[int]] = {}
+        self._last_seen: dict[str, tuple[RouteKey, int, float]] = {}
+
+    def _load_routes(self) -> None:
+        """Load circuits for every standard route in sequence order."""
+        if self._routes:
+            return
+        routes: defaultdict[RouteKey, list["CircuitPosition"]] = defaultdict(list)
+        for circuit_positions in self.rail.circuit_positions.values():
+            for circuit_position in circuit_positions.values():
+                routes[
+                    (circuit_position.line_code, circuit_position.track_number)
+                ].append(circuit_position)
+        for route_key, route in routes.items():
+            route.sort(key=lambda circuit_position: circuit_position.sequence_number)
+            self._routes[route_key] = route
+            self._route_indexes[route_key] = {
+                circuit_position.circuit_id: index
+                for index, circuit_position in enumerate(route)
+            }
+            self._station_indexes[route_key] = [
+                index
+                for index, circuit_position in enumerate(route)
+                if circuit_position.at_station
+            ]
+
+    def _get_circuit_seconds(
+        self, route_key: RouteKey, circuit_position: "CircuitPosition"
+    ) -> float:
+        """Get the time a train is expected to spend on a circuit."""
+        return self.circuit_seconds.get(
+            (*route_key, circuit_position.circuit_id), self.default_seconds_per_circuit
+        )
+
+    def _locate(self, train: LiveTrainPosition) -> tuple[RouteKey, int, int] | None:
+        """Get the route, circuit index and direction of travel for a train."""
+        if not (circuit_position := train.circuit_position):
+            return None
+        route_key = (circuit_position.line_code, circuit_position.track_number)
+        step = 1 if train.direction == TrainDirection.NORTHBOUND_OR_EASTBOUND else -1
+        return route_key, self._route_indexes[route_key][train.circuit_id], step
+
+    async def update(self) -> dict[str, list[NextTrain]]:
+        """
+        Poll live train positions once and estimate next trains at every station.
+
+        Returns a dict of next trains keyed by station code.
+        """
+        if not self.rail.circuit_positions:
+            await self.rail.load_data()
+        positions = await self.rail.get_live_positions()
+        self.learn(positions)
+        return self.estimate(positions)
+
+    def learn(
+        self, positions: dict[str, LiveTrainPosition], now: float | None = None
+    ) -> None:
+        """Learn circuit travel times from trains that moved since the last poll."""
+        self._load_routes()
+        if now is None:
+            now = time.monotonic()
+
+        last_seen: dict[str, tuple[RouteKey, int, float]] = {}
+        for train_id, train in positions.items():
+            if not (location := self._locate(train)):
+                continue
+            route_key, index, step = location
+            entered_at = now - train.seconds_at_location
+            last_seen[train_id] = (route_key, index, entered_at)
+
+            if (previous := self._last_seen.get(train_id)) is not None:
+                self._learn_move(previous, last_seen[train_id], step)
+
+        self._last_seen = last_seen
+
+    def _learn_move(
+        self,
+        previous: tuple[RouteKey, int, float],
+        current: tuple[RouteKey, int, float],
+        step: int,
+    ) -> None:
+        """Learn from a train seen on two circuits, if it moved forward between them."""
+        previous_route_key, previous_index, previous_entered_at = previous
+        route_key, index, entered_at = current
+        if (
+            previous_route_key == route_key
+            and (index - previous_index) * step > 0
+            and (elapsed := entered_at - previous_entered_at) > 0
+        ):
+            self._learn_traversal(
+                route_key, range(previous_index, index, step), elapsed
+            )
+
+    def _learn_traversal(
+        self, route_key: RouteKey, indexes: range, elapsed: float
+    ) -> None:
+        """
+        Learn from the time a train took to traverse circuits of a route.
+
+        The observed time is spread across the circuits that were traversed in
+        proportion to the current estimates.
+        """
+        route = self._routes[route_key]
+        traversed = [route[index] for index in indexes]
+        estimates = [
+            self._get_circuit_seconds(route_key, circuit_position)
+            for circuit_position in traversed
+        ]
+        total = sum(estimates)
+        for circuit_position, estimate in zip(traversed, estimates):
+            observed = elapsed * estimate / total
+            self.circuit_seconds[
+                (*route_key, circuit_position.circuit_id)
+            ] = estimate + self.smoothing * (observed - estimate)
+
+    def estimate(
+        self, positions: dict[str, LiveTrainPosition]
+    ) -> dict[str, list[NextTrain]]:
+        """Estimate next trains at every station, keyed by station code."""
+        self._load_routes()
+        cumulative_seconds: dict[RouteKey, list[float]] = {}
+        next_trains: defaultdict[str, list[NextTrain]] = defaultdict(list)
+
+        for train in positions.values():
+            if (
+                not train.line_code
+                or not train.destination_station_code
+                or not (location := self._locate(train))
+            ):
+                continue
+            route_key = location[0]
+            if route_key not in cumulative_seconds:
+                cumulative_seconds[route_key] = list(
+                    accumulate(
+                        (
+                            self._get_circuit_seconds(route_key, circuit_position)
+                            for circuit_position in self._routes[route_key]
+                        ),
+                        initial=0.0,
+                    )
+                )
+            for next_train in self._estimate_train(
+                train, location, cumulative_seconds[route_key]
+            ):
+                next_trains[next_train.location_code].append(next_train)
+
+        return {
+            station_code: sorted(trains, key=lambda train: train.sort_key)
+            for station_code, trains in next_trains.items()
+        }
+
+    def _get_stations_ahead(
+        self, route_key: RouteKey, index: int, step: int
+    ) -> Iterator[tuple[int, "CircuitPosition"]]:
+        """Get the station circuits from a circuit onwards, in travel order."""
+        route = self._routes[route_key]
+        station_indexes = self._station_indexes[route_key]
+        for station_index in station_indexes if step > 0 else station_indexes[::-1]:
+            if (station_index - index) * step >= 0:
+                yield station_index, route[station_index]
+
+    def _estimate_train(
+        self,
+        train: LiveTrainPosition,
+        location: tuple[RouteKey, int, int],
+        seconds: list[float],
+    ) -> Iterator[NextTrain]:
+        """
+        Estimate when a train reaches each station before its destination.
+
+        `seconds` holds the cumulative seconds to the start of each circuit of the
+        train's route.
+        """
+        route_key, index, step = location
+        seconds_on_circuit = min(
+            train.seconds_at_location, seconds[index + 1] - seconds[index]
+        )
+        assert train.destination_station_code
+        destination = self.rail.stations[train.destination_station_code]
+        # Stations that span two platforms, like Metro Center, have a code per
+        # platform, and the train may reach its destination at either of them
+        destination_codes = {
+            code
+            for code in (
+                destination.station_code,
+                destination.station_together_code_1,
+                destination.station_together_code_2,
+            )
+            if code
+        }
+
+        for station_index, circuit_position in self._get_stations_ahead(
+            route_key, index, step
+        ):
+            if circuit_position.previous_station_code in destination_codes:
+                break
+            minutes: int | str = "BRD"
+            if station_index != index:
+                if step > 0:
+                    travel = seconds[station_index] - seconds[index]
+                else:
+                    travel = seconds[index + 1] - seconds[station_index + 1]
+                minutes = round(max(travel - seconds_on_circuit, 0) / 60) or "ARR"
+
+            station = circuit_position.previous_station
+            assert station
+            yield NextTrain(
+                self.rail,
+                {
+                    "Car": train.car_count or None,
+                    "Destination": destination.name,
+                    "DestinationCode": destination.station_code,
+                    "DestinationName": destination.name,
+                    "Group": str(circuit_position.track_number),
+                    "Line": train.line_code,
+                    "LocationCode": station.station_code,
+                    "LocationName": station.name,
+                    "Min": minutes,
+                },
+            )
+
+    @staticmethod
+    def compare(
+        estimates: dict[str, list[NextTrain]], predictions: Iterable[NextTrain]
+    ) -> EtaAccuracy:
+        """
+        Compare estimated next trains to WMATA predictions.
+
+        Estimates and predictions are matched in arrival order for each station, line
+        and destination. Errors are measured in minutes.
+        """
+        predicted: defaultdict[tuple, list[int]] = defaultdict(list)
+        for next_train in predictions:
+            if (minutes := _minutes_as_number(next_train)) is not None:
+                predicted[
+                    (
+                        next_train.location_code,
+                        next_train.line_code,
+                        next_train.destination_station_code,
+                    )
+                ].append(minutes)
+
+        errors: list[int] = []
+        unmatched = 0
+        for key, predicted_minutes in predicted.items():
+            estimated_minutes = sorted(
+                minutes
+                for next_train in estimates.get(key[0], [])
+                if (next_train.line_code, next_train.destination_station_code)
+                == key[1:]
+                and (minutes := _minutes_as_number(next_train)) is not None
+            )
+            predicted_minutes.sort()
+            errors.extend(
+                abs(estimate - prediction)
+                for estimate, prediction in zip(estimated_minutes, predicted_minutes)
+            )
+            unmatched += max(len(predicted_minutes) - len(estimated_minutes), 0)
+
+        if not errors:
+            return EtaAccuracy(0, unmatched, None, None)
+        return EtaAccuracy(
+            len(errors),
+            unmatched,
+            sum(errors) / len(errors),
+            sum(1 for error in errors if error <= 1) / len(errors),
+        )
@@ -0,0 +1,69 @@
+"""Circuit position models for MetroRail WMATA API."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from .line import Line
+    from .standard_route import StandardRoute
+    from .station import Station
+
+
+@dataclass
+class CircuitPosition:
+    """
+    Position of a track circuit along a standard route.
+
+    Previous and next stations are relative to the sequence order of the standard
+    route, not to the direction of travel of a train on the circuit. When the circuit
+    is at a station, both the previous and the next station are that station.
+    """
+
+    standard_route: "StandardRoute" = field(repr=False)
+    circuit_id: int
+    sequence_number: int
+    previous_station_code: str | None
+    next_station_code: str | None
+    fraction: float | None
+
+    def __hash__(self) -> int:
+        """Return the hash."""
+        return hash((self.circuit_id, self.standard_route))
+
+    @property
+    def line_code(self) -> str:
+        """Return the line code."""
+        return self.standard_route.line_code
+
+    @property
+    def track_number(self) -> Literal[1, 2]:
+        """Return the track number."""
+        return self.standard_route.track_number
+
+    @property
+    def line(self) -> "Line":
+        """Return the line."""
+        return self.standard_route.line
+
+    @property
+    def previous_station(self) -> "Station" | None:
+        """Return the previous station."""
+        if not self.previous_station_code:
+            return None
+        return self.standard_route.rail.stations[self.previous_station_code]
+
+    @property
+    def next_station(self) -> "Station" | None:
+        """Return the next station."""
+        if not self.next_station_code:
+            return None
+        return self.standard_route.rail.stations[self.next_station_code]
+
+    @property
+    def at_station(self) -> bool:
+        """Return whether the circuit is at a station."""
+        return (
+            self.previous_station_code is not None
+            and self.previous_station_code == self.next_station_code
+        )
@@ -0,0 +1,34 @@
+"""Dataset models for MetroRail WMATA API."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Mapping
+
+from ...const import TZ
+
+if TYPE_CHECKING:
+    from .circuit_position import CircuitPosition
+    from .line import Line
+    from .station import Station
+
+
+@dataclass(frozen=True)
+class RailDataset:
+    """
+    Immutable version of the MetroRail base data.
+
+    A dataset is swapped in as a whole when it is loaded, so its lines, stations and
+    circuit positions are always consistent with each other. The mappings are shared
+    with every reader and must not be mutated.
+    """
+
+    version: int
+    lines: Mapping[str, "Line"] = field(repr=False)
+    stations: Mapping[str, "Station"] = field(repr=False)
+    circuit_positions: dict[int, dict[str, "CircuitPosition"]] = field(repr=False)
+    loaded_at: datetime = field(default_factory=lambda: datetime.now(TZ))
+
+    def __hash__(self) -> int:
+        """Return the hash."""
+        return hash(self.version)
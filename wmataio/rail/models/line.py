@@ -40,6 +40,12 @@ class Line:
         """Return the hash."""
         return hash(self.line_code)
 
+    def __eq__(self, other: object) -> bool:
+        """Return whether the other object is the same line."""
+        if not isinstance(other, Line):
+            return NotImplemented
+        return self.line_code == other.line_code
+
     def __post_init__(self) -> None:
         """Post init."""
         self.id = self.line_code = self.data["LineCode"]
@@ -3,10 +3,13 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from enum import IntEnum
-from typing import TYPE_CHECKING, Literal, TypedDict
+from typing import TYPE_CHECKING, Container, Literal, TypedDict
+
+from ...helpers import get_changed_keys
 
 if TYPE_CHECKING:
     from .. import MetroRail
+    from .circuit_position import CircuitPosition
     from .line import Line
     from .station import Station
 
@@ -50,18 +53,56 @@ class LiveTrainPosition:
     train_id: str = field(init=False, repr=False)
     id: str = field(init=False)
     train_number: str = field(init=False)
+    changed: frozenset[str] = field(init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         """Post init."""
-        self.car_count = self.data["CarCount"]
-        self.circuit_id = self.data["CircuitId"]
-        self.destination_station_code = self.data["DestinationStationCode"]
-        self.direction = TrainDirection(self.data["DirectionNum"])
-        self.line_code = self.data["LineCode"]
-        self.seconds_at_location = self.data["SecondsAtLocation"]
-        self.service_type = self.data["ServiceType"]
-        self.train_id = self.data["TrainId"]
-        self.train_number = self.data["TrainNumber"]
+        self.changed = frozenset(self._parse(self.data.keys()))
+
+    def _parse(self, keys: Container[str]) -> set[str]:
+        """Parse the fields that depend on any of the keys and return their names."""
+        fields = set()
+        if "CarCount" in keys:
+            self.car_count = self.data["CarCount"]
+            fields.add("car_count")
+        if "CircuitId" in keys:
+            self.circuit_id = self.data["CircuitId"]
+            fields.add("circuit_id")
+        if "DestinationStationCode" in keys:
+            self.destination_station_code = self.data["DestinationStationCode"]
+            fields.add("destination_station_code")
+        if "DirectionNum" in keys:
+            self.direction = TrainDirection(self.data["DirectionNum"])
+            fields.add("direction")
+        if "LineCode" in keys:
+            self.line_code = self.data["LineCode"]
+            fields.add("line_code")
+        if "SecondsAtLocation" in keys:
+            self.seconds_at_location = self.data["SecondsAtLocation"]
+            fields.add("seconds_at_location")
+        if "ServiceType" in keys:
+            self.service_type = self.data["ServiceType"]
+            fields.add("service_type")
+        if "TrainId" in keys:
+            self.id = self.train_id = self.data["TrainId"]
+            fields.add("train_id")
+        if "TrainNumber" in keys:
+            self.train_number = self.data["TrainNumber"]
+            fields.add("train_number")
+        return fields
+
+    def update(self, data: LiveTrainPositionData) -> frozenset[str]:
+        """
+        Update the position in place from newer data for the same train.
+
+        Only fields whose data changed are parsed again. The names of those fields
+        are returned and kept in `changed` until the next update. Fields whose keys
+        are missing from the newer data keep their values.
+        """
+        keys = get_changed_keys(self.data, data)
+        self.data = data
+        self.changed = frozenset(self._parse(keys))
+        return self.changed
 
     def __hash__(self) -> int:
         """Return the hash."""
@@ -82,3 +123,22 @@ class LiveTrainPosition:
         if not self.line_code:
             return None
         return self.rail.lines[self.line_code]
+
+    @property
+    def circuit_positions(self) -> dict[str, "CircuitPosition"]:
+        """Return the positions of the circuit on every line, keyed by line code."""
+        return self.rail.circuit_positions.get(self.circuit_id, {})
+
+    @property
+    def circuit_position(self) -> "CircuitPosition" | None:
+        """
+        Return the position of the circuit.
+
+        The position on the train's line is preferred. If the train has no line or
+        is running off of its line, the first known position is returned.
+        """
+        if not (circuit_positions := self.circuit_positions):
+            return None
+        if self.line_code and self.line_code in circuit_positions:
+            return circuit_positions[self.line_code]
+        return next(iter(circuit_positions.values()))
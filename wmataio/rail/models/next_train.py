@@ -1,9 +1,12 @@
 """NextTrain models for MetroRail WMATA API."""
 from __future__ import annotations
 
+from collections import defaultdict, deque
 from contextlib import suppress
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, TypedDict
+from typing import TYPE_CHECKING, Container, TypedDict
+
+from ...helpers import get_changed_keys
 
 if TYPE_CHECKING:
     from .. import MetroRail
@@ -25,6 +28,29 @@ class NextTrainData(TypedDict):
     Min: int | str | None
 
 
+def _parse_num_cars(car: int | str | None) -> int | None:
+    """Parse the number of cars of a train, which is unknown if it isn't a number."""
+    if isinstance(car, int) and car != 0:
+        return car
+    return None
+
+
+def _parse_line_code(line_code: str | None) -> str | None:
+    """Parse the line code of a train, which is "No" for trains without a line."""
+    if line_code in (None, "No"):
+        return None
+    return line_code
+
+
+def _parse_minutes(minutes: int | str | None) -> int | str | None:
+    """Parse the minutes until a train arrives, keeping codes like ARR and BRD."""
+    if minutes in ("-", "---") or minutes is None:
+        return None
+    with suppress(ValueError):
+        return int(minutes)
+    return minutes
+
+
 @dataclass
 class NextTrain:
     """NextTrain."""
@@ -40,34 +66,73 @@ class NextTrain:
     location_code: str = field(init=False)
     location_name: str = field(init=False)
     minutes: int | str | None = field(init=False)
+    changed: frozenset[str] = field(init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         """Post init."""
-        if isinstance((car := self.data["Car"]), int) and car != 0:
-            self.num_cars = int(car)
-        else:
-            self.num_cars = None
-        self.destination = self.data["Destination"]
-        self.destination_station_code = self.data["DestinationCode"]
-        self.destination_station_name = self.data["DestinationName"]
-        self.group = int(self.data["Group"])
-        if (line_code := self.data["Line"]) in (None, "No"):
-            self.line_code = None
-        else:
-            self.line_code = line_code
-        self.location_code = self.data["LocationCode"]
-        self.location_name = self.data["LocationName"]
-        if (minutes := self.data["Min"]) in ("-", "---") or minutes is None:
-            self.minutes = None
-        else:
-            self.minutes = minutes
-            with suppress(ValueError):
-                self.minutes = int(minutes)
+        self.changed = frozenset(self._parse(self.data.keys()))
+
+    def _parse(self, keys: Container[str]) -> set[str]:
+        """Parse the fields that depend on any of the keys and return their names."""
+        fields = set()
+        if "Car" in keys:
+            self.num_cars = _parse_num_cars(self.data["Car"])
+            fields.add("num_cars")
+        if "Destination" in keys:
+            self.destination = self.data["Destination"]
+            fields.add("destination")
+        if "DestinationCode" in keys:
+            self.destination_station_code = self.data["DestinationCode"]
+            fields.add("destination_station_code")
+        if "DestinationName" in keys:
+            self.destination_station_name = self.data["DestinationName"]
+            fields.add("destination_station_name")
+        if "Group" in keys:
+            self.group = int(self.data["Group"])
+            fields.add("group")
+        if "Line" in keys:
+            self.line_code = _parse_line_code(self.data["Line"])
+            fields.add("line_code")
+        if "LocationCode" in keys:
+            self.location_code = self.data["LocationCode"]
+            fields.add("location_code")
+        if "LocationName" in keys:
+            self.location_name = self.data["LocationName"]
+            fields.add("location_name")
+        if "Min" in keys:
+            self.minutes = _parse_minutes(self.data["Min"])
+            fields.add("minutes")
+        return fields
+
+    def update(self, data: NextTrainData) -> frozenset[str]:
+        """
+        Update the prediction in place from newer data for the same train.
+
+        Only fields whose data changed are parsed again. The names of those fields
+        are returned and kept in `changed` until the next update. Fields whose keys
+        are missing from the newer data keep their values.
+        """
+        keys = get_changed_keys(self.data, data)
+        self.data = data
+        self.changed = frozenset(self._parse(keys))
+        return self.changed
 
     def __hash__(self) -> int:
         """Return the hash."""
         return hash((self.location, self.destination_station, self.line))
 
+    @property
+    def sort_key(self) -> int:
+        """Return a key to sort trains by arrival, boarding trains first."""
+        if not self.minutes:
+            return -3
+        if self.minutes == "BRD":
+            return -2
+        if self.minutes == "ARR":
+            return -1
+        assert isinstance(self.minutes, int)
+        return self.minutes
+
     @property
     def destination_station(self) -> "Station" | None:
         """Return the destination Station."""
@@ -86,3 +151,120 @@ class NextTrain:
     def location(self) -> "Station":
         """Return the location Station."""
         return self.rail.stations[self.location_code]
+
+
+def get_next_train_key(
+    data: NextTrainData,
+) -> tuple[str, str, str | None, str | None]:
+    """Get the location, group, line and destination of a next train prediction."""
+    return data["LocationCode"], data["Group"], data["Line"], data["DestinationCode"]
+
+
+class NextTrainsData(TypedDict):
+    """NextTrains data for MetroRail WMATA API."""
+
+    Trains: list[NextTrainData]
+
+
+@dataclass
+class NextTrainsBoard:
+    """Next trains at every station, indexed by location, line and destination."""
+
+    rail: "MetroRail" = field(repr=False)
+    data: NextTrainsData = field(repr=False)
+    fetched_at: float
+    next_trains: list[NextTrain] = field(init=False, repr=False)
+    by_location_code: dict[str, list[NextTrain]] = field(init=False, repr=False)
+    by_line_code: dict[str | None, list[NextTrain]] = field(init=False, repr=False)
+    by_destination_code: dict[str | None, list[NextTrain]] = field(
+        init=False, repr=False
+    )
+
+    def __post_init__(self) -> None:
+        """Post init."""
+        self.next_trains = sorted(
+            [
+                NextTrain(self.rail, next_train_data)
+                for next_train_data in self.data["Trains"]
+            ],
+            key=lambda train: train.sort_key,
+        )
+        self._index()
+
+    def _index(self) -> None:
+        """Index the next trains by location, line and destination."""
+        by_location_code = defaultdict(list)
+        by_line_code = defaultdict(list)
+        by_destination_code = defaultdict(list)
+        for next_train in self.next_trains:
+            by_location_code[next_train.location_code].append(next_train)
+            by_line_code[next_train.line_code].append(next_train)
+            by_destination_code[next_train.destination_station_code].append(next_train)
+        self.by_location_code = dict(by_location_code)
+        self.by_line_code = dict(by_line_code)
+        self.by_destination_code = dict(by_destination_code)
+
+    def update(self, data: NextTrainsData, fetched_at: float) -> None:
+        """
+        Update the board in place from a newer fetch.
+
+        Next trains don't have an ID, so the trains at a location with the same
+        group, line and destination are matched to the new predictions in order of
+        arrival and updated in place. Trains are only built for new predictions.
+        """
+        previous: dict[
+            tuple[str, str, str | None, str | None], deque[NextTrain]
+        ] = defaultdict(deque)
+        for next_train in self.next_trains:
+            previous[get_next_train_key(next_train.data)].append(next_train)
+        next_trains = []
+        for next_train_data in data["Trains"]:
+            if trains := previous.get(get_next_train_key(next_train_data)):
+                next_train = trains.popleft()
+                next_train.update(next_train_data)
+            else:
+                next_train = NextTrain(self.rail, next_train_data)
+            next_trains.append(next_train)
+        self.data = data
+        self.fetched_at = fetched_at
+        self.next_trains = sorted(next_trains, key=lambda train: train.sort_key)
+        self._index()
+
+    def __hash__(self) -> int:
+        """Return the hash."""
+        return hash(self.fetched_at)
+
+    def get(
+        self,
+        stations: "Station" | list["Station"] | None = None,
+        line: "Line" | None = None,
+        destination: "Station" | None = None,
+    ) -> list[NextTrain]:
+        """Return next trains filtered by station(s), line and destination."""
+        next_trains: list[NextTrain]
+        if stations is not None:
+            if not isinstance(stations, list):
+                stations = [stations]
+            next_trains = [
+                next_train
+                for station in stations
+                for next_train in self.by_location_code.get(station.station_code, [])
+            ]
+            if len(stations) > 1:
+                next_trains.sort(key=lambda train: train.sort_key)
+        elif line is not None:
+            next_trains = self.by_line_code.get(line.line_code, [])
+        elif destination is not None:
+            next_trains = self.by_destination_code.get(destination.station_code, [])
+        else:
+            next_trains = self.next_trains
+
+        return [
+            next_train
+            for next_train in next_trains
+            if (line is None or next_train.line_code == line.line_code)
+            and (
+                destination is None
+                or next_train.destination_station_code == destination.station_code
+            )
+        ]
@@ -4,6 +4,8 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Literal, TypedDict
 
+from .circuit_position import CircuitPosition
+
 if TYPE_CHECKING:
     from .. import MetroRail
     from .line import Line
@@ -87,3 +89,47 @@ class StandardRoute:
     def line(self) -> "Line":
         """Return line for route."""
         return self.rail.lines[self.line_code]
+
+    def get_circuit_positions(self) -> list[CircuitPosition]:
+        """Get the position of every track circuit along the route."""
+        station_indexes = [
+            index
+            for index, track_circuit in enumerate(self.track_circuits)
+            if track_circuit.station_code
+        ]
+        positions: list[CircuitPosition] = []
+        previous: StandardRoutesTrackCircuit | None = None
+        next_pos = 0
+        for index, track_circuit in enumerate(self.track_circuits):
+            while (
+                next_pos < len(station_indexes) and station_indexes[next_pos] <= index
+            ):
+                previous = self.track_circuits[station_indexes[next_pos]]
+                next_pos += 1
+            if track_circuit.station_code:
+                next_ = track_circuit
+            elif next_pos < len(station_indexes):
+                next_ = self.track_circuits[station_indexes[next_pos]]
+            else:
+                next_ = None
+
+            fraction: float | None = None
+            if previous and next_:
+                if previous is next_:
+                    fraction = 0.0
+                else:
+                    fraction = (
+                        track_circuit.sequence_number - previous.sequence_number
+                    ) / (next_.sequence_number - previous.sequence_number)
+
+            positions.append(
+                CircuitPosition(
+                    self,
+                    track_circuit.circuit_id,
+                    track_circuit.sequence_number,
+                    previous.station_code if previous else None,
+                    next_.station_code if next_ else None,
+                    fraction,
+                )
+            )
+        return positions
@@ -52,6 +52,12 @@ class Station:
         """Return the hash."""
         return hash(self.station_code)
 
+    def __eq__(self, other: object) -> bool:
+        """Return whether the other object is the same station."""
+        if not isinstance(other, Station):
+            return NotImplemented
+        return self.station_code == other.station_code
+
     def __post_init__(self) -> None:
         """Post init."""
         self.address = Address(self.data["Address"])
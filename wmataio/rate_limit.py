@@ -0,0 +1,74 @@
+"""Rate limiting for WMATA API requests."""
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+from .const import TZ
+
+
+class RateLimiter:
+    """
+    Limit requests to a rate per second and track them against a daily quota.
+
+    The rate is enforced with a token bucket that holds up to one second of requests.
+    The daily quota is not enforced, but is tracked so callers can budget their
+    remaining requests. The quota resets at midnight in the WMATA timezone.
+    """
+
+    calls_per_second: float | None
+    daily_quota: int | None
+    requests_today: int
+
+    def __init__(self, calls_per_second: float | None, daily_quota: int | None) -> None:
+        """Initialize."""
+        self.calls_per_second = calls_per_second
+        self.daily_quota = daily_quota
+        self.requests_today = 0
+        self._day = datetime.now(TZ).date()
+        self._tokens = calls_per_second or 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _reset_day(self) -> date:
+        """Reset the request count if the day rolled over and return the day."""
+        if (today := datetime.now(TZ).date()) != self._day:
+            self._day = today
+            self.requests_today = 0
+        return today
+
+    @property
+    def remaining_today(self) -> int | None:
+        """Return the number of requests remaining in today's quota."""
+        self._reset_day()
+        if self.daily_quota is None:
+            return None
+        return max(self.daily_quota - self.requests_today, 0)
+
+    @property
+    def seconds_left_today(self) -> float:
+        """Return the number of seconds until the daily quota resets."""
+        now = datetime.now(TZ)
+        midnight = datetime.combine(
+            self._reset_day() + timedelta(days=1), datetime.min.time(), TZ
+        )
+        return (midnight - now).total_seconds()
+
+    async def acquire(self) -> None:
+        """Wait until a request can be made without exceeding the rate."""
+        if self.calls_per_second:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._tokens = min(
+                        self._tokens + (now - self._updated) * self.calls_per_second,
+                        max(self.calls_per_second, 1),
+                    )
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    await asyncio.sleep((1 - self._tokens) / self.calls_per_second)
+        self._reset_day()
+        self.requests_today += 1
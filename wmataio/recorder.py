@@ -0,0 +1,314 @@
+"""
+Record live bus and train positions into a compact append-only format.
+
+Each recording is a directory holding a table of interned strings and one file of
+fixed-width records per vehicle type. Record files start with a header holding the
+epoch second of their first poll, and every record stores its poll time as a signed
+delta from that epoch, so polls that are timestamped earlier can still be recorded.
+Reopening a recording appends to it, after dropping any string or record that was
+cut short when the previous recorder was interrupted. Readers memory map the record
+files, so scanning a recording does not load it into memory.
+"""
+from __future__ import annotations
+
+import logging
+import mmap
+import struct
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Iterable, Iterator, NamedTuple, Sequence
+
+from .const import TZ
+from .rail.models.live_position import TrainDirection
+
+if TYPE_CHECKING:
+    from .bus.models.live_position import LiveBusPosition
+    from .rail.models.live_position import LiveTrainPosition
+
+_LOGGER = logging.getLogger(__name__)
+
+STRINGS_FILE = "strings.txt"
+BUS_POSITIONS_FILE = "bus_positions.bin"
+TRAIN_POSITIONS_FILE = "train_positions.bin"
+
+HEADER = struct.Struct("<4sHxxq")
+MAGIC = b"WMTP"
+VERSION = 2
+NO_STRING = 0xFFFFFFFF
+# Range of the signed poll offset of a record
+MIN_OFFSET = -(1 << 31)
+MAX_OFFSET = (1 << 31) - 1
+
+# Poll offset, vehicle, route, trip, headsign, lat, lon, deviation, last update delta
+BUS_RECORD = struct.Struct("<iIIIIfffi")
+# Poll offset, train, train number, circuit, line, destination, direction, car count,
+# service type, seconds at location
+TRAIN_RECORD = struct.Struct("<iIIiIIBBBxi")
+SERVICE_TYPES = ["NoPassengers", "Normal", "Special", "Unknown"]
+
+
+class BusPositionRecord(NamedTuple):
+    """Recorded bus position."""
+
+    timestamp: datetime
+    vehicle_id: str
+    route_id: str
+    trip_id: str
+    trip_headsign: str
+    latitude: float
+    longitude: float
+    deviation: float
+    last_update: datetime
+
+
+class TrainPositionRecord(NamedTuple):
+    """Recorded train position."""
+
+    timestamp: datetime
+    train_id: str
+    train_number: str
+    circuit_id: int
+    line_code: str | None
+    destination_station_code: str | None
+    direction: TrainDirection
+    car_count: int
+    service_type: str
+    seconds_at_location: int
+
+
+def _to_epoch(timestamp: datetime | None) -> int:
+    """Convert a timestamp to epoch seconds, defaulting to now."""
+    return int((timestamp or datetime.now(TZ)).timestamp())
+
+
+@lru_cache(maxsize=1024)
+def _from_epoch(epoch: int) -> datetime:
+    """Convert epoch seconds to a timestamp, caching the timestamps of recent polls."""
+    return datetime.fromtimestamp(epoch, TZ)
+
+
+class PositionRecorder:
+    """Append polls of live positions to a recording directory."""
+
+    path: Path
+
+    def __init__(self, path: str | Path) -> None:
+        """Initialize."""
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._strings: dict[str, int] = {}
+        strings_path = self.path / STRINGS_FILE
+        if strings_path.exists():
+            with open(strings_path, "r+b") as fp:
+                content = fp.read()
+                if (end := content.rfind(b"\n") + 1) < len(content):
+                    _LOGGER.debug(
+                        "Dropping an incomplete string at the end of %s", strings_path
+                    )
+                    fp.truncate(end)
+            for index, string in enumerate(content[:end].decode("utf-8").splitlines()):
+                self._strings[string] = index
+        # Kept open until the recorder is closed
+        # pylint: disable-next=consider-using-with
+        self._strings_fp = open(strings_path, "a", encoding="utf-8")
+        self._files: dict[str, tuple[IO[bytes], int]] = {}
+
+    def __enter__(self) -> PositionRecorder:
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Exit the context manager."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the recording files."""
+        self._strings_fp.close()
+        for fp, _ in self._files.values():
+            fp.close()
+        self._files.clear()
+
+    def _intern(self, string: str | None) -> int:
+        """Return the index of a string, adding it to the string table if needed."""
+        if string is None:
+            return NO_STRING
+        if (index := self._strings.get(string)) is None:
+            index = self._strings[string] = len(self._strings)
+            self._strings_fp.write(f"{string}\n")
+        return index
+
+    def _get_file(
+        self, name: str, record: struct.Struct, epoch: int
+    ) -> tuple[IO[bytes], int]:
+        """Get a record file and its base epoch, creating it if needed."""
+        if name not in self._files:
+            path = self.path / name
+            if path.exists() and path.stat().st_size >= HEADER.size:
+                with open(path, "r+b") as existing_fp:
+                    magic, version, base_epoch = HEADER.unpack(
+                        existing_fp.read(HEADER.size)
+                    )
+                    if magic != MAGIC or version != VERSION:
+                        raise ValueError(f"`{path}` is not a position recording")
+                    size = path.stat().st_size
+                    if partial := (size - HEADER.size) % record.size:
+                        _LOGGER.debug(
+                            "Dropping an incomplete record at the end of %s", path
+                        )
+                        existing_fp.truncate(size - partial)
+                # Kept open until the recorder is closed
+                # pylint: disable-next=consider-using-with
+                self._files[name] = (open(path, "ab"), base_epoch)
+            else:
+                # pylint: disable-next=consider-using-with
+                fp = open(path, "wb")
+                fp.write(HEADER.pack(MAGIC, VERSION, epoch))
+                self._files[name] = (fp, epoch)
+        return self._files[name]
+
+    def _get_offset(self, name: str, record: struct.Struct, epoch: int) -> int:
+        """Get the offset of a poll from the base epoch of a record file."""
+        _, base_epoch = self._get_file(name, record, epoch)
+        if not MIN_OFFSET <= (offset := epoch - base_epoch) <= MAX_OFFSET:
+            raise ValueError(
+                f"Poll at epoch {epoch} is too far from the start of `{name}` at "
+                f"epoch {base_epoch}"
+            )
+        return offset
+
+    def _write(
+        self, name: str, record: struct.Struct, rows: Sequence[tuple[Any, ...]]
+    ) -> None:
+        """Write a poll's records to a record file."""
+        fp, _ = self._files[name]
+        buffer = bytearray(record.size * len(rows))
+        for index, row in enumerate(rows):
+            record.pack_into(buffer, index * record.size, *row)
+        self._strings_fp.flush()
+        fp.write(buffer)
+        fp.flush()
+
+    def record_bus_positions(
+        self,
+        positions: Iterable["LiveBusPosition"],
+        timestamp: datetime | None = None,
+    ) -> int:
+        """Record a poll of bus positions and return the number of records."""
+        epoch = _to_epoch(timestamp)
+        # Checked before interning so that a rejected poll adds no strings
+        offset = self._get_offset(BUS_POSITIONS_FILE, BUS_RECORD, epoch)
+        rows = [
+            (
+                offset,
+                self._intern(position.vehicle_id),
+                self._intern(position.route_id),
+                self._intern(position.trip_id),
+                self._intern(position.trip_headsign),
+                position.coordinates.latitude,
+                position.coordinates.longitude,
+                position.deviation,
+                int(position.last_update.timestamp()) - epoch,
+            )
+            for position in positions
+        ]
+        self._write(BUS_POSITIONS_FILE, BUS_RECORD, rows)
+        return len(rows)
+
+    def record_train_positions(
+        self,
+        positions: Iterable["LiveTrainPosition"],
+        timestamp: datetime | None = None,
+    ) -> int:
+        """Record a poll of train positions and return the number of records."""
+        epoch = _to_epoch(timestamp)
+        # Checked before interning so that a rejected poll adds no strings
+        offset = self._get_offset(TRAIN_POSITIONS_FILE, TRAIN_RECORD, epoch)
+        rows = [
+            (
+                offset,
+                self._intern(position.train_id),
+                self._intern(position.train_number),
+                position.circuit_id,
+                self._intern(position.line_code),
+                self._intern(position.destination_station_code),
+                position.direction,
+                position.car_count,
+                SERVICE_TYPES.index(position.service_type),
+                position.seconds_at_location,
+            )
+            for position in positions
+        ]
+        self._write(TRAIN_POSITIONS_FILE, TRAIN_RECORD, rows)
+        return len(rows)
+
+
+class PositionReader:
+    """Read live positions from a recording directory."""
+
+    path: Path
+    strings: list[str]
+
+    def __init__(self, path: str | Path) -> None:
+        """Initialize."""
+        self.path = Path(path)
+        with open(self.path / STRINGS_FILE, "r", encoding="utf-8") as fp:
+            self.strings = fp.read().splitlines()
+
+    def _string(self, index: int) -> str | None:
+        """Return the string for an index."""
+        return None if index == NO_STRING else self.strings[index]
+
+    def scan(self, name: str, record: struct.Struct) -> Iterator[tuple[Any, ...]]:
+        """
+        Scan the raw records of a record file.
+
+        Yields each record as a tuple of its packed fields with its poll offset
+        replaced by the poll's epoch second, without resolving strings.
+        """
+        path = self.path / name
+        if not path.exists() or path.stat().st_size <= HEADER.size:
+            return
+        with open(path, "rb") as fp, mmap.mmap(
+            fp.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped:
+            magic, version, base_epoch = HEADER.unpack_from(mapped)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"`{path}` is not a position recording")
+            end = HEADER.size + (len(mapped) - HEADER.size) // record.size * record.size
+            with memoryview(mapped) as view, view[HEADER.size : end] as records:
+                for row in record.iter_unpack(records):
+                    yield (base_epoch + row[0], *row[1:])
+
+    def bus_positions(self) -> Iterator[BusPositionRecord]:
+        """Read every recorded bus position in the order it was recorded."""
+        strings = self.strings
+        for row in self.scan(BUS_POSITIONS_FILE, BUS_RECORD):
+            yield BusPositionRecord(
+                _from_epoch(row[0]),
+                strings[row[1]],
+                strings[row[2]],
+                strings[row[3]],
+                strings[row[4]],
+                row[5],
+                row[6],
+                row[7],
+                _from_epoch(row[0] + row[8]),
+            )
+
+    def train_positions(self) -> Iterator[TrainPositionRecord]:
+        """Read every recorded train position in the order it was recorded."""
+        strings = self.strings
+        for row in self.scan(TRAIN_POSITIONS_FILE, TRAIN_RECORD):
+            yield TrainPositionRecord(
+                _from_epoch(row[0]),
+                strings[row[1]],
+                strings[row[2]],
+                row[3],
+                self._string(row[4]),
+                self._string(row[5]),
+                TrainDirection(row[6]),
+                row[7],
+                SERVICE_TYPES[row[8]],
+                row[9],
+            )
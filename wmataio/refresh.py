@@ -0,0 +1,78 @@
+"""Refresh static data in the background."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Awaitable, Callable
+
+from .exceptions import WMATAError
+from .load import LoadReport
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DatasetRefresher:
+    """
+    Reload static data on an interval.
+
+    Each refresh builds complete new datasets and swaps them in, so readers are never
+    affected by a refresh in progress. A failed refresh keeps the current datasets
+    and is retried at the next interval.
+    """
+
+    interval: float
+    refreshes: int
+    failures: int
+    last_report: LoadReport | None
+    last_error: BaseException | None
+
+    def __init__(
+        self, refresh_func: Callable[[], Awaitable[LoadReport]], interval: float
+    ) -> None:
+        """Initialize."""
+        self.interval = interval
+        self.refreshes = 0
+        self.failures = 0
+        self.last_report = None
+        self.last_error = None
+        self._refresh_func = refresh_func
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        """Return whether the refresher is running."""
+        return self._task is not None and not self._task.done()
+
+    async def refresh(self) -> LoadReport | None:
+        """Refresh now and return the load report, or None if the refresh failed."""
+        try:
+            report = await self._refresh_func()
+        except (Exception, WMATAError) as error:  # pylint: disable=broad-except
+            self.failures += 1
+            self.last_error = error
+            _LOGGER.warning("Refreshing static data failed: %s", error)
+            return None
+        self.refreshes += 1
+        self.last_report = report
+        _LOGGER.debug("Refreshed static data in %.2f seconds", report.elapsed)
+        return report
+
+    async def _run(self) -> None:
+        """Refresh on the interval until stopped."""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+    def start(self) -> None:
+        """Start refreshing in the background."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop refreshing."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
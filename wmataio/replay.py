@@ -0,0 +1,190 @@
+"""Record WMATA API responses and replay them through a Client."""
+from __future__ import annotations
+
+import json
+import time
+from bisect import bisect_right
+from pathlib import Path
+from typing import IO, Any, Awaitable, Callable, Iterable, TypedDict
+
+from .bus.const import BusEndpoint
+from .const import WMATAEndpoint
+from .exceptions import WMATAError
+from .rail.const import RailEndpoint
+
+
+class RecordedResponse(TypedDict):
+    """Recorded response to a WMATA API request."""
+
+    timestamp: float
+    endpoint: str
+    additional_path: str
+    params: dict[str, Any]
+    response: dict
+
+
+def get_request_key(
+    enum_: BusEndpoint | RailEndpoint | WMATAEndpoint | str,
+    params: dict[str, Any] | None = None,
+    additional_path: str | None = None,
+) -> tuple[str, str, str]:
+    """Get the key that identifies a request for recording and replay."""
+    endpoint = (
+        enum_ if isinstance(enum_, str) else f"{enum_.__class__.__name__}.{enum_.name}"
+    )
+    return endpoint, additional_path or "", json.dumps(params or {}, sort_keys=True)
+
+
+class ResponseRecorder:
+    """
+    Transport that records every response it fetches to a JSON lines file.
+
+    Typically wraps `Client.request` so that live responses are recorded as they are
+    fetched: `client.transport = ResponseRecorder(path, client.request)`. The recording
+    file is opened on the first response and stays open until the recorder is closed
+    or its context manager exits.
+    """
+
+    path: Path
+
+    def __init__(
+        self,
+        path: str | Path,
+        fetch_func: Callable[..., Awaitable[dict]],
+    ) -> None:
+        """Initialize."""
+        self.path = Path(path)
+        self._fetch_func = fetch_func
+        self._fp: IO[str] | None = None
+
+    async def fetch(
+        self,
+        enum_: BusEndpoint | RailEndpoint | WMATAEndpoint,
+        params: dict[str, Any] | None = None,
+        additional_path: str | None = None,
+    ) -> dict:
+        """Fetch data for a request and record the response."""
+        response = await self._fetch_func(enum_, params, additional_path)
+        endpoint, path, _ = get_request_key(enum_, params, additional_path)
+        record: RecordedResponse = {
+            "timestamp": time.time(),
+            "endpoint": endpoint,
+            "additional_path": path,
+            "params": params or {},
+            "response": response,
+        }
+        if self._fp is None:
+            # Kept open until the recorder is closed
+            # pylint: disable-next=consider-using-with
+            self._fp = open(self.path, "a", encoding="utf-8")
+        self._fp.write(json.dumps(record) + "\n")
+        self._fp.flush()
+        return response
+
+    def __enter__(self) -> ResponseRecorder:
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Exit the context manager."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the recording file."""
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+
+def read_recorded_responses(path: str | Path) -> list[RecordedResponse]:
+    """Read recorded responses from a JSON lines file."""
+    with open(path, "r", encoding="utf-8") as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+class ReplayTransport:
+    """
+    Transport that replays recorded responses in timestamp order.
+
+    Replay time starts at the earliest recorded timestamp on the first request and
+    advances `speedup` times faster than real time, and each request is served the
+    latest response recorded for it at the current replay time, or its first
+    response if it had not been recorded yet. Without a speedup, each repeated
+    request is instead served the next recorded response for it, so replay is only
+    limited by how fast responses are parsed. Once a request's recorded responses
+    run out, its last response keeps being served.
+
+    `clock` returns the real time in seconds that replay time advances with.
+    """
+
+    speedup: float | None
+    clock: Callable[[], float]
+    start: float | None
+    end: float | None
+
+    def __init__(
+        self,
+        responses: Iterable[RecordedResponse] | str | Path,
+        speedup: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize."""
+        if isinstance(responses, (str, Path)):
+            responses = read_recorded_responses(responses)
+        self.speedup = speedup
+        self.clock = clock
+        self._timestamps: dict[tuple[str, str, str], list[float]] = {}
+        self._responses: dict[tuple[str, str, str], list[dict]] = {}
+        for record in sorted(responses, key=lambda record: record["timestamp"]):
+            key = get_request_key(
+                record["endpoint"], record["params"], record["additional_path"]
+            )
+            self._timestamps.setdefault(key, []).append(record["timestamp"])
+            self._responses.setdefault(key, []).append(record["response"])
+        timestamps = [timestamp for ts in self._timestamps.values() for timestamp in ts]
+        self.start = min(timestamps, default=None)
+        self.end = max(timestamps, default=None)
+        self._positions: dict[tuple[str, str, str], int] = {}
+        self._started_at: float | None = None
+
+    @property
+    def now(self) -> float | None:
+        """Return the current replay time, or None if replay has not started."""
+        if self._started_at is None or self.start is None:
+            return None
+        if self.speedup is None:
+            return max(
+                self._timestamps[key][position - 1]
+                for key, position in self._positions.items()
+            )
+        return self.start + (self.clock() - self._started_at) * self.speedup
+
+    @property
+    def finished(self) -> bool:
+        """Return whether every recorded response has been replayed."""
+        if self.speedup is not None:
+            return (now := self.now) is not None and now >= (self.end or 0)
+        return all(
+            self._positions.get(key, 0) >= len(timestamps)
+            for key, timestamps in self._timestamps.items()
+        )
+
+    async def fetch(
+        self,
+        enum_: BusEndpoint | RailEndpoint | WMATAEndpoint,
+        params: dict[str, Any] | None = None,
+        additional_path: str | None = None,
+    ) -> dict:
+        """Fetch the recorded response for a request."""
+        key = get_request_key(enum_, params, additional_path)
+        if key not in self._responses:
+            raise WMATAError(f"No recorded response for {key}")
+        if self._started_at is None:
+            self._started_at = self.clock()
+        responses = self._responses[key]
+        if self.speedup is None:
+            position = min(self._positions.get(key, 0) + 1, len(responses))
+        else:
+            position = max(bisect_right(self._timestamps[key], self.now or 0), 1)
+        self._positions[key] = position
+        return responses[position - 1]
@@ -0,0 +1,220 @@
+"""Adaptive polling intervals for realtime endpoints."""
+from __future__ import annotations
+
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Hashable
+
+from .bus.const import BusEndpoint
+from .const import (
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_POSITIONS_POLL_INTERVAL,
+    TZ,
+    WMATAEndpoint,
+)
+from .rail.const import RailEndpoint
+
+if TYPE_CHECKING:
+    from .rate_limit import RateLimiter
+
+_LOGGER = logging.getLogger(__name__)
+
+# Key of the list of entities in each realtime response and the key of the ID of
+# each entity, if it has one
+REALTIME_ENTITIES: dict[BusEndpoint | RailEndpoint, tuple[str, str | None]] = {
+    BusEndpoint.BUS_INCIDENTS: ("BusIncidents", "IncidentID"),
+    BusEndpoint.NEXT_BUSES: ("Predictions", "TripID"),
+    BusEndpoint.POSITIONS: ("BusPositions", "VehicleID"),
+    RailEndpoint.ELEVATOR_ESCALATOR_INCIDENTS: ("ElevatorIncidents", "UnitName"),
+    RailEndpoint.NEXT_TRAINS: ("Trains", None),
+    RailEndpoint.RAIL_INCIDENTS: ("Incidents", "IncidentID"),
+    RailEndpoint.TRAIN_POSITIONS: ("TrainPositions", "TrainId"),
+}
+
+
+def get_change_fraction(
+    enum_: BusEndpoint | RailEndpoint | WMATAEndpoint,
+    previous: dict[str, Any],
+    current: dict[str, Any],
+) -> float:
+    """
+    Get the fraction of entities that changed between two responses.
+
+    Entities without an ID are compared by value, so a changed entity counts as one
+    removed and one added entity.
+    """
+    if enum_ not in REALTIME_ENTITIES:
+        return 0.0 if previous == current else 1.0
+    list_key, id_key = REALTIME_ENTITIES[enum_]  # type: ignore[index]
+    if id_key is None:
+        previous_entities = {
+            json.dumps(entity, sort_keys=True): entity
+            for entity in previous.get(list_key) or []
+        }
+        current_entities = {
+            json.dumps(entity, sort_keys=True): entity
+            for entity in current.get(list_key) or []
+        }
+    else:
+        previous_entities = {
+            entity[id_key]: entity for entity in previous.get(list_key) or []
+        }
+        current_entities = {
+            entity[id_key]: entity for entity in current.get(list_key) or []
+        }
+    if not (total := len(previous_entities.keys() | current_entities.keys())):
+        return 0.0
+    changed = sum(
+        1
+        for key in previous_entities.keys() | current_entities.keys()
+        if previous_entities.get(key) != current_entities.get(key)
+    )
+    return changed / total
+
+
+@dataclass
+class SchedulingDecision:
+    """Represent a decision on how long to wait before polling a feed again."""
+
+    key: Hashable = field(repr=False)
+    endpoint: str
+    interval: float | None
+    change_fraction: float | None
+    reason: str
+    timestamp: datetime = field(default_factory=lambda: datetime.now(TZ))
+
+
+class AdaptiveScheduler:
+    """
+    Choose polling intervals for realtime feeds.
+
+    Each feed's interval is narrowed when a large fraction of its entities changed in
+    recent polls and widened when few did, within `min_interval` and
+    `max_interval`. The combined rate of every active feed is then kept within the
+    rate limit and within what the remaining daily quota can sustain until it
+    resets, minus `quota_reserve` for other requests. Feeds without subscribers are
+    not polled.
+    """
+
+    rate_limiter: "RateLimiter"
+    min_interval: float
+    max_interval: float
+    narrow_above: float
+    widen_below: float
+    quota_reserve: float
+    decisions: deque[SchedulingDecision]
+    latest: dict[Hashable, SchedulingDecision]
+
+    def __init__(
+        self,
+        rate_limiter: "RateLimiter",
+        min_interval: float = DEFAULT_MIN_POLL_INTERVAL,
+        max_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+        narrow_above: float = 0.5,
+        widen_below: float = 0.1,
+        quota_reserve: float = 0.1,
+        history: int = 5,
+        max_decisions: int = 100,
+    ) -> None:
+        """Initialize."""
+        self.rate_limiter = rate_limiter
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.narrow_above = narrow_above
+        self.widen_below = widen_below
+        self.quota_reserve = quota_reserve
+        self.decisions = deque(maxlen=max_decisions)
+        self.latest = {}
+        self._history = history
+        self._change_fractions: dict[Hashable, deque[float]] = {}
+        self._intervals: dict[Hashable, float] = {}
+
+    def _decide(self, decision: SchedulingDecision) -> SchedulingDecision:
+        """Record a decision."""
+        self.decisions.append(decision)
+        self.latest[decision.key] = decision
+        _LOGGER.debug("Scheduling decision: %s", decision)
+        return decision
+
+    def record(
+        self,
+        key: Hashable,
+        enum_: BusEndpoint | RailEndpoint | WMATAEndpoint,
+        previous: dict[str, Any],
+        current: dict[str, Any],
+    ) -> None:
+        """Record the change between two consecutive responses of a feed."""
+        self._change_fractions.setdefault(key, deque(maxlen=self._history)).append(
+            get_change_fraction(enum_, previous, current)
+        )
+
+    def _get_budget_interval(self) -> tuple[float, str | None]:
+        """Get the shortest interval every active feed can poll at within budget."""
+        active_feeds = max(len(self._intervals), 1)
+        budget_interval = 0.0
+        reason = None
+        if calls_per_second := self.rate_limiter.calls_per_second:
+            budget_interval = active_feeds / (
+                calls_per_second * (1 - self.quota_reserve)
+            )
+            reason = "rate limit"
+        if (remaining := self.rate_limiter.remaining_today) is not None:
+            usable = remaining * (1 - self.quota_reserve)
+            if usable <= 0:
+                return self.rate_limiter.seconds_left_today, "daily quota exhausted"
+            quota_interval = (
+                active_feeds * self.rate_limiter.seconds_left_today / usable
+            )
+            if quota_interval > budget_interval:
+                budget_interval = quota_interval
+                reason = "daily quota"
+        return budget_interval, reason
+
+    def schedule(
+        self,
+        key: Hashable,
+        enum_: BusEndpoint | RailEndpoint | WMATAEndpoint,
+        subscribers: int,
+    ) -> SchedulingDecision:
+        """Decide how long to wait before polling a feed again."""
+        if not subscribers:
+            return self.remove(key, enum_)
+
+        interval = self._intervals.get(key, DEFAULT_POSITIONS_POLL_INTERVAL)
+        change_fraction = None
+        reason = "no change history"
+        if change_fractions := self._change_fractions.get(key):
+            change_fraction = sum(change_fractions) / len(change_fractions)
+            if change_fraction > self.narrow_above:
+                interval /= 2
+                reason = "high change rate"
+            elif change_fraction < self.widen_below:
+                interval *= 2
+                reason = "low change rate"
+            else:
+                reason = "steady change rate"
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        self._intervals[key] = interval
+
+        budget_interval, budget_reason = self._get_budget_interval()
+        if budget_interval > interval:
+            interval = budget_interval
+            reason = f"{reason}, limited by {budget_reason}"
+
+        return self._decide(
+            SchedulingDecision(key, enum_.name, interval, change_fraction, reason)
+        )
+
+    def remove(
+        self, key: Hashable, enum_: BusEndpoint | RailEndpoint | WMATAEndpoint
+    ) -> SchedulingDecision:
+        """Stop scheduling a feed that has no subscribers."""
+        self._intervals.pop(key, None)
+        self._change_fractions.pop(key, None)
+        return self._decide(
+            SchedulingDecision(key, enum_.name, None, None, "no subscribers")
+        )
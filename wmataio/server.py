@@ -0,0 +1,280 @@
+"""
+Local stand-in for the WMATA API.
+
+Serves recorded or generated payloads on the real WMATA URL paths so that a Client
+pointed at it with `base_url` goes through the full HTTP stack. Latency, rate
+limiting bursts, server errors and slow bodies can be injected to benchmark the
+client end to end without touching the live API.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Mapping
+
+from aiohttp import web
+
+from .bus.const import BusEndpoint
+from .const import BASE_WMATA_URL
+from .rail.const import RailEndpoint
+from .synthetic import SyntheticNetwork
+
+_LOGGER = logging.getLogger(__name__)
+
+# URL path of each endpoint mapped to the endpoint and the fixture directory its
+# payloads are stored in
+ENDPOINT_PATHS: dict[str, tuple[BusEndpoint | RailEndpoint, str]] = {
+    **{
+        enum_.value.removeprefix(BASE_WMATA_URL): (enum_, "bus")
+        for enum_ in BusEndpoint
+    },
+    **{
+        enum_.value.removeprefix(BASE_WMATA_URL): (enum_, "rail")
+        for enum_ in RailEndpoint
+    },
+}
+
+
+def get_fixture_name(
+    enum_: BusEndpoint | RailEndpoint,
+    params: Mapping[str, Any] | None = None,
+    additional_path: str | None = None,
+) -> str:
+    """Get the name of the fixture for a request, as used by the test fixtures."""
+    fixture_name = enum_.name.lower()
+    additional_path_fixture_name = (additional_path or "").replace("/", "_")
+    params_fixture_name = "_".join(f"{k}_{v}" for k, v in (params or {}).items())
+    if additional_path_fixture_name or params_fixture_name:
+        fixture_name = ".".join(
+            [fixture_name, additional_path_fixture_name, params_fixture_name]
+        )
+    return fixture_name
+
+
+@dataclass
+class Faults:
+    """
+    Faults to inject into stand-in server responses.
+
+    After every `rate_limit_every` requests, the next `rate_limit_burst` requests
+    are answered with a 429. Of the remaining requests, `error_rate` of them are
+    answered with a random 5xx error. Bodies are sent in chunks of
+    `slow_body_chunk_size` bytes with `slow_body_delay` seconds between chunks when
+    both are set.
+    """
+
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    rate_limit_every: int = 0
+    rate_limit_burst: int = 0
+    error_rate: float = 0.0
+    error_statuses: tuple[int, ...] = (500, 502, 503)
+    slow_body_chunk_size: int = 0
+    slow_body_delay: float = 0.0
+    seed: int | None = None
+
+
+@dataclass
+class ServerStats:
+    """Counts of the responses a stand-in server sent."""
+
+    requests: int = 0
+    succeeded: int = 0
+    not_found: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+    bytes_sent: int = 0
+
+
+@dataclass
+class StandInServer:
+    """
+    Stand-in WMATA API server.
+
+    `fixtures` is either a directory laid out like `test/fixtures/models` in the
+    source repository, or a mapping of `{api_type}/{fixture_name}` (for example
+    `bus/positions`) to payloads, such as a `SyntheticNetwork`.
+    """
+
+    fixtures: Path | str | Mapping[str, dict]
+    faults: Faults = field(default_factory=Faults)
+    host: str = "127.0.0.1"
+    port: int = 0
+    stats: ServerStats = field(init=False, default_factory=ServerStats)
+    app: web.Application = field(init=False)
+    _bodies: dict[str, bytes | None] = field(init=False, default_factory=dict)
+    _random: random.Random = field(init=False)
+    _runner: web.AppRunner | None = field(init=False, default=None)
+    _base_url: str | None = field(init=False, default=None)
+
+    def __post_init__(self) -> None:
+        """Post init."""
+        self._random = random.Random(self.faults.seed)
+        self.app = web.Application()
+        self.app.router.add_get("/{path:.*}", self._handle)
+
+    @property
+    def base_url(self) -> str:
+        """Return the base URL of the running server."""
+        if self._base_url is None:
+            raise RuntimeError("Server is not running")
+        return self._base_url
+
+    def _get_body(self, key: str) -> bytes | None:
+        """Get the encoded payload for a fixture key, or None if it doesn't exist."""
+        if key not in self._bodies:
+            if isinstance(self.fixtures, Mapping):
+                payload = self.fixtures.get(key)
+                self._bodies[key] = (
+                    None if payload is None else json.dumps(payload).encode()
+                )
+            elif (path := Path(self.fixtures) / f"{key}.json").exists():
+                self._bodies[key] = path.read_bytes()
+            else:
+                self._bodies[key] = None
+        return self._bodies[key]
+
+    def _get_fault_status(self) -> int | None:
+        """Get the status of the fault to inject into the current request, if any."""
+        faults = self.faults
+        if faults.rate_limit_every and faults.rate_limit_burst:
+            cycle = faults.rate_limit_every + faults.rate_limit_burst
+            if (self.stats.requests - 1) % cycle >= faults.rate_limit_every:
+                return 429
+        if faults.error_rate and self._random.random() < faults.error_rate:
+            return self._random.choice(faults.error_statuses)
+        return None
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        """Handle a request."""
+        self.stats.requests += 1
+        faults = self.faults
+        if latency := faults.latency + faults.latency_jitter * self._random.random():
+            await asyncio.sleep(latency)
+
+        if (status := self._get_fault_status()) is not None:
+            if status == 429:
+                self.stats.rate_limited += 1
+            else:
+                self.stats.errors += 1
+            return web.json_response({"message": "Injected fault"}, status=status)
+
+        path = f"/{request.match_info['path']}"
+        for endpoint_path, (enum_, api_type) in ENDPOINT_PATHS.items():
+            if path == endpoint_path or path.startswith(f"{endpoint_path}/"):
+                additional_path = path[len(endpoint_path) + 1 :]
+                key = f"{api_type}/{get_fixture_name(enum_, request.query, additional_path)}"
+                if (body := self._get_body(key)) is not None:
+                    break
+                _LOGGER.warning("No payload for %s", key)
+        else:
+            body = None
+        if body is None:
+            self.stats.not_found += 1
+            return web.json_response({"message": "Not found"}, status=404)
+
+        self.stats.succeeded += 1
+        self.stats.bytes_sent += len(body)
+        if not (faults.slow_body_chunk_size and faults.slow_body_delay):
+            return web.Response(body=body, content_type="application/json")
+
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        response.content_length = len(body)
+        await response.prepare(request)
+        for start in range(0, len(body), faults.slow_body_chunk_size):
+            await response.write(body[start : start + faults.slow_body_chunk_size])
+            await asyncio.sleep(faults.slow_body_delay)
+        await response.write_eof()
+        return response
+
+    async def start(self) -> str:
+        """Start the server and return its base URL."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self._base_url = f"http://{host}:{port}"
+        _LOGGER.info("Stand-in WMATA API running at %s", self._base_url)
+        return self._base_url
+
+    async def close(self) -> None:
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            self._base_url = None
+
+    async def __aenter__(self) -> StandInServer:
+        """Start the server."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        """Stop the server."""
+        await self.close()
+
+
+async def _serve(server: StandInServer) -> None:
+    """Run a server until cancelled."""
+    async with server:
+        await asyncio.Event().wait()
+
+
+def main() -> None:
+    """Run a stand-in server from the command line."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n", maxsplit=1)[0].strip()
+    )
+    # Fixtures aren't installed with the package, so a source must be chosen
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--fixtures",
+        type=Path,
+        help="Serve the fixtures in a directory, such as test/fixtures/models",
+    )
+    source.add_argument(
+        "--synthetic-scale",
+        type=float,
+        help="Serve a synthetic network of this scale instead of fixtures",
+    )
+    parser.add_argument("--synthetic-seed", type=int, default=0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--rate-limit-burst", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-body-chunk-size", type=int, default=0)
+    parser.add_argument("--slow-body-delay", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    faults = Faults(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        rate_limit_every=args.rate_limit_every,
+        rate_limit_burst=args.rate_limit_burst,
+        error_rate=args.error_rate,
+        slow_body_chunk_size=args.slow_body_chunk_size,
+        slow_body_delay=args.slow_body_delay,
+        seed=args.seed,
+    )
+    fixtures: Path | Mapping[str, dict] = args.fixtures
+    if args.synthetic_scale is not None:
+        fixtures = SyntheticNetwork(args.synthetic_scale, args.synthetic_seed)
+    server = StandInServer(fixtures, faults, args.host, args.port)
+    try:
+        asyncio.run(_serve(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Share static data between processes through a memory mapped file.
+
+One loader process publishes its bus and rail datasets into a single file, and
+worker processes attach to it read-only. Python objects can't live in shared memory,
+so the file holds the raw record of every route, stop, line and station in sorted
+key and offset columns. Workers look records up with a binary search over the
+mapped columns and only build the models they actually use, so the records are
+shared through the page cache instead of being copied into every worker. Publishing
+the file under `/dev/shm` keeps it in memory like `multiprocessing.shared_memory`.
+
+A new dataset is published by atomically replacing the file, so workers that are
+still attached to the old file keep a consistent view until they attach again.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import time
+import weakref
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Generic, Iterator, Mapping, TypeVar
+
+from .const import DEFAULT_SHARED_CACHE_SIZE, TZ
+
+if TYPE_CHECKING:
+    from .bus.models.dataset import BusDataset
+    from .rail.models.dataset import RailDataset
+
+T = TypeVar("T")
+
+BUS_ROUTES_TABLE = "bus.routes"
+BUS_STOPS_TABLE = "bus.stops"
+RAIL_LINES_TABLE = "rail.lines"
+RAIL_STATIONS_TABLE = "rail.stations"
+
+# Magic, format version, bus dataset version, rail dataset version, publish epoch,
+# index size
+HEADER = struct.Struct("<4sHxxqqqQ")
+MAGIC = b"WMSD"
+VERSION = 1
+OFFSET_TYPECODE = "Q"
+ALIGNMENT = 8
+
+
+def _pad(size: int) -> int:
+    """Return the padding needed to align a size."""
+    return -size % ALIGNMENT
+
+
+def _encode_table(records: Mapping[str, Any]) -> tuple[bytes, int]:
+    """
+    Encode records keyed by ID into a table and return it with its record count.
+
+    A table holds the key offsets, the record offsets, the keys and the records, with
+    keys sorted so that they can be binary searched.
+    """
+    keys = sorted(records)
+    encoded_keys = [key.encode() for key in keys]
+    encoded_records = [
+        json.dumps(records[key], separators=(",", ":")).encode() for key in keys
+    ]
+    key_offsets = array(OFFSET_TYPECODE, [0])
+    record_offsets = array(OFFSET_TYPECODE, [0])
+    for encoded_key, encoded_record in zip(encoded_keys, encoded_records):
+        key_offsets.append(key_offsets[-1] + len(encoded_key))
+        record_offsets.append(record_offsets[-1] + len(encoded_record))
+    table = b"".join(
+        [
+            key_offsets.tobytes(),
+            record_offsets.tobytes(),
+            *encoded_keys,
+            *encoded_records,
+        ]
+    )
+    return table + bytes(_pad(len(table))), len(keys)
+
+
+def publish_dataset(
+    path: str | Path, bus_dataset: "BusDataset", rail_dataset: "RailDataset"
+) -> int:
+    """Publish bus and rail datasets to a file and return the size of the file."""
+    path = Path(path)
+    tables: dict[str, Mapping[str, Any]] = {
+        BUS_ROUTES_TABLE: {
+            route_id: route.data for route_id, route in bus_dataset.routes.items()
+        },
+        BUS_STOPS_TABLE: {
+            stop_id: stop.data for stop_id, stop in bus_dataset.stops.items()
+        },
+        RAIL_LINES_TABLE: {
+            line_code: {
+                "line": line.data,
+                "standard_routes": [route.data for route in line.standard_routes],
+            }
+            for line_code, line in rail_dataset.lines.items()
+        },
+        RAIL_STATIONS_TABLE: {
+            station_code: {
+                "station": station.data,
+                "parking": station.parking.data if station.parking else None,
+                "entrances": [entrance.data for entrance in station.entrances],
+                "station_times": [
+                    station_time.data for station_time in station.station_times
+                ],
+            }
+            for station_code, station in rail_dataset.stations.items()
+        },
+    }
+
+    encoded_tables = {name: _encode_table(records) for name, records in tables.items()}
+    # Table offsets depend on the size of the index, so the index is encoded with
+    # fixed width offsets
+    index: dict[str, list[int]] = {name: [0, 0] for name in encoded_tables}
+    index_size = len(json.dumps(index).encode()) + 20 * len(index)
+    offset = HEADER.size + index_size + _pad(index_size)
+    for name, (table, count) in encoded_tables.items():
+        index[name] = [offset, count]
+        offset += len(table)
+    encoded_index = json.dumps(index).encode().ljust(index_size)
+
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "wb") as fp:
+        fp.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                bus_dataset.version,
+                rail_dataset.version,
+                int(time.time()),
+                index_size,
+            )
+        )
+        fp.write(encoded_index + bytes(_pad(index_size)))
+        for table, _ in encoded_tables.values():
+            fp.write(table)
+    os.replace(tmp_path, path)
+    return offset
+
+
+class SharedTable(Mapping[str, Any]):
+    """Read-only mapping of IDs to raw records in a table of a shared dataset."""
+
+    def __init__(self, buffer: memoryview, count: int) -> None:
+        """Initialize."""
+        offsets_size = (count + 1) * array(OFFSET_TYPECODE).itemsize
+        self._count = count
+        self._key_offsets = buffer[:offsets_size].cast(OFFSET_TYPECODE)
+        self._record_offsets = buffer[offsets_size : 2 * offsets_size].cast(
+            OFFSET_TYPECODE
+        )
+        keys_start = 2 * offsets_size
+        records_start = keys_start + self._key_offsets[count]
+        self._keys = buffer[keys_start:records_start]
+        self._records = buffer[
+            records_start : records_start + self._record_offsets[count]
+        ]
+        self._buffer = buffer
+
+    def release(self) -> None:
+        """Release the views of the table so that the mapped file can be closed."""
+        for view in (
+            self._key_offsets,
+            self._record_offsets,
+            self._keys,
+            self._records,
+            self._buffer,
+        ):
+            view.release()
+
+    def _get_key(self, index: int) -> str:
+        """Return the key at an index."""
+        return str(
+            self._keys[self._key_offsets[index] : self._key_offsets[index + 1]],
+            "utf-8",
+        )
+
+    def _get_index(self, key: str) -> int | None:
+        """Return the index of a key, or None if it isn't in the table."""
+        index = bisect_left(range(self._count), key, key=self._get_key)
+        if index < self._count and self._get_key(index) == key:
+            return index
+        return None
+
+    def __getitem__(self, key: str) -> Any:
+        """Return the record for a key."""
+        if (index := self._get_index(key)) is None:
+            raise KeyError(key)
+        return json.loads(
+            bytes(
+                self._records[
+                    self._record_offsets[index] : self._record_offsets[index + 1]
+                ]
+            )
+        )
+
+    def __contains__(self, key: object) -> bool:
+        """Return whether a key is in the table."""
+        return isinstance(key, str) and self._get_index(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys in sorted order."""
+        return (self._get_key(index) for index in range(self._count))
+
+    def __len__(self) -> int:
+        """Return the number of records."""
+        return self._count
+
+
+class SharedModels(Mapping[str, T], Generic[T]):
+    """
+    Read-only mapping of IDs to models that are built from a shared table on access.
+
+    The most recently used models are cached, and every other model that was built
+    is tracked for as long as it is referenced elsewhere. Every lookup of a key
+    returns the same instance while it is in use, but a worker that walks every
+    model only keeps `max_cached` of them alive.
+    """
+
+    def __init__(
+        self,
+        table: SharedTable,
+        factory: Callable[[Any], T],
+        max_cached: int = DEFAULT_SHARED_CACHE_SIZE,
+    ) -> None:
+        """Initialize."""
+        self.table = table
+        self._factory = factory
+        self._max_cached = max_cached
+        self._cache: OrderedDict[str, T] = OrderedDict()
+        self._models: weakref.WeakValueDictionary[
+            str, T
+        ] = weakref.WeakValueDictionary()
+
+    def __getitem__(self, key: str) -> T:
+        """Return the model for a key."""
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if (model := self._models.get(key)) is None:
+            model = self._models[key] = self._factory(self.table[key])
+        self._cache[key] = model
+        if len(self._cache) > self._max_cached:
+            self._cache.popitem(last=False)
+        return model
+
+    def __contains__(self, key: object) -> bool:
+        """Return whether a key is in the table."""
+        return key in self._cache or key in self.table
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys in sorted order."""
+        return iter(self.table)
+
+    def __len__(self) -> int:
+        """Return the number of models."""
+        return len(self.table)
+
+
+class SharedDataset:
+    """Bus and rail datasets published to a file, mapped read-only."""
+
+    path: Path
+    bus_version: int
+    rail_version: int
+    published_at: datetime
+    tables: dict[str, SharedTable]
+
+    def __init__(self, path: str | Path) -> None:
+        """Initialize."""
+        self.path = Path(path)
+        with open(self.path, "rb") as fp:
+            self._inode = os.fstat(fp.fileno()).st_ino
+            self._mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = self._buffer = memoryview(self._mapped)
+        (
+            magic,
+            version,
+            self.bus_version,
+            self.rail_version,
+            published_at,
+            index_size,
+        ) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            buffer.release()
+            self._mapped.close()
+            raise ValueError(f"`{self.path}` is not a shared dataset")
+        self.published_at = datetime.fromtimestamp(published_at, TZ)
+        index = json.loads(bytes(buffer[HEADER.size : HEADER.size + index_size]))
+        self.tables = {
+            name: SharedTable(buffer[offset:], count)
+            for name, (offset, count) in index.items()
+        }
+
+    @property
+    def stale(self) -> bool:
+        """Return whether a newer dataset has been published to the path."""
+        try:
+            return self.path.stat().st_ino != self._inode
+        except FileNotFoundError:
+            return False
+
+    def __enter__(self) -> SharedDataset:
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Exit the context manager."""
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        """Return whether the mapped file has been closed."""
+        return self._mapped.closed
+
+    def close(self) -> None:
+        """
+        Close the mapped file.
+
+        Models that were already built stay usable, but models that haven't been
+        built yet can no longer be looked up.
+        """
+        # mmap.closed is an attribute, which pylint takes for a method
+        if self._mapped.closed:  # pylint: disable=using-constant-test
+            return
+        for table in self.tables.values():
+            table.release()
+        self._buffer.release()
+        self._mapped.close()
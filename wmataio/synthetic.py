@@ -0,0 +1,505 @@
+"""
+Deterministic synthetic WMATA networks for scaling tests.
+
+A synthetic network is a mapping of fixture keys (for example `bus/stops` or
+`bus/route_path..RouteID_R12`), named the same way as `test/fixtures/models`, to
+WMATA API payloads, so it can be served by the stand-in server directly.
+
+Bus stops are laid out on a jittered grid and every bus route runs along a segment
+of a grid row or column, so most stops are served by two routes. Rail lines
+alternate between running east-west and north-south, and lines cross at shared
+transfer stations. At a scale of 1, a network is about the size of WMATA's: 10,000
+stops, 400 bus routes and 99 stations. Payloads are generated on demand, and route
+paths and schedules are generated independently of each other, so very large
+networks can be served without generating every schedule up front.
+"""
+from __future__ import annotations
+
+import json
+import math
+import random
+import re
+from datetime import date, datetime, timedelta
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Iterator, Mapping
+
+# Size of a network at a scale of 1
+BASE_STOPS = 10_000
+BASE_ROUTES = 400
+BASE_STATIONS = 98
+BASE_LINES = 6
+# Center and size in degrees of a network at a scale of 1
+CENTER = (38.9, -77.03)
+HEIGHT = 0.3
+WIDTH = 0.4
+# Track circuits between consecutive stations on a line
+CIRCUITS_BETWEEN_STATIONS = 9
+# Service hours of bus routes
+FIRST_TRIP_HOUR = 5
+LAST_TRIP_HOUR = 23
+HEADWAYS = (10, 12, 15, 20, 30)
+MINUTES_PER_STOP = (1.0, 1.5, 2.0)
+
+ROUTE_PATH_KEY = re.compile(r"^bus/route_path\.\.RouteID_([^_]+)(?:_Date_(.+))?$")
+ROUTE_SCHEDULE_KEY = re.compile(
+    r"^bus/route_schedule\.\.RouteID_([^_]+)_IncludingVariations_(?:true|false)"
+    r"(?:_Date_(.+))?$"
+)
+STATIONS_KEY = re.compile(r"^rail/stations\.\.LineCode_(.+)$")
+
+
+class SyntheticNetwork(Mapping[str, dict]):
+    """
+    Synthetic WMATA network.
+
+    Networks with the same scale and seed are identical. Iterating over a network
+    yields the key of every payload it generates without a date, but payloads for
+    any date can be looked up by key.
+    """
+
+    scale: float
+    seed: int
+    service_date: date
+
+    def __init__(
+        self, scale: float = 1, seed: int = 0, date_: date = date(2023, 3, 31)
+    ) -> None:
+        """Initialize."""
+        self.scale = scale
+        self.seed = seed
+        self.service_date = date_
+        self._grid_size = math.ceil(math.sqrt(BASE_STOPS * scale))
+        self._segments = math.ceil(BASE_ROUTES * scale / (2 * self._grid_size))
+        self._segment_length = math.ceil(self._grid_size / self._segments)
+        self._num_routes = min(
+            math.ceil(BASE_ROUTES * scale), 2 * self._grid_size * self._segments
+        )
+        self._lines_per_axis = max(math.ceil(BASE_LINES * math.sqrt(scale) / 2), 1)
+        self._stations_between_crossings = max(
+            round((BASE_STATIONS * scale / self._lines_per_axis**2 - 1) / 2), 0
+        )
+        self._stations_per_line = self._lines_per_axis * (
+            self._stations_between_crossings + 1
+        )
+        self._height = HEIGHT * math.sqrt(scale)
+        self._width = WIDTH * math.sqrt(scale)
+        self._south = CENTER[0] - self._height / 2
+        self._west = CENTER[1] - self._width / 2
+
+    def __repr__(self) -> str:
+        """Return the representation."""
+        return f"SyntheticNetwork(scale={self.scale}, seed={self.seed})"
+
+    # Bus network
+
+    @property
+    def route_ids(self) -> list[str]:
+        """Return the ID of every bus route."""
+        return [f"R{index}" for index in range(self._num_routes)]
+
+    def _get_stop_id(self, row: int, column: int) -> str:
+        """Get the ID of the stop at a grid position."""
+        return str(1_000_000 + row * self._grid_size + column)
+
+    def _get_stop_data(self, row: int, column: int) -> dict[str, Any]:
+        """Get the data of the stop at a grid position."""
+        grid_size = self._grid_size
+        # Deterministic jitter of up to a sixth of a grid cell in each direction
+        jitter = (row * 7919 + column * 104729 + self.seed * 15485863) % 1000
+        lat_jitter = (jitter / 1000 - 0.5) / 3
+        lon_jitter = ((jitter * 31) % 1000 / 1000 - 0.5) / 3
+        routes = []
+        if (index := 2 * ((column // self._segment_length) * grid_size + row)) < (
+            self._num_routes
+        ):
+            routes.append(f"R{index}")
+        if (index := 2 * ((row // self._segment_length) * grid_size + column) + 1) < (
+            self._num_routes
+        ):
+            routes.append(f"R{index}")
+        return {
+            "StopID": self._get_stop_id(row, column),
+            "Name": f"STREET {row} + AVENUE {column}",
+            "Lon": round(
+                self._west + (column + 0.5 + lon_jitter) / grid_size * self._width, 6
+            ),
+            "Lat": round(
+                self._south + (row + 0.5 + lat_jitter) / grid_size * self._height, 6
+            ),
+            "Routes": routes,
+        }
+
+    def _get_route_span(self, route_id: str) -> tuple[bool, int, int, int]:
+        """Get whether a route is vertical, its grid line and its first and last stop."""
+        if not route_id[1:].isdigit() or int(route_id[1:]) >= self._num_routes:
+            raise KeyError(route_id)
+        index = int(route_id[1:])
+        position = index // 2
+        line, segment = position % self._grid_size, position // self._grid_size
+        start = segment * self._segment_length
+        end = min(start + self._segment_length, self._grid_size)
+        return bool(index % 2), line, start, end - 1
+
+    def _get_route_stops(self, route_id: str) -> list[dict[str, Any]]:
+        """Get the data of the stops of a route in direction 0."""
+        vertical, line, start, end = self._get_route_span(route_id)
+        if vertical:
+            return [self._get_stop_data(row, line) for row in range(start, end + 1)]
+        return [self._get_stop_data(line, column) for column in range(start, end + 1)]
+
+    def _get_route_name(self, route_id: str) -> str:
+        """Get the name of a route from its first and last stop."""
+        vertical, _, start, end = self._get_route_span(route_id)
+        if vertical:
+            return f"{route_id} - STREET {start} - STREET {end}"
+        return f"{route_id} - AVENUE {start} - AVENUE {end}"
+
+    @cached_property
+    def routes(self) -> dict:
+        """Return the ROUTES payload."""
+        return {
+            "Routes": [
+                {
+                    "RouteID": route_id,
+                    "Name": self._get_route_name(route_id),
+                    "LineDescription": f"{route_id} Line",
+                }
+                for route_id in self.route_ids
+            ]
+        }
+
+    @cached_property
+    def stops(self) -> dict:
+        """Return the STOPS payload."""
+        return {
+            "Stops": [
+                self._get_stop_data(row, column)
+                for row in range(self._grid_size)
+                for column in range(self._grid_size)
+            ]
+        }
+
+    def get_route_path(self, route_id: str) -> dict:
+        """Return the ROUTE_PATH payload for a route."""
+        stops = self._get_route_stops(route_id)
+        directions = {}
+        for direction_num, direction_stops in enumerate((stops, stops[::-1])):
+            directions[f"Direction{direction_num}"] = {
+                "TripHeadsign": direction_stops[-1]["Name"],
+                "DirectionText": ("NORTH", "SOUTH")[direction_num],
+                "DirectionNum": str(direction_num),
+                "Shape": [
+                    {"Lat": stop["Lat"], "Lon": stop["Lon"], "SeqNum": seq_num}
+                    for seq_num, stop in enumerate(direction_stops, start=1)
+                ],
+                "Stops": direction_stops,
+            }
+        return {
+            "RouteID": route_id,
+            "Name": self._get_route_name(route_id),
+            **directions,
+        }
+
+    def get_route_schedule(self, route_id: str, date_: date | None = None) -> dict:
+        """Return the ROUTE_SCHEDULE payload for a route on a date."""
+        stops = self._get_route_stops(route_id)
+        rng = random.Random(f"{self.seed}:{route_id}")
+        headway = rng.choice(HEADWAYS)
+        minutes_per_stop = rng.choice(MINUTES_PER_STOP)
+        service_start = datetime.combine(
+            date_ or self.service_date, datetime.min.time()
+        ) + timedelta(hours=FIRST_TRIP_HOUR, minutes=rng.randrange(headway))
+        service_end = datetime.combine(
+            date_ or self.service_date, datetime.min.time()
+        ) + timedelta(hours=LAST_TRIP_HOUR)
+        schedule: dict[str, Any] = {"Name": self._get_route_name(route_id)}
+        for direction_num, direction_stops in enumerate((stops, stops[::-1])):
+            trips: list[dict[str, Any]] = []
+            start = service_start + timedelta(minutes=direction_num * headway / 2)
+            while start <= service_end:
+                trips.append(
+                    self._get_trip(
+                        route_id,
+                        direction_num,
+                        direction_stops,
+                        len(trips),
+                        start,
+                        minutes_per_stop,
+                    )
+                )
+                start += timedelta(minutes=headway)
+            schedule[f"Direction{direction_num}"] = trips
+        return schedule
+
+    @staticmethod
+    def _get_trip(
+        route_id: str,
+        direction_num: int,
+        direction_stops: list[dict[str, Any]],
+        trip_num: int,
+        start: datetime,
+        minutes_per_stop: float,
+    ) -> dict[str, Any]:
+        """Get the data of a trip that leaves its first stop at a time."""
+        stop_times = [
+            {
+                "StopID": stop["StopID"],
+                "StopName": stop["Name"],
+                "StopSeq": seq_num,
+                "Time": (
+                    start + timedelta(minutes=(seq_num - 1) * minutes_per_stop)
+                ).isoformat(timespec="seconds"),
+            }
+            for seq_num, stop in enumerate(direction_stops, start=1)
+        ]
+        return {
+            "RouteID": route_id,
+            "DirectionNum": str(direction_num),
+            "TripDirectionText": ("NORTH", "SOUTH")[direction_num],
+            "TripHeadsign": direction_stops[-1]["Name"],
+            "StartTime": stop_times[0]["Time"],
+            "EndTime": stop_times[-1]["Time"],
+            "StopTimes": stop_times,
+            "TripID": str((int(route_id[1:]) * 2 + direction_num) * 1000 + trip_num),
+        }
+
+    # Rail network
+
+    @property
+    def line_codes(self) -> list[str]:
+        """Return the code of every rail line."""
+        return [
+            f"{axis}{line}"
+            for line in range(self._lines_per_axis)
+            for axis in ("H", "V")
+        ]
+
+    def _get_station_code(self, line_code: str, position: int) -> str:
+        """Get the code of the station at a position on a line."""
+        line = int(line_code[1:])
+        crossing, remainder = divmod(position, self._stations_between_crossings + 1)
+        if remainder != self._stations_between_crossings // 2:
+            return f"{line_code}-{position}"
+        if line_code[0] == "V":
+            return f"X{crossing}-{line}"
+        return f"X{line}-{crossing}"
+
+    def _get_line_stations(self, line_code: str) -> list[tuple[str, float, float]]:
+        """Get the code and coordinates of each station on a line in order."""
+        vertical, line = line_code[0] == "V", int(line_code[1:])
+        spacing = self._stations_between_crossings + 1
+        offset = self._stations_between_crossings // 2
+        total = self._stations_per_line
+        line_position = (line * spacing + offset + 0.5) / total
+        stations = []
+        for position in range(total):
+            station_position = (position + 0.5) / total
+            lat_position, lon_position = (
+                (station_position, line_position)
+                if vertical
+                else (line_position, station_position)
+            )
+            stations.append(
+                (
+                    self._get_station_code(line_code, position),
+                    round(self._south + lat_position * self._height, 6),
+                    round(self._west + lon_position * self._width, 6),
+                )
+            )
+        return stations
+
+    @cached_property
+    def lines(self) -> dict:
+        """Return the LINES payload."""
+        lines = []
+        for line_code in self.line_codes:
+            stations = self._get_line_stations(line_code)
+            lines.append(
+                {
+                    "LineCode": line_code,
+                    "DisplayName": f"Line {line_code}",
+                    "StartStationCode": stations[0][0],
+                    "EndStationCode": stations[-1][0],
+                    "InternalDestination1": "",
+                    "InternalDestination2": "",
+                }
+            )
+        return {"Lines": lines}
+
+    @cached_property
+    def stations(self) -> dict:
+        """Return the STATIONS payload."""
+        stations: dict[str, dict[str, Any]] = {}
+        for line_code in self.line_codes:
+            for code, lat, lon in self._get_line_stations(line_code):
+                if code in stations:
+                    stations[code]["LineCode2"] = line_code
+                    continue
+                stations[code] = {
+                    "Code": code,
+                    "Name": f"Station {code}",
+                    "StationTogether1": "",
+                    "StationTogether2": "",
+                    "LineCode1": line_code,
+                    "LineCode2": None,
+                    "LineCode3": None,
+                    "LineCode4": None,
+                    "Lat": lat,
+                    "Lon": lon,
+                    "Address": {
+                        "Street": f"{code} Station Rd",
+                        "City": "Washington",
+                        "State": "DC",
+                        "Zip": "20001",
+                    },
+                }
+        return {"Stations": list(stations.values())}
+
+    def get_line_stations(self, line_code: str) -> dict:
+        """Return the STATIONS payload for a line."""
+        if line_code not in self.line_codes:
+            raise KeyError(line_code)
+        return {
+            "Stations": [
+                station
+                for station in self.stations["Stations"]
+                if line_code in (station["LineCode1"], station["LineCode2"])
+            ]
+        }
+
+    @cached_property
+    def _circuits(self) -> tuple[list[dict], list[dict]]:
+        """Return the standard routes and track circuits."""
+        standard_routes = []
+        track_circuits = []
+        circuit_id = 1
+        for line_code in self.line_codes:
+            stations = self._get_line_stations(line_code)
+            for track in (1, 2):
+                route_circuits: list[dict[str, Any]] = []
+                for position, (code, _, _) in enumerate(stations):
+                    station_codes: list[str | None] = [code]
+                    if position < len(stations) - 1:
+                        station_codes += [None] * CIRCUITS_BETWEEN_STATIONS
+                    for station_code in station_codes:
+                        route_circuits.append(
+                            {
+                                "SeqNum": len(route_circuits) + 1,
+                                "CircuitId": circuit_id,
+                                "StationCode": station_code,
+                            }
+                        )
+                        circuit_id += 1
+                standard_routes.append(
+                    {
+                        "LineCode": line_code,
+                        "TrackNum": track,
+                        "TrackCircuits": route_circuits,
+                    }
+                )
+                for position, route_circuit in enumerate(route_circuits):
+                    neighbors = []
+                    if position:
+                        neighbors.append(
+                            {
+                                "NeighborType": "Left",
+                                "CircuitIds": [
+                                    route_circuits[position - 1]["CircuitId"]
+                                ],
+                            }
+                        )
+                    if position < len(route_circuits) - 1:
+                        neighbors.append(
+                            {
+                                "NeighborType": "Right",
+                                "CircuitIds": [
+                                    route_circuits[position + 1]["CircuitId"]
+                                ],
+                            }
+                        )
+                    track_circuits.append(
+                        {
+                            "Track": track,
+                            "CircuitId": route_circuit["CircuitId"],
+                            "Neighbors": neighbors,
+                        }
+                    )
+        return standard_routes, track_circuits
+
+    @property
+    def standard_routes(self) -> dict:
+        """Return the STANDARD_ROUTES payload."""
+        return {"StandardRoutes": self._circuits[0]}
+
+    @property
+    def track_circuits(self) -> dict:
+        """Return the TRACK_CIRCUITS payload."""
+        return {"TrackCircuits": self._circuits[1]}
+
+    # Mapping
+
+    @property
+    def _static_payloads(self) -> dict[str, str]:
+        """Return the key of each static payload mapped to its attribute."""
+        return {
+            "bus/routes": "routes",
+            "bus/stops": "stops",
+            "rail/lines": "lines",
+            "rail/standard_routes..contentType_json": "standard_routes",
+            "rail/stations": "stations",
+            "rail/station_entrances": "station_entrances",
+            "rail/station_parking_information": "station_parking_information",
+            "rail/station_timings": "station_timings",
+            "rail/track_circuits..contentType_json": "track_circuits",
+        }
+
+    @property
+    def station_entrances(self) -> dict:
+        """Return the STATION_ENTRANCES payload, which has no entrances."""
+        return {"Entrances": []}
+
+    @property
+    def station_parking_information(self) -> dict:
+        """Return the STATION_PARKING_INFORMATION payload, which has no parking."""
+        return {"StationsParking": []}
+
+    @property
+    def station_timings(self) -> dict:
+        """Return the STATION_TIMINGS payload, which has no timings."""
+        return {"StationTimes": []}
+
+    def __getitem__(self, key: str) -> dict:
+        """Return the payload for a fixture key."""
+        if (attribute := self._static_payloads.get(key)) is not None:
+            return getattr(self, attribute)  # type: ignore[no-any-return]
+        if match := ROUTE_PATH_KEY.match(key):
+            return self.get_route_path(match.group(1))
+        if match := ROUTE_SCHEDULE_KEY.match(key):
+            date_ = date.fromisoformat(match.group(2)) if match.group(2) else None
+            return self.get_route_schedule(match.group(1), date_)
+        if match := STATIONS_KEY.match(key):
+            return self.get_line_stations(match.group(1))
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the key of every payload without a date."""
+        yield from self._static_payloads
+        for route_id in self.route_ids:
+            yield f"bus/route_path..RouteID_{route_id}"
+            yield f"bus/route_schedule..RouteID_{route_id}_IncludingVariations_false"
+        for line_code in self.line_codes:
+            yield f"rail/stations..LineCode_{line_code}"
+
+    def __len__(self) -> int:
+        """Return the number of payloads without a date."""
+        return len(self._static_payloads) + 2 * self._num_routes + len(self.line_codes)
+
+    def write(self, path: str | Path) -> None:
+        """Write every payload without a date to a fixtures directory."""
+        path = Path(path)
+        for api_type in ("bus", "rail"):
+            (path / api_type).mkdir(parents=True, exist_ok=True)
+        for key, payload in self.items():
+            with open(path / f"{key}.json", "w", encoding="utf-8") as fp:
+                json.dump(payload, fp)